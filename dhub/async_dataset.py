@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# dhub
+# Copyright (C) 2017 Iván de Paz Centeno <ipazc@unileon.es>.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; version 3
+# of the License or (at your option) any later version of
+# the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+import asyncio
+import json
+import os
+from pyzip import PyZip
+from dhub.async_element import AsyncElement
+from dhub.config import now, CACHE_TIME, segments
+from dhub.interpreters.interpreter import Interpreter
+from dhub.wrapper.async_api_wrapper import AsyncAPIWrapper
+
+__author__ = 'Iván de Paz Centeno'
+
+
+def _read_file(uri):
+    with open(uri, "rb") as f:
+        return f.read()
+
+
+class AsyncDataset(AsyncAPIWrapper):
+    """
+    asyncio counterpart of Dataset. Requests are issued concurrently, bounded by the connection's
+    concurrency limit, instead of being fanned out on thread pools.
+    """
+
+    def __init__(self, url_prefix: str, title: str, description: str, reference: str, tags: list, token: str=None,
+                 binary_interpreter: Interpreter=None, token_info: dict=None, server_info: dict=None, owner=None,
+                 api_url=None, connection=None):
+        super().__init__(token, token_info=token_info, server_info=server_info, api_url=api_url, connection=connection)
+        self.data = {'url_prefix': url_prefix, 'title': title, 'description': description, 'tags': tags,
+                     'reference': reference, 'size': 0}
+
+        self.binary_interpreter = binary_interpreter
+        """:type : Interpreter"""
+
+        self.elements_count = 0
+        self.comments_count = 0
+        self.page_cache = {}
+        self.last_cache_time = now()
+        self.owner = owner
+
+    def __repr__(self):
+        return "AsyncDataset {} ({} elements); tags: {}; description: {}; reference: {}".format(
+            self.get_title(), len(self), self.get_tags(), self.get_description(), self.get_reference())
+
+    def set_binary_interpreter(self, binary_interpreter):
+        self.binary_interpreter = binary_interpreter
+
+    def get_fork_father(self):
+        return self.data['fork_father']
+
+    def get_fork_count(self):
+        return self.data['fork_count']
+
+    def get_url_prefix(self):
+        return self.data['url_prefix']
+
+    def get_description(self):
+        return self.data['description']
+
+    def get_title(self):
+        return self.data['title']
+
+    def get_tags(self):
+        return self.data['tags']
+
+    def get_size(self):
+        return self.data['size']
+
+    def get_reference(self):
+        return self.data['reference']
+
+    def set_description(self, new_desc):
+        self.data['description'] = new_desc
+
+    def set_title(self, new_title):
+        self.data['title'] = new_title
+
+    def set_tags(self, new_tags):
+        self.data['tags'] = new_tags
+
+    def set_reference(self, new_reference):
+        self.data['reference'] = new_reference
+
+    async def update(self):
+        await self._patch_json("/datasets/{}".format(self.get_url_prefix()),
+                               json_data={k: v for k, v in self.data.items() if k != "url_prefix"})
+
+    @classmethod
+    def from_dict(cls, definition, token, binary_interpreter=None, token_info=None, server_info=None, owner=None,
+                  api_url=None, connection=None):
+
+        dataset = cls(definition['url_prefix'], definition['title'], definition['description'], definition['reference'],
+                      definition['tags'], token=token, binary_interpreter=binary_interpreter, token_info=token_info,
+                      server_info=server_info, owner=owner, api_url=api_url, connection=connection)
+        dataset.data['fork_count'] = definition['fork_count']
+        dataset.data['fork_father'] = definition['fork_father']
+        dataset.data['size'] = definition['size']
+        dataset.comments_count = definition['comments_count']
+        dataset.elements_count = definition['elements_count']
+        return dataset
+
+    async def __prepare_content(self, content, interpret):
+        if type(content) is str:
+            # content is a URI
+            if not os.path.exists(content):
+                raise Exception("content must be a binary data or a URI to a file.")
+
+            content = await asyncio.get_event_loop().run_in_executor(None, _read_file, content)
+
+        elif self.binary_interpreter is not None and interpret:
+            content = self.binary_interpreter.decipher(content)
+
+        if type(content) is not bytes:
+            raise Exception("Bytes are required as content.")
+
+        return content
+
+    async def add_element(self, title: str, content, description: str=None, tags: list=None, http_ref: str=None,
+                          interpret=True) -> AsyncElement:
+        elements = await self.add_elements([{'title': title, 'content': content, 'description': description,
+                                             'tags': tags, 'http_ref': http_ref}], interpret=interpret)
+        return elements[0]
+
+    async def add_elements(self, add_element_kwargs_list: list, interpret=True) -> list:
+        post_kwargs = []
+        content_list = []
+
+        for element_kwargs in add_element_kwargs_list:
+            content_list.append(await self.__prepare_content(element_kwargs['content'], interpret))
+
+            post_kwargs.append({'title': element_kwargs['title'],
+                                'description': element_kwargs.get('description') or "",
+                                'tags': element_kwargs.get('tags') or [],
+                                'http_ref': element_kwargs.get('http_ref') or ""})
+
+        result = await self._post_json("datasets/{}/elements/bundle".format(self.get_url_prefix()), json_data={
+            'elements': post_kwargs
+        })
+
+        elements = [AsyncElement.from_dict(element, self, self.binary_interpreter) for element in result]
+
+        ps = self.server_info['Page-Size']
+        contents = {element.get_id(): content for element, content in zip(elements, content_list)}
+        await asyncio.gather(*[self._put_binary("datasets/{}/elements/content".format(self.get_url_prefix()),
+                                                binary=PyZip({k: contents[k] for k in segment}).to_bytes())
+                               for segment in segments(list(contents), ps)])
+
+        for element, content in zip(elements, content_list):
+            element.has_content = True
+            element.cached_content = content
+            element.cached_content_time = now()
+
+        await self.refresh()
+        return elements
+
+    async def _request_segment(self, ids):
+        results = await self._get_json("datasets/{}/elements/bundle".format(self.get_url_prefix()),
+                                       json_data={'elements': ids})
+
+        elements = [AsyncElement.from_dict(result, self, self.binary_interpreter) for result in results]
+
+        future = asyncio.ensure_future(self._retrieve_segment_contents(ids))
+
+        for element in elements:
+            element.content_promise = future
+
+        return elements
+
+    async def _retrieve_segment_contents(self, ids):
+        packet_bytes = await self._get_binary("datasets/{}/elements/content".format(self.get_url_prefix()),
+                                              json_data={'elements': ids})
+        return dict(PyZip().from_bytes(packet_bytes))
+
+    def __getitem__(self, key):
+        """
+        Same keys as Dataset.__getitem__(), but returns an awaitable.
+        """
+        return self.get(key)
+
+    async def get(self, key):
+        options = None
+
+        if type(key) is dict:
+            options = dict(key)
+            key = options.pop('slice', 0)
+            if (type(key) is int and key < 0) or (type(key) is slice and key.stop is not None and key.stop < 0):
+                raise ValueError("Negative indexes not allowed when retrieving elements with options. Use filter_iter() instead")
+
+        if type(key) is int:
+            if key < 0:
+                key += len(self)
+            key = slice(key, key + 1, 1)
+
+        if type(key) is slice:
+            start, stop, step = key.indices(len(self))
+            ids = await asyncio.gather(*[self._get_key(i, options=options) for i in range(start, stop, step)])
+
+            ps = self.server_info['Page-Size']
+            segments_elements = await asyncio.gather(*[self._request_segment(segment) for segment in segments(ids, ps)])
+            elements = [element for segment_elements in segments_elements for element in segment_elements]
+
+        elif type(key) is str:
+            try:
+                response = await self._get_json("datasets/{}/elements/{}".format(self.get_url_prefix(), key))
+                element = AsyncElement.from_dict(response, self, self.binary_interpreter)
+                element.content_promise = asyncio.ensure_future(element._retrieve_content())
+                elements = [element]
+            except Exception as ex:
+                elements = []
+
+        else:
+            raise KeyError("Type of key not allowed.")
+
+        if len(elements) > 1:
+            result = elements
+        elif len(elements) == 1:
+            result = elements[0]
+        else:
+            raise KeyError("{} not found".format(key))
+
+        return result
+
+    async def _get_page(self, page, options=None):
+        dumped_options = json.dumps(options)
+        page_cache = self.page_cache.setdefault(dumped_options, {})
+
+        if (now() - self.last_cache_time).total_seconds() > CACHE_TIME:
+            page_cache.clear()
+
+        if page not in page_cache:
+            # Concurrent requests for the same page share a single fetch.
+            page_cache[page] = asyncio.ensure_future(
+                self._get_json("datasets/{}/elements".format(self.get_url_prefix()), extra_data={'page': page},
+                               json_data={'options': options}))
+            self.last_cache_time = now()
+
+        try:
+            return await page_cache[page]
+        except Exception:
+            page_cache.pop(page, None)
+            raise
+
+    async def _get_key(self, key_index, options=None):
+        ps = int(self.server_info['Page-Size'])
+        page = await self._get_page(key_index // ps, options=options)
+        return page[key_index % ps]['_id']
+
+    async def _get_elements(self, page, filter_options=None):
+        return [AsyncElement.from_dict(element, self, self.binary_interpreter) for element in
+                await self._get_json("datasets/{}/elements".format(self.get_url_prefix()), extra_data={'page': page},
+                                     json_data={'options': filter_options})]
+
+    async def filter_iter(self, options=None, cache_content=False):
+        """
+        Asynchronous iterator over the elements of the dataset. The next page is requested while the
+        current one is being consumed.
+        """
+        if options is None:
+            options = {}
+
+        ps = self.server_info['Page-Size']
+        number_of_pages = len(self) // ps + int(len(self) % ps > 0)
+
+        buffer = None
+        next_buffer = None
+
+        try:
+            for page in range(number_of_pages):
+
+                if buffer is None:
+                    buffer = asyncio.ensure_future(self._get_elements(page, options))
+
+                if page + 1 < number_of_pages:
+                    next_buffer = asyncio.ensure_future(self._get_elements(page + 1, options))
+                else:
+                    next_buffer = None
+
+                elements = await buffer
+
+                if len(elements) == 0:
+                    break
+
+                if cache_content:
+                    future = asyncio.ensure_future(self._retrieve_segment_contents([element.get_id() for element in elements]))
+                else:
+                    future = None
+
+                for element in elements:
+                    if cache_content:
+                        element.content_promise = future
+                    yield element
+
+                buffer = next_buffer
+        finally:
+            # The page requested ahead is not needed when the consumer stops early.
+            if next_buffer is not None:
+                next_buffer.cancel()
+
+    def __aiter__(self):
+        return self.filter_iter()
+
+    async def keys(self, page=-1):
+        if page == -1:
+            ps = int(self.server_info['Page-Size'])
+            pages = await asyncio.gather(*[self._get_page(p) for p in range(len(self) // ps + int(len(self) % ps > 0))])
+            data = [element['_id'] for page_elements in pages for element in page_elements]
+        else:
+            data = [element['_id'] for element in await self._get_page(page)]
+
+        return data
+
+    def __len__(self):
+        return self.elements_count
+
+    async def refresh(self):
+        dataset_data = await self._get_json("datasets/{}".format(self.get_url_prefix()))
+        self.elements_count = dataset_data['elements_count']
+        self.comments_count = dataset_data['comments_count']
+        self.data = {k: dataset_data[k] for k in ['url_prefix', 'title', 'description', 'reference', 'tags',
+                                                  'fork_count', 'fork_father', 'size']}
+        self.page_cache = {}  # clearing the cache to avoid errors
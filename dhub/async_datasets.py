@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# dhub
+# Copyright (C) 2017 Iván de Paz Centeno <ipazc@unileon.es>.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; version 3
+# of the License or (at your option) any later version of
+# the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+from dhub.async_dataset import AsyncDataset
+from dhub.dhubrc import dhubrc
+from dhub.wrapper.async_api_wrapper import AsyncAPIWrapper, AsyncConnection, MAX_CONCURRENCY
+
+__author__ = 'Iván de Paz Centeno'
+
+
+class AsyncDatasets(AsyncAPIWrapper):
+    """
+    asyncio counterpart of Datasets. It must be opened to retrieve the list of datasets, and closed after use;
+    preferably as an async context manager:
+
+        async with AsyncDatasets("default", max_concurrency=128) as datasets:
+            dataset = datasets["my_dataset"]
+            async for element in dataset.filter_iter(cache_content=True):
+                content = await element.get_content()
+
+    Every dataset and element obtained from it shares the same HTTP session and concurrency limit.
+    """
+
+    def __init__(self, token_id=None, api_url=None, max_concurrency=MAX_CONCURRENCY):
+
+        try:
+            token = dhubrc.lookup_token(token_id)
+        except KeyError as ex:
+            token = token_id
+
+        super().__init__(token, api_url=api_url, connection=AsyncConnection(max_concurrency))
+        self.datasets = {}
+
+    async def open(self):
+        await self._update_token_info()
+        await self.refresh()
+        return self
+
+    async def close(self):
+        await self.connection.close()
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    def __len__(self):
+        return len(self.datasets)
+
+    def find_closest(self, item):
+        for d in self.keys():
+            if item in d:
+                return d
+        return None
+
+    def __getitem__(self, item) -> AsyncDataset:
+        result = None
+        try:
+            index = int(item)
+            result = self.values()[index]
+        except ValueError as ex:
+            pass
+
+        if result is None:
+            if item not in self.keys():
+                closest_name = self.find_closest(item)
+                if closest_name is not None:
+                    item = closest_name
+
+            result = self.datasets[item]
+
+            if type(result) is dict:
+                result = AsyncDataset.from_dict(**result)
+                self.datasets[item] = result
+
+        return result
+
+    async def add_dataset(self, url_prefix, title=None, description=None, reference=None, tags=None) -> AsyncDataset:
+        if title is None: title = "Unnamed dataset"
+        if description is None: description = ""
+        if reference is None: reference = ""
+        if tags is None: tags = []
+
+        result = await self._post_json("datasets", json_data={
+            'title': title,
+            'description': description,
+            'tags': tags,
+            'url_prefix': url_prefix,
+            'reference': reference
+        })
+
+        await self.refresh()
+        return self[result['url_prefix']]
+
+    async def remove_dataset(self, key):
+        dataset = self[key]
+        await self._delete_json("datasets/{}".format(dataset.get_url_prefix()))
+        await self.refresh()
+
+    def __iter__(self):
+        for key in self.keys():
+            yield self[key]
+
+    def keys(self):
+        return list(self.datasets.keys())
+
+    def values(self):
+        return [s for s in self]
+
+    async def refresh(self):
+        self.datasets = {d['url_prefix']: dict(definition=d, token=self.token, token_info=self.token_info,
+                                               server_info=self.server_info, owner=self, api_url=self.api_url,
+                                               connection=self.connection)
+                         for d in await self._get_json("datasets")}
+
+    def __str__(self):
+        return str(self.keys())
+
+    def __repr__(self):
+        return "[{}] {}".format(self.api_url, str(self))
+
+    def __contains__(self, item):
+        if item not in self.keys():
+            closest_name = self.find_closest(item)
+            if closest_name is not None:
+                item = closest_name
+
+        return item in self.keys()
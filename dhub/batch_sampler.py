@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# dhub
+# Copyright (C) 2017 Iván de Paz Centeno <ipazc@unileon.es>.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; version 3
+# of the License or (at your option) any later version of
+# the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+from collections import deque
+from random import Random
+
+__author__ = 'Iván de Paz Centeno'
+
+
+class BatchSampler(object):
+    """
+    Iterates over the elements of a dataset in mini-batches, in a random order that is reproducible
+    from the seed and the epoch:
+
+        sampler = dataset.sampler(32, seed=1234)
+
+        for epoch in range(10):
+            sampler.set_epoch(epoch)
+            for batch in sampler:
+                ...
+
+    The ids of the elements are resolved once per sampler (through the local id index of the dataset).
+    The elements of each batch are requested in segments of Page-Size elements, along with their contents,
+    and the next batches are requested in the background while the current one is consumed.
+    """
+
+    def __init__(self, dataset, batch_size, seed=None, shuffle=True, drop_last=False, prefetch_batches=2,
+                 options=None):
+        if batch_size <= 0:
+            raise ValueError("batch_size must be greater than 0.")
+
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.seed = seed
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.prefetch_batches = max(0, prefetch_batches)
+        self.options = options
+        self.epoch = 0
+        self.ids = None
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def get_ids(self):
+        if self.ids is None:
+            self.ids = self.dataset._get_keys(0, len(self.dataset), options=self.options)
+
+        return self.ids
+
+    def get_order(self):
+        """
+        :return: ids of the elements in the order of the current epoch.
+        """
+        ids = list(self.get_ids())
+
+        if self.shuffle:
+            # Without a seed every epoch has a different order.
+            random = Random() if self.seed is None else Random("{}-{}".format(self.seed, self.epoch))
+            random.shuffle(ids)
+
+        return ids
+
+    def __len__(self):
+        ids_count = len(self.get_ids())
+
+        if self.drop_last:
+            return ids_count // self.batch_size
+
+        return ids_count // self.batch_size + int(ids_count % self.batch_size > 0)
+
+    def __iter__(self):
+        ids = self.get_order()
+        batches = [ids[index:index + self.batch_size] for index in range(0, len(self) * self.batch_size, self.batch_size)]
+        window = deque()  # futures of the segments of each requested batch.
+
+        for batch_ids in batches:
+            window.append(self.dataset._request_elements(batch_ids))
+
+            if len(window) <= self.prefetch_batches:
+                continue
+
+            yield self.__collect(window.popleft())
+
+        while len(window) > 0:
+            yield self.__collect(window.popleft())
+
+    @staticmethod
+    def __collect(futures):
+        elements = []
+
+        for future in futures:
+            elements += future.result()
+
+        return elements
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# dhub
+# Copyright (C) 2017 Iván de Paz Centeno <ipazc@unileon.es>.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; version 3
+# of the License or (at your option) any later version of
+# the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+from collections import OrderedDict
+import hashlib
+import os
+import tempfile
+import threading
+from dhub.dhubrc import dhubrc
+
+__author__ = 'Iván de Paz Centeno'
+
+MAX_INVALIDATIONS = 10000  # invalidations remembered one by one; older ones are summarized in a single generation.
+
+class DiskCache(object):
+    """
+    Size-bounded cache of binary blobs stored as files inside a folder. Each key is stored in a file
+    named after the SHA256 of the key. When the cache grows above max_size bytes, the least recently
+    used files are removed.
+
+    The folder is scanned the first time the cache is used, so the contents survive between processes
+    (recency is taken from the files' modification time, which is refreshed on every hit).
+    A max_size of 0 disables the cache.
+
+    Downloads racing with an invalidation must not store stale contents: callers take a generation
+    number with get_generation() before requesting the content and pass it to put(), which discards
+    the content if the key was invalidated in the meantime.
+    """
+
+    def __init__(self, folder, max_size):
+        self.folder = folder
+        self.max_size = max_size
+        self.entries = OrderedDict()  # file name -> size, from least to most recently used.
+        self.total_size = 0
+        self.loaded = False
+        self.generation = 0
+        self.invalidations = {}  # file name -> generation of its last invalidation.
+        self.forgotten_generation = -1  # contents retrieved before it are discarded, regardless of the key.
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _file_name(key):
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def is_enabled(self):
+        return self.max_size > 0
+
+    def get_generation(self):
+        with self.lock:
+            return self.generation
+
+    def __is_outdated(self, file_name, generation):
+        if generation is None:
+            return False
+
+        return generation < self.forgotten_generation or self.invalidations.get(file_name, -1) > generation
+
+    def __load(self):
+        if self.loaded:
+            return
+
+        os.makedirs(self.folder, exist_ok=True)
+
+        files = []
+        for file_name in os.listdir(self.folder):
+            try:
+                stat = os.stat(os.path.join(self.folder, file_name))
+            except FileNotFoundError:
+                continue
+
+            if file_name.endswith(".tmp"):
+                continue
+
+            files.append((stat.st_mtime, file_name, stat.st_size))
+
+        for _, file_name, size in sorted(files):
+            self.entries[file_name] = size
+            self.total_size += size
+
+        self.loaded = True
+        self.__evict()
+
+    def __evict(self):
+        while self.total_size > self.max_size and len(self.entries) > 0:
+            file_name, size = self.entries.popitem(last=False)
+            self.total_size -= size
+
+            try:
+                os.remove(os.path.join(self.folder, file_name))
+            except FileNotFoundError:
+                pass
+
+    def __forget(self, file_name):
+        size = self.entries.pop(file_name, None)
+        if size is not None:
+            self.total_size -= size
+
+    def __contains__(self, key):
+        if not self.is_enabled():
+            return False
+
+        with self.lock:
+            self.__load()
+            return self._file_name(key) in self.entries
+
+    def get(self, key):
+        """
+        Retrieves the content stored for the key.
+        :param key: key of the content.
+        :return: bytes of the content, or None if it is not cached.
+        """
+        if not self.is_enabled():
+            return None
+
+        file_name = self._file_name(key)
+        path = os.path.join(self.folder, file_name)
+
+        with self.lock:
+            self.__load()
+
+            if file_name not in self.entries:
+                return None
+
+            self.entries.move_to_end(file_name)
+
+        try:
+            with open(path, "rb") as f:
+                content = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            # Removed by another process sharing the folder.
+            with self.lock:
+                self.__forget(file_name)
+            content = None
+
+        return content
+
+    def put(self, key, content, generation=None):
+        """
+        Stores the content for the key, evicting the least recently used contents if needed.
+        :param key: key of the content.
+        :param content: bytes to store.
+        :param generation: generation taken before the content was retrieved. If the key was invalidated
+        after it, the content is outdated and it is not stored.
+        """
+        if not self.is_enabled() or len(content) > self.max_size:
+            return
+
+        file_name = self._file_name(key)
+
+        with self.lock:
+            self.__load()
+
+        # Written to a temporary file first so that readers never see a partial content.
+        with tempfile.NamedTemporaryFile(dir=self.folder, suffix=".tmp", delete=False) as f:
+            f.write(content)
+
+        with self.lock:
+            if self.__is_outdated(file_name, generation):
+                os.remove(f.name)
+                return
+
+            os.replace(f.name, os.path.join(self.folder, file_name))
+            self.__forget(file_name)
+            self.entries[file_name] = len(content)
+            self.total_size += len(content)
+            self.__evict()
+
+    def invalidate(self, key):
+        if not self.is_enabled():
+            return
+
+        file_name = self._file_name(key)
+
+        with self.lock:
+            self.__load()
+            self.__forget(file_name)
+            self.generation += 1
+            self.invalidations[file_name] = self.generation
+
+            if len(self.invalidations) > MAX_INVALIDATIONS:
+                self.invalidations.clear()
+                self.forgotten_generation = self.generation
+
+            try:
+                os.remove(os.path.join(self.folder, file_name))
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        if not self.is_enabled():
+            return
+
+        with self.lock:
+            self.__load()
+            for file_name in list(self.entries):
+                self.__forget(file_name)
+                try:
+                    os.remove(os.path.join(self.folder, file_name))
+                except FileNotFoundError:
+                    pass
+
+    def size(self):
+        with self.lock:
+            return self.total_size
+
+
+disk_cache = DiskCache(dhubrc.get_disk_cache_folder(), dhubrc.get_disk_cache_size())
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# dhub
+# Copyright (C) 2017 Iván de Paz Centeno <ipazc@unileon.es>.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; version 3
+# of the License or (at your option) any later version of
+# the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+import mmap
+import os
+import struct
+import tempfile
+import threading
+
+__author__ = 'Iván de Paz Centeno'
+
+HEADER = struct.Struct("<QQQ")  # elements count of the dataset, width of the ids, length of the index.
+
+
+def evict_indexes(folder, max_size, keep=None):
+    """
+    Removes the least recently used index files of the folder until their size is below max_size bytes.
+    :param keep: file name of an index in use, which is never removed.
+    """
+    try:
+        file_names = [file_name for file_name in os.listdir(folder) if not file_name.endswith(".tmp")]
+    except FileNotFoundError:
+        return
+
+    files = []
+
+    for file_name in file_names:
+        try:
+            stat = os.stat(os.path.join(folder, file_name))
+        except FileNotFoundError:
+            continue
+
+        files.append((stat.st_mtime, file_name, stat.st_size))
+
+    total_size = sum(size for _, _, size in files)
+
+    for _, file_name, size in sorted(files):
+        if total_size <= max_size:
+            break
+
+        if keep is not None and os.path.join(folder, file_name) == keep:
+            continue
+
+        try:
+            os.remove(os.path.join(folder, file_name))
+        except FileNotFoundError:
+            pass
+
+        total_size -= size
+
+
+class IdIndex(object):
+    """
+    Positions -> ids of the elements of a dataset, stored in a memory-mapped file
+    as an array of fixed-width records.
+
+    The index is filled lazily: pages of ids are written as they are retrieved from the backend, and a
+    record full of zeros is a position not retrieved yet. Its length is the elements count of the dataset
+    until its last page is written.
+
+    The index is bound to the elements count of the dataset. Elements are appended at the end, so a larger
+    count extends the index and keeps the ids stored; a smaller one resets it. Writing a page that disagrees
+    with the ids already stored also resets it, since the elements changed in the backend.
+    """
+
+    def __init__(self, file_name, elements_count):
+        self.file_name = file_name
+        self.elements_count = elements_count
+        self.width = None
+        self.length = elements_count
+        self.mmap = None
+        self.lock = threading.Lock()
+        self.__open()
+
+    def __open(self):
+        try:
+            f = open(self.file_name, "r+b")
+        except FileNotFoundError:
+            return
+
+        with f:
+            header = f.read(HEADER.size)
+            valid = len(header) == HEADER.size
+
+            if valid:
+                elements_count, width, length = HEADER.unpack(header)
+                valid = elements_count <= self.elements_count and width > 0 and \
+                        os.fstat(f.fileno()).st_size == HEADER.size + elements_count * width
+
+            if valid and elements_count < self.elements_count:
+                # Elements were appended: the last page written is not the last one anymore.
+                length = self.elements_count
+                f.seek(0)
+                f.write(HEADER.pack(self.elements_count, width, length))
+                f.truncate(HEADER.size + self.elements_count * width)
+
+            if valid:
+                os.utime(f.fileno())  # recently used, see evict_indexes().
+                self.mmap = mmap.mmap(f.fileno(), 0)
+                self.width = width
+                self.length = length
+
+        if not valid:
+            self.__remove()
+
+    def __remove(self):
+        try:
+            os.remove(self.file_name)
+        except FileNotFoundError:
+            pass
+
+    def __create(self, width):
+        self.__close()
+
+        folder = os.path.dirname(self.file_name)
+        os.makedirs(folder, exist_ok=True)
+
+        # Records are never written, so the file stays sparse until the pages are retrieved.
+        with tempfile.NamedTemporaryFile(dir=folder, suffix=".tmp", delete=False) as f:
+            f.write(HEADER.pack(self.elements_count, width, self.elements_count))
+            f.truncate(HEADER.size + self.elements_count * width)
+
+        os.replace(f.name, self.file_name)
+
+        with open(self.file_name, "r+b") as f:
+            self.mmap = mmap.mmap(f.fileno(), 0)
+
+        self.width = width
+        self.length = self.elements_count
+
+    def resize(self, elements_count):
+        """
+        Binds the index to a new elements count of the dataset: a larger one extends it, a smaller one resets it.
+        """
+        with self.lock:
+            if elements_count == self.elements_count:
+                return
+
+            self.__close()
+            self.elements_count = elements_count
+            self.length = elements_count
+            self.width = None
+            self.__open()
+
+    def __decode(self, record):
+        return record.rstrip(b"\0").decode()
+
+    def get(self, position):
+        """
+        :return: id of the element in the position, or None if it was not retrieved yet.
+        """
+        with self.lock:
+            if self.mmap is None or position < 0 or position >= self.length:
+                return None
+
+            offset = HEADER.size + position * self.width
+            record = self.mmap[offset:offset + self.width]
+
+        return self.__decode(record) or None
+
+    def get_range(self, start, stop, step=1):
+        """
+        :return: ids of the elements in range(start, stop, step), or None if any of them was not retrieved yet.
+        Positions beyond the length of the index are ignored, as in a list slice.
+        """
+        if step <= 0:
+            raise ValueError("Only positive steps are supported.")
+
+        with self.lock:
+            if self.mmap is None:
+                return None
+
+            stop = min(stop, self.length)
+
+            if start >= stop:
+                return []
+
+            data = self.mmap[HEADER.size + start * self.width:HEADER.size + stop * self.width]
+            width = self.width
+
+        ids = [self.__decode(data[offset:offset + width]) for offset in range(0, len(data), width * step)]
+
+        if "" in ids:
+            return None
+
+        return ids
+
+    def put(self, position, ids, last=False):
+        """
+        Writes the ids of the elements starting at the given position.
+        :param last: whether no element follows them.
+        :return: False if the ids do not fit in the index (which is then discarded), True otherwise.
+        """
+        records = [element_id.encode() for element_id in ids]
+
+        with self.lock:
+            if self.mmap is None:
+                if len(records) == 0:
+                    return True
+
+                self.__create(max(len(record) for record in records))
+
+            if any(len(record) > self.width for record in records) or position + len(records) > self.elements_count:
+                self.__close()
+                self.__remove()
+                return False
+
+            offset = HEADER.size + position * self.width
+            data = b"".join(record.ljust(self.width, b"\0") for record in records)
+            stored = self.mmap[offset:offset + len(data)]
+
+            if any(old != new and old.strip(b"\0") != b"" for old, new in zip(self.__split(stored), self.__split(data))):
+                self.__create(self.width)
+
+            self.mmap[offset:offset + len(data)] = data
+
+            if last:
+                self.length = position + len(records)
+                self.mmap[:HEADER.size] = HEADER.pack(self.elements_count, self.width, self.length)
+
+        return True
+
+    def __split(self, data):
+        return [data[offset:offset + self.width] for offset in range(0, len(data), self.width)]
+
+    def __close(self):
+        if self.mmap is not None:
+            self.mmap.close()
+            self.mmap = None
+
+    def close(self):
+        with self.lock:
+            self.__close()
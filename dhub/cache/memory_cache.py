@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# dhub
+# Copyright (C) 2017 Iván de Paz Centeno <ipazc@unileon.es>.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; version 3
+# of the License or (at your option) any later version of
+# the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+from collections import OrderedDict
+import threading
+from dhub.config import now, CACHE_TIME
+from dhub.dhubrc import dhubrc
+
+__author__ = 'Iván de Paz Centeno'
+
+MAX_INVALIDATIONS = 10000  # invalidations remembered one by one; older ones are summarized in a single generation.
+
+
+class MemoryCache(object):
+    """
+    Process-wide LRU cache bounded by the total size in bytes of its values. Entries also expire
+    after ttl seconds.
+
+    Callers give the size of each value when storing it, so any kind of value can be cached (element
+    contents, metadata pages...). Hits, misses and evictions are counted and available through stats().
+
+    As in DiskCache, put() accepts a generation number taken with get_generation() before the value
+    was requested, so that values retrieved before an invalidation of the key are discarded.
+    """
+
+    def __init__(self, max_size, ttl=CACHE_TIME):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> [value, size, insertion time], from least to most recently used.
+        self.total_size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.generation = 0
+        self.invalidations = {}  # key -> generation of its last invalidation.
+        self.forgotten_generation = -1  # values retrieved before it are discarded, regardless of the key.
+        self.lock = threading.Lock()
+
+    def get_generation(self):
+        with self.lock:
+            return self.generation
+
+    def __is_outdated(self, key, generation):
+        if generation is None:
+            return False
+
+        return generation < self.forgotten_generation or self.invalidations.get(key, -1) > generation
+
+    def __remove(self, key):
+        _, size, _ = self.entries.pop(key)
+        self.total_size -= size
+
+    def __evict(self):
+        while self.total_size > self.max_size and len(self.entries) > 0:
+            _, (_, size, _) = self.entries.popitem(last=False)
+            self.total_size -= size
+            self.evictions += 1
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.entries
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.get(key)
+
+            if entry is not None and (now() - entry[2]).total_seconds() > self.ttl:
+                self.__remove(key)
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return default
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+
+            return entry[0]
+
+    def put(self, key, value, size, generation=None):
+        """
+        Stores the value for the key, evicting the least recently used values if needed.
+        :param key: hashable key of the value.
+        :param value: value to store.
+        :param size: size in bytes accounted for the value.
+        :param generation: generation taken before the value was retrieved. If the key was invalidated
+        after it, the value is outdated and it is not stored.
+        :return: True if the value was stored, False otherwise.
+        """
+        if size > self.max_size:
+            return False
+
+        with self.lock:
+            if self.__is_outdated(key, generation):
+                return False
+
+            if key in self.entries:
+                self.__remove(key)
+
+            self.entries[key] = [value, size, now()]
+            self.total_size += size
+            self.__evict()
+
+        return True
+
+    def invalidate(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.__remove(key)
+
+            self.generation += 1
+            self.invalidations[key] = self.generation
+
+            if len(self.invalidations) > MAX_INVALIDATIONS:
+                self.invalidations.clear()
+                self.forgotten_generation = self.generation
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_size = 0
+
+    def size(self):
+        with self.lock:
+            return self.total_size
+
+    def stats(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+                'size': self.total_size,
+                'max_size': self.max_size
+            }
+
+
+memory_cache = MemoryCache(dhubrc.get_memory_cache_size())
@@ -21,11 +21,77 @@
 # MA  02110-1301, USA.
 
 import datetime
+import os
+from os.path import expanduser
 
 __author__ = 'Iván de Paz Centeno'
 
 
 CACHE_TIME = 60  # seconds for caching elements.
+HTTP_KEEP_ALIVE = True
+STREAM_CHUNK_SIZE = 1024 * 1024  # bytes read at once from streamed contents.
+
+# Process-wide memory cache of elements' content and metadata pages. Configurable in the "memory_cache"
+# section of .dhubrc.
+MEMORY_CACHE_SIZE = 256 * 1024 * 1024  # bytes
+
+# Local disk cache of elements' content. It can be configured in the "disk_cache" section of .dhubrc.
+DISK_CACHE_FOLDER = os.path.join(expanduser("~"), ".cache", "dhub", "content")
+DISK_CACHE_SIZE = 0  # bytes; 0 disables the disk cache.
+
+# Local index of the ids of the elements of each dataset and filter. It can be configured in the "id_index"
+# section of .dhubrc.
+ID_INDEX_ENABLED = True
+ID_INDEX_FOLDER = os.path.join(expanduser("~"), ".cache", "dhub", "ids")
+ID_INDEX_SIZE = 256 * 1024 * 1024  # bytes; the least recently used indexes are removed beyond it.
+
+# Contents larger than the threshold are uploaded in parts when the backend supports it. The acknowledged
+# parts are kept in the state folder to resume interrupted uploads. Configurable in the "resumable_uploads"
+# section of .dhubrc.
+RESUMABLE_UPLOADS_THRESHOLD = 64 * 1024 * 1024  # bytes
+RESUMABLE_UPLOADS_PART_SIZE = 8 * 1024 * 1024  # bytes
+RESUMABLE_UPLOADS_FOLDER = os.path.join(expanduser("~"), ".cache", "dhub", "uploads")
+
+# Worker threads per kind of workload. They can be overridden in the "executors" section of .dhubrc.
+EXECUTORS_WORKERS = {
+    'metadata': 4,          # element pages, bundles and token/server info.
+    'content_download': 4,  # element contents.
+    'content_upload': 4,    # direct content uploads (datasets without smart updater).
+    'flush': 8,             # batches sent by the smart updaters of every dataset.
+    'content_parts': 8,     # byte ranges of large contents, shared by all the ranged downloads.
+    'file_read': 4,         # local files signed by Dataset.sync_from_folder().
+}
+
+# Contents are downloaded in byte ranges of RANGED_DOWNLOADS_PART_SIZE, with up to RANGED_DOWNLOADS_CONCURRENCY
+# requests in flight per content. A concurrency of 1 disables ranged downloads. Configurable in the
+# "ranged_downloads" section of .dhubrc.
+RANGED_DOWNLOADS_PART_SIZE = 8 * 1024 * 1024  # bytes
+RANGED_DOWNLOADS_CONCURRENCY = 4
+
+# The smart updater sends a batch once it is full (Page-Size elements or SMART_UPDATER_BATCH_BYTES bytes of
+# contents), or once its oldest update waited SMART_UPDATER_MAX_LATENCY seconds. Each updater keeps up to
+# SMART_UPDATER_BATCHES_IN_FLIGHT batches in flight, and sends SMART_UPDATER_METADATA_WEIGHT batches of metadata
+# per batch of contents while both wait. Configurable in the "smart_updater" section of .dhubrc.
+SMART_UPDATER_MAX_LATENCY = 0.05  # seconds
+SMART_UPDATER_BATCH_BYTES = 64 * 1024 * 1024  # bytes
+SMART_UPDATER_BATCHES_IN_FLIGHT = 4
+SMART_UPDATER_METADATA_WEIGHT = 4
+
+# Contents queued for upload and not sent yet are bounded to UPLOADS_MAX_IN_FLIGHT bytes per process (0 disables
+# the bound). Setting a content blocks while there is no room for it, up to UPLOADS_TIMEOUT seconds (None waits
+# forever). Configurable in the "uploads" section of .dhubrc.
+UPLOADS_MAX_IN_FLIGHT = 1024 * 1024 * 1024  # bytes
+UPLOADS_TIMEOUT = 600  # seconds
+
+# Optional journal on disk of the updates queued in the smart updaters. Updates that were not sent when the process
+# stopped are sent again the next time the dataset is opened. Configurable in the "journal" section of .dhubrc.
+JOURNAL_ENABLED = False
+JOURNAL_FOLDER = os.path.join(expanduser("~"), ".cache", "dhub", "journal")
+
+# Pages of metadata and of contents requested ahead by Dataset.filter_iter(). Configurable in the "prefetch"
+# section of .dhubrc.
+PREFETCH_PAGES = 4
+PREFETCH_CONTENT_PAGES = 2
 
 def now():
     return datetime.datetime.now()
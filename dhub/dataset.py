@@ -21,29 +21,77 @@
 # MA  02110-1301, USA.
 
 
-from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from concurrent.futures import wait
 import csv
+import hashlib
+from io import BytesIO
+from itertools import count
 import json
 import os
-from time import sleep
+import tempfile
+import threading
+from zipfile import ZipFile
 from pyfolder import PyFolder
-from pyzip import PyZip
-from dhub.config import now, CACHE_TIME, segments
+from pyzip import PyZip, InvalidKeysHashes
+from dhub.cache.disk_cache import disk_cache, DiskCache
+from dhub.cache.id_index import IdIndex, evict_indexes
+from dhub.cache.memory_cache import memory_cache, MemoryCache
+from dhub.config import segments, STREAM_CHUNK_SIZE
+from dhub.dhubrc import dhubrc
+from dhub.batch_sampler import BatchSampler
 from dhub.element import Element
+from dhub.executors import Executors, METADATA, CONTENT_DOWNLOAD, FILE_READ
+from dhub.file_content import FileContent, HASHES_FILE
 from dhub.wrapper.api_wrapper import APIWrapper
 from dhub.interpreters.interpreter import Interpreter
+from dhub.metadata_table import MetadataTable
+from dhub.tags import TagIndex, parse_tag
+from dhub.wrapper.journal import get_journal
 from dhub.wrapper.smart_updater import AsyncSmartUpdater
+from dhub.wrapper.upload_limiter import upload_limiter, UploadLimiter
 
 __author__ = 'Iván de Paz Centeno'
 
-pool_keys = ThreadPoolExecutor(4)
-pool_content = ThreadPoolExecutor(4)
+page_cache_generations = count()
+
+# Tags of the elements uploaded by Dataset.sync_from_folder(): their key in the folder and the signature of their
+# metadata and content when they were uploaded.
+SOURCE_TAG = "dhub_source"
+SIGNATURE_TAG = "dhub_signature"
+
+
+def _copy_content(source, target):
+    """
+    Copies the content from source into target in chunks of STREAM_CHUNK_SIZE bytes.
+    :param source: readable binary file object.
+    :param target: writable binary file object, or writable buffer (bytearray, memoryview...) big enough for the content.
+    :return: hex SHA256 of the content, as bytes.
+    """
+    digest = hashlib.sha256()
+
+    if hasattr(target, "write"):
+        chunk = source.read(STREAM_CHUNK_SIZE)
+        while len(chunk) > 0:
+            digest.update(chunk)
+            target.write(chunk)
+            chunk = source.read(STREAM_CHUNK_SIZE)
+    else:
+        buffer = memoryview(target).cast("B")
+        offset = 0
+        read = source.readinto(buffer[offset:offset + STREAM_CHUNK_SIZE])
+        while read > 0:
+            digest.update(buffer[offset:offset + read])
+            offset += read
+            read = source.readinto(buffer[offset:offset + STREAM_CHUNK_SIZE])
+
+    return digest.hexdigest().encode()
 
 
 class Dataset(APIWrapper):
     def __init__(self, url_prefix: str, title: str, description: str, reference: str, tags: list, token: str=None,
                  binary_interpreter: Interpreter=None, token_info: dict=None, server_info: dict=None,
-                 use_smart_updater: AsyncSmartUpdater=True, owner=None, api_url=None):
+                 use_smart_updater: AsyncSmartUpdater=True, owner=None, api_url=None, executors: Executors=None):
         self.data = {}
 
         self.binary_interpreter = binary_interpreter
@@ -61,20 +109,34 @@ class Dataset(APIWrapper):
         self.data['tags'] = tags
         self.data['reference'] = reference
         self.data['size'] = 0
+        self.dirty_fields = set()  # fields changed with the setters and not sent yet.
         self.elements_count = 0
         self.comments_count = 0
-        self.page_cache = {}
-        self.last_cache_time = now()
+        self.page_cache_generation = next(page_cache_generations)
         self.owner = owner
-
-        super().__init__(token, token_info=token_info, server_info=server_info, api_url=api_url)
+        self.memory_cache = memory_cache
+        """:type : MemoryCache"""
+        self.disk_cache = disk_cache
+        """:type : DiskCache"""
+        self.upload_limiter = upload_limiter
+        """:type : UploadLimiter"""
+        self.id_index = None  # IdIndex of the whole dataset, or None while it is validated.
+        self.id_index_opened = False
+        self.id_index_lock = threading.Lock()
+        self.tag_index = TagIndex(enabled=False)  # enabled by build_tag_index().
+        """:type : TagIndex"""
+        self.uploads = {}  # element id -> future of the content uploads sent without the smart updater.
+        self.uploads_lock = threading.Lock()
+
+        super().__init__(token, token_info=token_info, server_info=server_info, api_url=api_url, executors=executors)
 
         # Server_info is only available after super() init.
         if use_smart_updater:
-            self.smart_updater = AsyncSmartUpdater(self.server_info, self)
+            self.smart_updater = AsyncSmartUpdater(self.server_info, self, self.upload_limiter, self.__get_journal())
             """
             :type : AsyncSmartUpdater
             """
+            self.__replay_journal()
         else:
             self.smart_updater = None
             """
@@ -121,26 +183,37 @@ class Dataset(APIWrapper):
 
     def set_description(self, new_desc):
         self.data['description'] = new_desc
+        self.dirty_fields.add('description')
 
     def set_title(self, new_title):
         self.data['title'] = new_title
+        self.dirty_fields.add('title')
 
     def set_tags(self, new_tags):
         self.data['tags'] = new_tags
+        self.dirty_fields.add('tags')
 
     def set_reference(self, new_reference):
         self.data['reference'] = new_reference
+        self.dirty_fields.add('reference')
 
     def update(self):
-        self._patch_json("/datasets/{}".format(self.get_url_prefix()),
-                         json_data={k: v for k, v in self.data.items() if k != "url_prefix"})
+        """
+        Sends the fields changed with the setters since the last update. If none is known to be changed
+        (for example, tags modified in place), all the fields are sent.
+        """
+        fields = self.dirty_fields if len(self.dirty_fields) > 0 else [k for k in self.data if k != "url_prefix"]
+
+        self._patch_json("/datasets/{}".format(self.get_url_prefix()), json_data={k: self.data[k] for k in fields})
+        self.dirty_fields = set()
 
     @classmethod
-    def from_dict(cls, definition, token, binary_interpreter=None, token_info=None, server_info=None, owner=None, api_url=None):
+    def from_dict(cls, definition, token, binary_interpreter=None, token_info=None, server_info=None, owner=None, api_url=None,
+                  executors=None):
 
         dataset = cls(definition['url_prefix'], definition['title'], definition['description'], definition['reference'],
                       definition['tags'], token=token, binary_interpreter=binary_interpreter, token_info=token_info,
-                      server_info=server_info, owner=owner, api_url=api_url)
+                      server_info=server_info, owner=owner, api_url=api_url, executors=executors)
         dataset.data['fork_count'] = definition['fork_count']
         dataset.data['fork_father'] = definition['fork_father']
         dataset.data['size'] = definition['size']
@@ -154,17 +227,8 @@ class Dataset(APIWrapper):
         if http_ref is None: http_ref = ""
 
         if type(content) is str:
-            # content is a URI
-            if not os.path.exists(content):
-                raise Exception("content must be a binary data or a URI to a file.")
-
-            with open(content, "rb") as f:
-                content_bytes = f.read()
-
-            if self.binary_interpreter is None:
-                content = content_bytes
-            elif interpret:
-                content = self.binary_interpreter.cipher(content_bytes)
+            # content is a URI. The file is streamed when uploaded instead of being read here.
+            content = FileContent(content)
 
         result = self._post_json("datasets/{}/elements".format(self.get_url_prefix()), json_data={
             'title': title,
@@ -183,20 +247,11 @@ class Dataset(APIWrapper):
         post_kwargs = []
         content_list = []
         for element_kwargs in add_element_kwargs_list:
-            content = element_kwargs['content']
+            content = element_kwargs.get('content')
 
             if type(content) is str:
-                # content is a URI
-                if not os.path.exists(content):
-                    raise Exception("content must be a binary data or a URI to a file.")
-
-                with open(content, "rb") as f:
-                    content_bytes = f.read()
-
-                if self.binary_interpreter is None:
-                    content = content_bytes
-                elif interpret:
-                    content = self.binary_interpreter.cipher(content_bytes)
+                # content is a URI. The file is streamed when uploaded instead of being read here.
+                content = FileContent(content)
 
             content_list.append(content)
 
@@ -228,48 +283,191 @@ class Dataset(APIWrapper):
 
         self.refresh()
         elements = [Element.from_dict(element, self, self.token, self.binary_interpreter, token_info=self.token_info,
-                                  server_info=self.server_info, smart_updater=self.smart_updater, api_url=self.api_url) for element in result]
+                                  server_info=self.server_info, smart_updater=self.smart_updater, api_url=self.api_url,
+                              executors=self.executors) for element in result]
 
         for element, content in zip(elements, content_list):
-            element.set_content(content, interpret)
+            if content is not None:
+                element.set_content(content, interpret)
 
         return elements
 
-    def _request_segment(self, ids):
+    def _request_definitions(self, ids):
+        """
+        Retrieves the elements with the given ids, without their contents.
+        :return: list of elements, in the order of the ids.
+        """
         results = self._get_json("datasets/{}/elements/bundle".format(self.get_url_prefix()),
                                  json_data={'elements': ids})
 
-        # Warning: what if 'result' does not have the elements ordered in the same way as 'ids'?
-        # Todo: reorder 'elements' to match the order of 'ids'
+        # The backend does not guarantee the order of the results.
+        results_by_id = {result['_id']: result for result in results}
+        results = [results_by_id[element_id] for element_id in ids if element_id in results_by_id]
+
         elements = [
             Element.from_dict(result, self, self.token, self.binary_interpreter, token_info=self.token_info,
-                              server_info=self.server_info, smart_updater=self.smart_updater, api_url=self.api_url)
+                              server_info=self.server_info, smart_updater=self.smart_updater, api_url=self.api_url,
+                              executors=self.executors)
             for result in results
             ]
 
-        future = pool_content.submit(self.__retrieve_segment_contents, ids)
+        return elements
+
+    def _request_segment(self, ids):
+        elements = self._request_definitions(ids)
+        future = self.executors.submit(CONTENT_DOWNLOAD, self.__retrieve_segment_contents, ids)
 
         for element in elements:
             element.content_promise = future
 
         return elements
 
+    def _content_cache_key(self, element_id):
+        return "{}|{}/{}".format(self.api_url, self.get_url_prefix(), element_id)
+
     def __retrieve_segment_contents(self, ids):
+        """
+        Retrieves the contents of the given elements into the memory cache, looking for them in the memory cache,
+        then in the disk cache and finally in the backend.
+        :param ids: list of ids of the elements.
+        :return: dict with the contents that could not be stored in the memory cache, by element id.
+        """
+        # Taken before checking the queued uploads. See Element.set_content().
+        memory_generation = self.memory_cache.get_generation()
+        disk_generation = self.disk_cache.get_generation()
+
+        if self.smart_updater is not None and self.smart_updater.is_content_update_queued(ids):
+            self.smart_updater.wait_for_elements_content_update(ids)
+
+        contents = {}
+        missing_ids = []
+
+        for element_id in ids:
+            cache_key = self._content_cache_key(element_id)
+
+            if self.memory_cache.get(cache_key) is not None:
+                continue
+
+            content = self.disk_cache.get(cache_key)
+
+            if content is None:
+                missing_ids.append(element_id)
+            else:
+                contents[element_id] = content
+
+        if len(missing_ids) > 0:
+            packet_bytes = self._get_binary("datasets/{}/elements/content".format(self.get_url_prefix()),
+                                            json_data={'elements': missing_ids})
+            packet = PyZip().from_bytes(packet_bytes)
+
+            for element_id, content in packet.items():
+                self.disk_cache.put(self._content_cache_key(element_id), content, disk_generation)
+                contents[element_id] = content
 
+        return {element_id: content for element_id, content in contents.items()
+                if not self.memory_cache.put(self._content_cache_key(element_id), content, len(content), memory_generation)}
+
+    def __write_content(self, element_id, source, size, destination):
+        target = destination(element_id, size)
+
+        if target is None:
+            return None
+
+        try:
+            return _copy_content(source, target)
+        finally:
+            if hasattr(target, "close"):
+                target.close()
+
+    def __stream_segment_contents(self, ids, destination):
         if self.smart_updater is not None and self.smart_updater.is_content_update_queued(ids):
             self.smart_updater.wait_for_elements_content_update(ids)
 
-        packet_bytes = self._get_binary("datasets/{}/elements/content".format(self.get_url_prefix()),
-                                        json_data={'elements': ids})
-        packet = PyZip().from_bytes(packet_bytes)
+        missing_ids = []
+
+        for element_id in ids:
+            cache_key = self._content_cache_key(element_id)
+            content = self.memory_cache.get(cache_key)
+
+            if content is None:
+                content = self.disk_cache.get(cache_key)
+
+            if content is None:
+                missing_ids.append(element_id)
+            else:
+                with BytesIO(content) as source:
+                    self.__write_content(element_id, source, len(content), destination)
+
+        if len(missing_ids) == 0:
+            return
+
+        # The bundle is spooled to a temporary file once it exceeds one chunk; contents are then
+        # decompressed one by one straight into their destinations.
+        with tempfile.SpooledTemporaryFile(max_size=STREAM_CHUNK_SIZE) as bundle:
+            self._get_to_file("datasets/{}/elements/content".format(self.get_url_prefix()), bundle,
+                              json_data={'elements': missing_ids})
+            bundle.seek(0)
+
+            with ZipFile(bundle) as z:
+                hashes = None
+                invalid_hashes = []
+
+                if HASHES_FILE in z.namelist():
+                    hashes = PyZip().from_bytes(z.read(HASHES_FILE), inflate=False)
+
+                for info in z.infolist():
+                    if info.filename == HASHES_FILE or info.filename.endswith("/"):
+                        continue
+
+                    with z.open(info) as source:
+                        digest = self.__write_content(info.filename, source, info.file_size, destination)
 
-        return dict(packet)
+                    if digest is not None and hashes is not None and digest != hashes[info.filename]:
+                        invalid_hashes.append(info.filename)
+
+                if len(invalid_hashes) > 0:
+                    raise InvalidKeysHashes(invalid_hashes)
+
+    def stream_contents(self, ids, destination):
+        """
+        Writes the contents of the given elements directly into their destinations, reading them from the
+        backend in chunks. Peak memory is bounded by the chunk size instead of the size of the contents.
+        :param ids: list of ids of the elements.
+        :param destination: function(element_id, size) that returns where the content of the element must be
+        written: either a writable binary file object, which is closed afterwards, or a writable buffer
+        (bytearray, memoryview, ...) of at least size bytes. It may return None to skip the element.
+        It is invoked from several threads at once.
+        """
+        ps = self.server_info['Page-Size']
+        futures = [self.executors.submit(CONTENT_DOWNLOAD, self.__stream_segment_contents, segment, destination)
+                   for segment in segments(ids, ps)]
+
+        for future in futures:
+            future.result()
 
     def __wait_for_elements_ready(self, ids):
         if self.smart_updater is not None:
             if self.smart_updater.is_element_update_queued(ids):
                 self.smart_updater.wait_for_elements_update(ids)
 
+    def _request_elements(self, ids):
+        """
+        Requests the elements with the given ids in segments of Page-Size elements. The contents of each
+        segment are downloaded in the background as soon as its elements arrive.
+        :return: list of futures of the elements of each segment, in the same order as the ids.
+        """
+        ps = self.server_info['Page-Size']
+        self.__wait_for_elements_ready(ids)
+
+        return [self.executors.submit(METADATA, self._request_segment, segment) for segment in segments(ids, ps)]
+
+    def sampler(self, batch_size, seed=None, shuffle=True, drop_last=False, prefetch_batches=2, options=None):
+        """
+        Creates a sampler of mini-batches of elements, as the ones used in training loops. See BatchSampler.
+        """
+        return BatchSampler(self, batch_size, seed=seed, shuffle=shuffle, drop_last=drop_last,
+                            prefetch_batches=prefetch_batches, options=options)
+
     def __getitem__(self, key):
         options = None
 
@@ -284,6 +482,15 @@ class Dataset(APIWrapper):
             else:
                 key = 0
 
+        if type(key) is list:
+            # List of ids (as returned by query_tags()). A list is returned even for a single id.
+            elements = []
+
+            for future in self._request_elements(key):
+                elements += future.result()
+
+            return elements
+
         if type(key) is int:
             if key < 0:
                 key += len(self)
@@ -299,15 +506,9 @@ class Dataset(APIWrapper):
             if key.stop is None: stop = len(self)
             if key.stop < 0: stop = len(self) - stop
 
-            ps = self.server_info['Page-Size']
-
-            ids = []
-            for i in range(start, stop, step):
-                ids.append(self._get_key(i, options=options))
+            ids = self._get_keys(start, stop, step, options=options)
 
-            self.__wait_for_elements_ready(ids)
-
-            futures = [pool_keys.submit(self._request_segment, segment) for segment in segments(ids, ps)]
+            futures = self._request_elements(ids)
 
             elements = []
 
@@ -320,8 +521,9 @@ class Dataset(APIWrapper):
                 response = self._get_json("datasets/{}/elements/{}".format(self.get_url_prefix(), key))
                 element = Element.from_dict(response, self, self.token, self.binary_interpreter,
                                             token_info=self.token_info, server_info=self.server_info,
-                                            smart_updater=self.smart_updater, api_url=self.api_url)
-                element.content_promise = pool_content.submit(element._retrieve_content)
+                                            smart_updater=self.smart_updater, api_url=self.api_url,
+                              executors=self.executors)
+                element.content_promise = self.executors.submit(CONTENT_DOWNLOAD, element._retrieve_content)
                 elements = [element]
 
             except Exception as ex:
@@ -368,9 +570,7 @@ class Dataset(APIWrapper):
             if key.stop is None: stop = len(self)
             if key.stop < 0: stop = len(self) - stop
 
-            ps = self.server_info['Page-Size']
-
-            ids = [self._get_key(i, options=options) for i in range(start, stop, step)]
+            ids = self._get_keys(start, stop, step, options=options)
 
         elif type(key) is str:
                 ids = [key]
@@ -382,12 +582,18 @@ class Dataset(APIWrapper):
         else:
             raise KeyError("{} not found".format(key))
 
+        for element_id in ids:
+            self.memory_cache.invalidate(self._content_cache_key(element_id))
+            self.disk_cache.invalidate(self._content_cache_key(element_id))
+            self.tag_index.remove(element_id)
+
         self.refresh()
         return result
 
     def _get_elements(self, page, filter_options=None):
         return [Element.from_dict(element, self, self.token, self.binary_interpreter, token_info=self.token_info,
-                                  server_info=self.server_info, smart_updater=self.smart_updater, api_url=self.api_url) for element in
+                                  server_info=self.server_info, smart_updater=self.smart_updater, api_url=self.api_url,
+                              executors=self.executors) for element in
                 self._get_json("datasets/{}/elements".format(self.get_url_prefix()), extra_data={'page': page}, json_data={'options': filter_options})]
 
     def fork(self, new_prefix: str, title: str=None, description: str=None, tags: list=None, reference: str=None,
@@ -410,77 +616,286 @@ class Dataset(APIWrapper):
         destination.refresh()
         return destination[result['url_prefix']]
 
-    def filter_iter(self, options=None, cache_content=False):
+    def filter_iter(self, options=None, cache_content=False, prefetch_pages=None, prefetch_content_pages=None):
         """
-        :return:
+        Iterates over the elements that match the options. Pages are requested ahead of the consumer, so
+        that the iteration is bound by the bandwidth rather than by the latency of each request.
+        :param options: filter options of the elements.
+        :param cache_content: whether the contents of the elements are downloaded along with them.
+        :param prefetch_pages: pages of metadata requested ahead. Defaults to the "prefetch" section of .dhubrc.
+        :param prefetch_content_pages: pages whose contents are requested ahead when cache_content is True.
+        Defaults to the "prefetch" section of .dhubrc.
+        :return: generator of elements.
         """
         if options is None:
             options = {}
 
-        ps = self.server_info['Page-Size']
-        number_of_pages = len(self) // ps + int(len(self) % ps > 0)
+        if prefetch_pages is None:
+            prefetch_pages = dhubrc.get_prefetch_pages()
 
-        buffer = None
+        if prefetch_content_pages is None:
+            prefetch_content_pages = dhubrc.get_prefetch_content_pages()
 
-        for page in range(number_of_pages):
+        ps = self.server_info['Page-Size']
+        last_page = len(self) // ps + int(len(self) % ps > 0)
 
-            if buffer is None:
-                buffer = pool_keys.submit(self._get_elements, page, options)
+        pages_window = deque()  # futures of the pages' elements, in order.
+        contents_window = deque()  # [elements, future of their contents] ready to be yielded.
+        # Pages kept in the window besides the one being yielded, which is popped from it.
+        contents_depth = max(1, prefetch_content_pages) if cache_content else 0
+        next_page = 0
 
-            buffer2 = pool_keys.submit(self._get_elements, page + 1, options)
+        try:
+            while True:
+                while len(pages_window) < max(1, prefetch_pages) and next_page < last_page:
+                    pages_window.append(self.executors.submit(METADATA, self._get_elements, next_page, options))
+                    next_page += 1
+
+                # Pages are only waited for when there is nothing else to yield.
+                while len(contents_window) <= contents_depth and len(pages_window) > 0 and \
+                        (len(contents_window) == 0 or pages_window[0].done()):
+                    elements = pages_window.popleft().result()
+
+                    if len(elements) < ps:
+                        # Last page of the filtered elements: nothing is requested beyond it.
+                        last_page = next_page
+                        for future in pages_window:
+                            future.cancel()
+                        pages_window.clear()
+
+                    if len(elements) == 0:
+                        break
+
+                    if cache_content:
+                        future = self.executors.submit(CONTENT_DOWNLOAD, self.__retrieve_segment_contents,
+                                                       [element.get_id() for element in elements])
+                    else:
+                        future = None
+
+                    contents_window.append([elements, future])
+
+                if len(contents_window) == 0:
+                    break
+
+                elements, future = contents_window.popleft()
+
+                for element in elements:
+                    if cache_content:
+                        element.content_promise = future
+                    yield element
+        finally:
+            for future in pages_window:
+                future.cancel()
+
+            for elements, future in contents_window:
+                if future is not None:
+                    future.cancel()
 
-            elements = buffer.result()
+    def __iter__(self) -> Element:
+        for element in self.filter_iter():
+            yield element
 
-            if len(elements) == 0:
-                break
+    def __page_cache_key(self, page, options):
+        return "page", self.get_url_prefix(), self.page_cache_generation, json.dumps(options), page
 
-            if cache_content:
-                future = pool_content.submit(self.__retrieve_segment_contents, [element.get_id() for element in elements])
-            else:
-                future = None
+    def _get_page(self, page, options=None):
+        cache_key = self.__page_cache_key(page, options)
+        elements = self.memory_cache.get(cache_key)
+
+        if elements is None:
+            elements = self._get_json("datasets/{}/elements".format(self.get_url_prefix()), extra_data={'page': page},
+                                      json_data={'options': options})
+            self.memory_cache.put(cache_key, elements, len(json.dumps(elements)))
+            self.__index_page(page, options, elements)
 
             for element in elements:
-                if cache_content:
-                    element.content_promise = future
-                yield element
+                self.tag_index.update(element['_id'], element['tags'])
 
-            buffer = buffer2
+        return elements
 
-    def __iter__(self) -> Element:
-        for element in self.filter_iter():
-            yield element
+    def __get_id_index(self, options):
+        """
+        Retrieves the local index of ids of the dataset, opening it the first time.
+        Filters are not indexed: the elements that match them change whenever the metadata of an element is
+        updated, without changing the elements count. Their positions are taken from the page cache, which expires.
+        :return: IdIndex, or None if the options filter the elements, or the index is disabled or not available yet.
+        """
+        if not dhubrc.get_id_index_enabled() or options:
+            return None
+
+        with self.id_index_lock:
+            if self.id_index_opened:
+                return self.id_index
+
+            self.id_index_opened = True  # pages retrieved meanwhile are not indexed.
+
+        file_name = hashlib.sha256("{}|{}|{}".format(self.api_url, self.get_url_prefix(), json.dumps(None)).encode()).hexdigest()
+        file_name = os.path.join(dhubrc.get_id_index_folder(), file_name)
+        index = IdIndex(file_name, self.elements_count)
+        evict_indexes(dhubrc.get_id_index_folder(), dhubrc.get_id_index_size(), keep=file_name)
+
+        # The first page tells whether the elements changed in the backend since the index was written.
+        ps = int(self.server_info['Page-Size'])
+        elements = self._get_page(0, options)
+
+        if not index.put(0, [element['_id'] for element in elements], len(elements) < ps):
+            index = None
+
+        with self.id_index_lock:
+            self.id_index = index
+
+        return index
+
+    def __index_page(self, page, options, elements):
+        index = self.__get_id_index(options)
+
+        if index is None:
+            return
+
+        ps = int(self.server_info['Page-Size'])
+
+        if not index.put(page * ps, [element['_id'] for element in elements], len(elements) < ps):
+            with self.id_index_lock:
+                self.id_index = None
+
+    def __resize_id_index(self):
+        with self.id_index_lock:
+            index = self.id_index
+
+        if index is not None:
+            index.resize(self.elements_count)
 
     def _get_key(self, key_index, options=None):
+        index = self.__get_id_index(options)
+        element_id = None if index is None else index.get(key_index)
+
+        if element_id is None:
+            ps = int(self.server_info['Page-Size'])
+            element_id = self._get_page(key_index // ps, options=options)[key_index % ps]['_id']
+
+        return element_id
+
+    def _get_keys(self, start, stop, step=1, options=None):
+        """
+        Retrieves the ids of the elements in range(start, stop, step). Each page touched by the range is
+        retrieved once, and those not cached are requested in parallel.
+        :return: list of ids. IndexError is raised if the range goes beyond the last element.
+        """
+        indexes = range(start, stop, step)
+
+        if len(indexes) == 0:
+            return []
+
+        index = self.__get_id_index(options) if step > 0 else None
+        ids = None if index is None else index.get_range(start, stop, step)
+
+        if ids is not None:
+            return ids
+
         ps = int(self.server_info['Page-Size'])
-        key_page = key_index // ps
-        index = key_index % ps
+        first_page = min(indexes[0], indexes[-1]) // ps
+        last_page = max(indexes[0], indexes[-1]) // ps
 
-        dumped_options = json.dumps(options)
+        if abs(step) > ps:
+            # Most of the pages of the range are skipped.
+            pages = sorted({index // ps for index in indexes})
+        else:
+            pages = range(first_page, last_page + 1)
 
-        if json.dumps(options) not in self.page_cache:
-            self.page_cache[dumped_options] = {}
+        pages_elements = {page: self.memory_cache.get(self.__page_cache_key(page, options)) for page in pages}
+        futures = {page: self.executors.submit(METADATA, self._get_page, page, options)
+                   for page, elements in pages_elements.items() if elements is None}
 
-        try:
-            if (now() - self.last_cache_time).total_seconds() > CACHE_TIME:
-                self.page_cache[dumped_options].clear()
+        for page, future in futures.items():
+            pages_elements[page] = future.result()
+
+        if abs(step) > ps:
+            return [pages_elements[index // ps][index % ps]['_id'] for index in indexes]
+
+        offset = first_page * ps
+        page_ids = [element['_id'] for page in pages for element in pages_elements[page]]
+
+        if offset + len(page_ids) <= max(indexes[0], indexes[-1]):
+            raise IndexError("index {} out of range".format(max(indexes[0], indexes[-1])))
+
+        if step > 0:
+            return page_ids[start - offset:stop - offset:step]
+
+        return [page_ids[index - offset] for index in indexes]
+
+    def __get_definitions(self, options=None):
+        """
+        Retrieves the definitions of all the elements that match the options, requesting the pages in parallel.
+        Pages are requested by windows, so that a filter does not request pages beyond its last one.
+        :return: list of dicts of the elements.
+        """
+        ps = self.server_info['Page-Size']
+        pages_count = len(self) // ps + int(len(self) % ps > 0)
+        window = max(1, self.executors.get_workers(METADATA)) * 2
+        definitions = []
+        last_page_found = False
+
+        for first_page in range(0, pages_count, window):
+            futures = [self.executors.submit(METADATA, self._get_page, page, options)
+                       for page in range(first_page, min(first_page + window, pages_count))]
+
+            for future in futures:
+                elements = future.result() if not last_page_found else []
+                definitions.extend(elements)
+                last_page_found = last_page_found or len(elements) < ps
 
-            page = self.page_cache[dumped_options][key_page]
+            if last_page_found:
+                break
+
+        return definitions
 
-        except KeyError as ex:
-            # Cache miss
-            page = self._get_json("datasets/{}/elements".format(self.get_url_prefix()), extra_data={'page': key_page},
-                                                                                        json_data={'options': options})
-            self.page_cache[dumped_options][key_page] = page
-            self.last_cache_time = now()
+    def metadata_table(self, options=None, file_name=None):
+        """
+        Retrieves the metadata of all the elements that match the options as a MetadataTable, whose columns
+        are numpy arrays. Pages are requested in parallel. Requires numpy.
+        :param options: filter options of the elements.
+        :param file_name: if given, the table is also saved into this .npz file. It can be loaded later with
+        MetadataTable.load().
+        :return: MetadataTable
+        """
+        table = MetadataTable.from_definitions(self.__get_definitions(options))
 
-        return page[index]['_id']
+        if file_name is not None:
+            table.save(file_name)
+
+        return table
+
+    def build_tag_index(self):
+        """
+        Indexes the tags of all the elements of the dataset, requesting the pages in parallel. The index is kept up
+        to date afterwards, as elements are retrieved and their tags are set.
+        """
+        self.tag_index.enable()
+
+        for definition in self.__get_definitions():
+            self.tag_index.update(definition['_id'], definition['tags'])
+
+    def query_tags(self, query):
+        """
+        Finds the elements whose tags match the query in the tag index, which must be built first:
+
+            dataset.build_tag_index()
+            ids = dataset.query_tags((Tag("split") == "train") & ~Tag("label").startswith("cat"))
+            elements = dataset[ids]
+
+        :param query: TagQuery.
+        :return: list of ids of the elements.
+        """
+        if not self.tag_index.enabled:
+            raise Exception("The tag index is not built. Call build_tag_index() first.")
+
+        return self.tag_index.query(query)
 
     def keys(self, page=-1):
         if page == -1:
-            data = [self._get_key(i) for i in range(len(self))]
+            data = self._get_keys(0, len(self))
         else:
-            data = [element['_id'] for element in
-                    self._get_json("datasets/{}/elements".format(self.get_url_prefix()), extra_data={'page': page})]
+            data = [element['_id'] for element in self._get_page(page)]
 
         return data
 
@@ -532,15 +947,47 @@ class Dataset(APIWrapper):
         if metadata_format not in format_saver:
             raise Exception("format {} for metadata not supported.".format(metadata_format))
 
-        pyfolder = PyFolder(folder)
+        pyfolder = PyFolder(folder, allow_override=True)
+        content_folder = os.path.join(pyfolder.folder_root, "content")
+        ps = self.server_info['Page-Size']
+
+        if not only_metadata:
+            os.makedirs(content_folder, exist_ok=True)
+
+        file_names = {}
+
+        def part_file(element_id):
+            return os.path.join(content_folder, file_names[element_id] + ".part")
+
+        def destination(element_id, size):
+            return open(part_file(element_id), "wb")
+
+        def save_segment(segment):
+            # Contents are written into ".part" files, which replace the saved ones once the whole segment is
+            # verified: a failed save leaves no partial or corrupted content behind.
+            try:
+                self.__stream_segment_contents(segment, destination)
+            except Exception:
+                for element_id in segment:
+                    try:
+                        os.remove(part_file(element_id))
+                    except FileNotFoundError:
+                        pass
+                raise
+
+            for element_id in segment:
+                if os.path.exists(part_file(element_id)):
+                    os.replace(part_file(element_id), os.path.join(content_folder, file_names[element_id]))
 
         print("Collecting elements...")
         metadata = {}
         id = -1
         count = len(self)
         it = -1
+        segment = []
+        pending_segments = deque()
 
-        for element in self.filter_iter(cache_content=not only_metadata):
+        for element in self.filter_iter():
             it += 1
 
             print("\rProgress: {}%".format(round(it / (count + 0.0001) * 100, 2)), end="", flush=True)
@@ -551,7 +998,7 @@ class Dataset(APIWrapper):
                 id = element.get_id()
 
             if elements_extension is None:
-                element_id = id
+                element_id = str(id)
             else:
                 element_id = "{}.{}".format(id, elements_extension)
 
@@ -563,8 +1010,23 @@ class Dataset(APIWrapper):
                 'tags': element.get_tags(),
             }
 
-            if not only_metadata:
-                pyfolder[os.path.join("content", element_id)] = element.get_content(interpret=False)
+            if not only_metadata and element.has_content:
+                file_names[element.get_id()] = element_id
+                segment.append(element.get_id())
+
+            # Contents are streamed to disk in segments, while the next pages of metadata are iterated.
+            if len(segment) == ps:
+                pending_segments.append(self.executors.submit(CONTENT_DOWNLOAD, save_segment, segment))
+                segment = []
+
+            while len(pending_segments) > self.executors.get_workers(CONTENT_DOWNLOAD):
+                pending_segments.popleft().result()
+
+        if len(segment) > 0:
+            pending_segments.append(self.executors.submit(CONTENT_DOWNLOAD, save_segment, segment))
+
+        for future in pending_segments:
+            future.result()
 
         print("\rProgress: 100%", end="", flush=True)
 
@@ -604,7 +1066,8 @@ class Dataset(APIWrapper):
         self.comments_count = dataset_data['comments_count']
         self.data = {k: dataset_data[k] for k in ['url_prefix', 'title', 'description', 'reference', 'tags',
                                                   'fork_count', 'fork_father', 'size']}
-        self.page_cache = {}  # clearing the cache to avoid errors
+        self.page_cache_generation = next(page_cache_generations)  # cached pages are outdated now
+        self.__resize_id_index()  # kept when elements were appended, reset when they were removed.
 
     def clear(self):
         ps = self.server_info['Page-Size']
@@ -612,26 +1075,113 @@ class Dataset(APIWrapper):
         for segment in segments(self.keys(), ps):
             self._delete_json('datasets/{}/elements/bundle'.format(self.get_url_prefix()), json_data={'elements': segment})
 
+            for element_id in segment:
+                self.memory_cache.invalidate(self._content_cache_key(element_id))
+                self.disk_cache.invalidate(self._content_cache_key(element_id))
+                self.tag_index.remove(element_id)
+
         self.refresh()
 
     def close(self, force=False):
         if self.smart_updater is not None:
             self.smart_updater.stop(cancel_pending_jobs=force)
 
+            if self.smart_updater.journal is not None:
+                self.smart_updater.journal.clear_if_done()
+
+    def __get_journal(self):
+        if not dhubrc.get_journal_enabled() or 'url_prefix' not in self.data:
+            return None
+
+        file_name = hashlib.sha256("{}|{}".format(self.api_url, self.get_url_prefix()).encode()).hexdigest()
+        return get_journal(os.path.join(dhubrc.get_journal_folder(), file_name))
+
+    def __replay_journal(self):
+        """
+        Queues again the updates logged in the journal by a previous process and not acknowledged by the backend.
+        Sending them twice is harmless: updates set fields and contents, and the last one of each element wins.
+        """
+        journal = self.smart_updater.journal
+
+        if journal is None:
+            return
+
+        records = journal.replay()
+
+        if len(records) > 0:
+            print("Resuming {} pending updates of the dataset {}.".format(len(records), self.get_url_prefix()))
+
+        for record in records:
+            if record['kind'] == 'element_update':
+                self.smart_updater.queue_update(record['url'], record['id'], record['payload'])
+            else:
+                try:
+                    content = FileContent(record['file'])
+                except Exception:
+                    print("Warning: the content of the element {} is no longer available in {}.".format(record['id'],
+                                                                                                      record['file']))
+                    journal.log_done(record['kind'], {record['id']: [record['seq']]})  # it can not be sent.
+                    continue
+
+                self.smart_updater.queue_content_update(record['url'], record['id'], content)
+
+            # Queued again under a new record, which stands for the replayed one from now on.
+            journal.log_done(record['kind'], {record['id']: [record['seq']]})
+
+    def _track_upload(self, element_id, future):
+        with self.uploads_lock:
+            self.uploads[element_id] = future
+
+        future.add_done_callback(lambda f: self.__untrack_upload(element_id, f))
+
+    def __untrack_upload(self, element_id, future):
+        # Failed uploads are kept to be reported by sync().
+        if future.exception() is not None:
+            return
+
+        with self.uploads_lock:
+            if self.uploads.get(element_id) is future:
+                del self.uploads[element_id]
+
     def sync(self, update_size=True):
+        """
+        Waits for the pending updates and content uploads of the dataset.
+        Raises an exception with the elements ids whose update or upload failed. Large contents uploaded
+        in parts can be resumed by setting the same content again.
+        """
         if self.smart_updater is not None:
-            while self.smart_updater.queues_busy():
+            self.smart_updater.flush()
+
+            while not self.smart_updater.wait_until_done(1):
                 print("\rTasks pending: {}         ".format(self.smart_updater.tasks_pending), end="", flush=True)
-                sleep(1)
             print("\rTasks pending: {}         ".format(self.smart_updater.tasks_pending), end="", flush=True)
         print("\n")
 
+        with self.uploads_lock:
+            uploads = dict(self.uploads)
+
+        failed_ids = [element_id for element_id, future in uploads.items() if future.exception() is not None]
+
+        with self.uploads_lock:
+            for element_id in failed_ids:
+                if self.uploads.get(element_id) is uploads[element_id]:
+                    del self.uploads[element_id]
+
+        if self.smart_updater is not None:
+            for _, elements_ids, _ in self.smart_updater.pop_failed_updates():
+                failed_ids.extend(elements_ids)
+
+        if len(failed_ids) > 0:
+            raise Exception("Failed to send the updates of the elements: {}".format(failed_ids))
+
         if update_size:
             self.__update_size()
 
-    def load_from_folder(self, folder):
-        self.clear()
-
+    def __open_folder(self, folder):
+        """
+        Reads the metadata of a folder written by save_to_folder().
+        :return: dict of key -> metadata of the element, and root of the contents folder (None if there is none).
+        """
         pyfolder = PyFolder(folder)
 
         if "metadata.json" in pyfolder:
@@ -641,33 +1191,34 @@ class Dataset(APIWrapper):
         else:
             raise FileNotFoundError("No metadata.json or metadata.csv found.")
 
-        content_available = "content" in pyfolder
-
-        if not content_available:
-            content_folder = None
+        if "content" not in pyfolder:
             print("Warning: elements do not have content associated.")
-        else:
-            # We don't want PyFolder to interpret the elements of the dataset.
-            content_folder = PyFolder(pyfolder["content"].folder_root, interpret=False)
+            return metadata, None
 
+        # Contents are referenced by file name and streamed when uploaded, so they are not read here.
+        return metadata, pyfolder["content"].folder_root
+
+    def load_from_folder(self, folder):
+        self.clear()
+
+        metadata, content_folder_root = self.__open_folder(folder)
+        content_available = content_folder_root is not None
+
+        # Setting the contents blocks while the uploads in flight take all the room of the upload limiter, so the
+        # elements are added as they are read.
         elements = []
-        batch_size = 0
         for key, values in metadata.items():
 
             element = {k: v for k, v in values.items() if k != "id"}
 
             if content_available:
-                element['content'] = content_folder[key]
-                batch_size += len(element['content'])
+                element['content'] = FileContent(os.path.join(content_folder_root, key))
 
             elements.append(element)
 
-            if batch_size >= 1*1024*1024*1024:  # each 1 GB, perform upload.
-                print("* Uploading elements...")
+            if len(elements) >= self.server_info['Page-Size']:
                 self.add_elements(elements)
-                batch_size = 0
                 elements = []
-                self.sync(update_size=False)
 
         if len(elements) > 0:
             self.add_elements(elements)
@@ -676,6 +1227,155 @@ class Dataset(APIWrapper):
         self.sync()
         print("\rFinished uploading.")
 
+    @staticmethod
+    def __folder_signature(values, file_name, use_hash):
+        """
+        Signature of an element of a folder: a hash of its metadata and of the size and modification time of its
+        content file, or of the bytes of the content file if use_hash is True.
+        """
+        digest = hashlib.sha256(json.dumps(values, sort_keys=True).encode())
+
+        if file_name is None:
+            return digest.hexdigest()
+
+        if not use_hash:
+            stat = os.stat(file_name)
+            digest.update("|{}|{}".format(stat.st_size, stat.st_mtime_ns).encode())
+            return digest.hexdigest()
+
+        with open(file_name, "rb") as f:
+            chunk = f.read(STREAM_CHUNK_SIZE)
+            while len(chunk) > 0:
+                digest.update(chunk)
+                chunk = f.read(STREAM_CHUNK_SIZE)
+
+        return digest.hexdigest()
+
+    def __confirm_signatures(self, signed_elements):
+        """
+        Tags the elements with the signature of their folder counterpart once their contents are uploaded. Elements
+        whose upload failed keep their previous signature, so that the next sync uploads them again.
+        :param signed_elements: list of (element, signature).
+        """
+        elements_ids = [element.get_id() for element, _ in signed_elements]
+
+        if self.smart_updater is not None:
+            self.smart_updater.flush()
+            # Pages of large files may take long to upload: there is no time limit.
+            self.smart_updater.wait_for_elements_content_update(elements_ids, timeout=None)
+            failed_ids = self.smart_updater.get_failed_elements('binary')
+        else:
+            with self.uploads_lock:
+                uploads = [self.uploads.get(element_id) for element_id in elements_ids]
+
+            wait([future for future in uploads if future is not None])
+            failed_ids = {element_id for element_id, future in zip(elements_ids, uploads)
+                          if future is not None and future.exception() is not None}
+
+        for element, signature in signed_elements:
+            if element.get_id() not in failed_ids:
+                element.update_tags({SIGNATURE_TAG: signature})
+
+    def sync_from_folder(self, folder, use_hash=False):
+        """
+        Uploads the elements of a folder written by save_to_folder() that are new or changed since the last sync,
+        keeping the rest of the elements of the dataset. Elements are matched by their key in the folder, kept in
+        the "dhub_source" tag, and compared by a signature of their metadata and content file, kept in the
+        "dhub_signature" tag once the content is uploaded. An interrupted sync is resumed by calling it again.
+
+        The folder is processed in pages of elements: the files of each page are signed in parallel by the
+        "file_read" executor, and their contents are streamed from disk when uploaded.
+        :param use_hash: whether contents are compared by the hash of their bytes instead of by their size and
+        modification time.
+        :return: dict with the number of elements 'added', 'updated' and 'skipped'.
+        """
+        metadata, content_folder_root = self.__open_folder(folder)
+
+        print("Collecting elements...")
+        remote = {}  # key in the folder -> (element id, signature)
+
+        for element in self.filter_iter():
+            key = element.tags.get(SOURCE_TAG, None)
+
+            if key is not None:
+                remote[key] = (element.get_id(), element.get_tag(SIGNATURE_TAG))
+
+        def folder_values(key):
+            # Tags of a previous sync, kept when the folder was saved from a synced dataset, are left out.
+            values = {k: v for k, v in metadata[key].items() if k != "id"}
+            values['tags'] = [tag for tag in values.get('tags', [])
+                              if not any(name in (SOURCE_TAG, SIGNATURE_TAG) for name, _ in parse_tag(tag))]
+            return values
+
+        def sign(key):
+            values = folder_values(key)
+            file_name = None if content_folder_root is None else os.path.join(content_folder_root, key)
+            return self.__folder_signature(values, file_name, use_hash)
+
+        print("Uploading elements...")
+        result = {'added': 0, 'updated': 0, 'skipped': 0}
+        signed_elements = []
+
+        for keys in segments(list(metadata), self.server_info['Page-Size']):
+            signatures = [self.executors.submit(FILE_READ, sign, key) for key in keys]
+            new_elements = []
+            new_signatures = []
+            changed = {}  # element id -> (key, signature)
+
+            for key, signature in zip(keys, signatures):
+                signature = signature.result()
+                element_id, remote_signature = remote.get(key, (None, None))
+
+                if element_id is None:
+                    element = folder_values(key)
+                    element['tags'].append({SOURCE_TAG: key})
+
+                    if content_folder_root is not None:
+                        element['content'] = FileContent(os.path.join(content_folder_root, key))
+
+                    new_elements.append(element)
+                    new_signatures.append(signature)
+                elif remote_signature != signature:
+                    changed[element_id] = (key, signature)
+                else:
+                    result['skipped'] += 1
+
+            # The signatures of the previous page are confirmed while this one is uploaded.
+            page_signed_elements = []
+
+            if len(new_elements) > 0:
+                page_signed_elements.extend(zip(self.add_elements(new_elements), new_signatures))
+                result['added'] += len(new_elements)
+
+            if len(changed) > 0:
+                # Only the metadata is retrieved: the old contents are about to be replaced.
+                for element in self._request_definitions(list(changed)):
+                    key, signature = changed[element.get_id()]
+                    values = folder_values(key)
+                    element.data = {'title': values['title'], 'description': values.get('description', ""),
+                                    'http_ref': values.get('http_ref', ""), 'tags': values['tags'] + [{SOURCE_TAG: key}]}
+                    element.update(['title', 'description', 'http_ref', 'tags'])
+                    self.tag_index.update(element.get_id(), element.get_tags())
+
+                    if content_folder_root is not None:
+                        element.set_content(FileContent(os.path.join(content_folder_root, key)))
+
+                    page_signed_elements.append((element, signature))
+
+                result['updated'] += len(changed)
+
+            if len(signed_elements) > 0:
+                self.__confirm_signatures(signed_elements)
+
+            signed_elements = page_signed_elements
+
+        if len(signed_elements) > 0:
+            self.__confirm_signatures(signed_elements)
+
+        self.sync()
+        print("\rFinished uploading.")
+        return result
+
     def __load_json(self, pyfolder):
         return pyfolder["metadata.json"]
 
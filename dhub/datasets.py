@@ -22,19 +22,20 @@
 
 from dhub.dataset import Dataset
 from dhub.dhubrc import dhubrc
+from dhub.executors import Executors
 from dhub.wrapper.api_wrapper import APIWrapper
 
 __author__ = 'Iván de Paz Centeno'
 
 class Datasets(APIWrapper):
-    def __init__(self, token_id=None, api_url=None):
+    def __init__(self, token_id=None, api_url=None, executors: Executors=None):
 
         try:
             token = dhubrc.lookup_token(token_id)
         except KeyError as ex:
             token = token_id
 
-        super().__init__(token, api_url=api_url)
+        super().__init__(token, api_url=api_url, executors=executors)
         self.refresh()
 
     def __len__(self):
@@ -114,7 +115,8 @@ class Datasets(APIWrapper):
         return [s for s in self]
 
     def refresh(self):
-        self.datasets = {d['url_prefix']: dict(definition=d, token=self.token, token_info=self.token_info, server_info=self.server_info, owner=self) for d in self._get_json("datasets")}
+        self.datasets = {d['url_prefix']: dict(definition=d, token=self.token, token_info=self.token_info, server_info=self.server_info, owner=self,
+                                               executors=self.executors) for d in self._get_json("datasets")}
 
     def __str__(self):
         return str(self.keys())
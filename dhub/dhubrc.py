@@ -23,14 +23,30 @@
 import os
 import json
 from os.path import expanduser
+from dhub.config import HTTP_KEEP_ALIVE, EXECUTORS_WORKERS, DISK_CACHE_FOLDER, DISK_CACHE_SIZE, \
+    MEMORY_CACHE_SIZE, ID_INDEX_ENABLED, ID_INDEX_FOLDER, ID_INDEX_SIZE, RESUMABLE_UPLOADS_THRESHOLD, RESUMABLE_UPLOADS_PART_SIZE, RESUMABLE_UPLOADS_FOLDER, \
+    RANGED_DOWNLOADS_PART_SIZE, RANGED_DOWNLOADS_CONCURRENCY, PREFETCH_PAGES, PREFETCH_CONTENT_PAGES, \
+    SMART_UPDATER_MAX_LATENCY, SMART_UPDATER_BATCH_BYTES, SMART_UPDATER_BATCHES_IN_FLIGHT, \
+    SMART_UPDATER_METADATA_WEIGHT, UPLOADS_MAX_IN_FLIGHT, UPLOADS_TIMEOUT, \
+    JOURNAL_ENABLED, JOURNAL_FOLDER
 
 __author__ = 'Iván de Paz Centeno'
 
+
+def _to_bool(value):
+    # Values of .dhubrc may be written as JSON booleans, numbers or strings ("false", "0", "no", "off"...).
+    if isinstance(value, str):
+        return value.strip().lower() not in ["", "false", "0", "no", "off"]
+
+    return bool(value)
+
+
 class DHubRc(object):
     def __init__(self):
         home = expanduser("~")
         self.token_lookup = {}
         self.backend = "http://localhost:5555/"
+        self.options = {}
         retry = False
 
         try:
@@ -39,6 +55,7 @@ class DHubRc(object):
 
             self.token_lookup = rc['token_lookup']
             self.backend = rc['backend']
+            self.options = rc
         except FileNotFoundError as ex:
             retry = True
             pass
@@ -52,6 +69,7 @@ class DHubRc(object):
 
             self.token_lookup = rc['token_lookup']
             self.backend = rc['backend']
+            self.options = rc
         except FileNotFoundError as ex:
             retry = True
             pass
@@ -65,4 +83,88 @@ class DHubRc(object):
     def get_backend(self):
         return self.backend
 
+    def get_http_pool_size(self, default=None):
+        pool_size = self.options.get('http_pool_size', default)
+
+        if pool_size is not None:
+            pool_size = int(pool_size)
+
+        return pool_size
+
+    def get_http_keep_alive(self):
+        return _to_bool(self.options.get('http_keep_alive', HTTP_KEEP_ALIVE))
+
+    def get_memory_cache_size(self):
+        return int(self.options.get('memory_cache', {}).get('max_size', MEMORY_CACHE_SIZE))
+
+    def get_disk_cache_folder(self):
+        return expanduser(self.options.get('disk_cache', {}).get('folder', DISK_CACHE_FOLDER))
+
+    def get_disk_cache_size(self):
+        return int(self.options.get('disk_cache', {}).get('max_size', DISK_CACHE_SIZE))
+
+    def get_id_index_enabled(self):
+        return _to_bool(self.options.get('id_index', {}).get('enabled', ID_INDEX_ENABLED))
+
+    def get_id_index_folder(self):
+        return expanduser(self.options.get('id_index', {}).get('folder', ID_INDEX_FOLDER))
+
+    def get_id_index_size(self):
+        return int(self.options.get('id_index', {}).get('max_size', ID_INDEX_SIZE))
+
+    def get_resumable_uploads_threshold(self):
+        return int(self.options.get('resumable_uploads', {}).get('threshold', RESUMABLE_UPLOADS_THRESHOLD))
+
+    def get_resumable_uploads_part_size(self):
+        return int(self.options.get('resumable_uploads', {}).get('part_size', RESUMABLE_UPLOADS_PART_SIZE))
+
+    def get_resumable_uploads_folder(self):
+        return expanduser(self.options.get('resumable_uploads', {}).get('folder', RESUMABLE_UPLOADS_FOLDER))
+
+    def get_ranged_downloads_part_size(self):
+        return int(self.options.get('ranged_downloads', {}).get('part_size', RANGED_DOWNLOADS_PART_SIZE))
+
+    def get_ranged_downloads_concurrency(self):
+        return int(self.options.get('ranged_downloads', {}).get('concurrency', RANGED_DOWNLOADS_CONCURRENCY))
+
+    def get_smart_updater_max_latency(self):
+        return float(self.options.get('smart_updater', {}).get('max_latency', SMART_UPDATER_MAX_LATENCY))
+
+    def get_smart_updater_batch_bytes(self):
+        return int(self.options.get('smart_updater', {}).get('batch_bytes', SMART_UPDATER_BATCH_BYTES))
+
+    def get_smart_updater_batches_in_flight(self):
+        return int(self.options.get('smart_updater', {}).get('batches_in_flight', SMART_UPDATER_BATCHES_IN_FLIGHT))
+
+    def get_smart_updater_metadata_weight(self):
+        return float(self.options.get('smart_updater', {}).get('metadata_weight', SMART_UPDATER_METADATA_WEIGHT))
+
+    def get_uploads_max_in_flight(self):
+        return int(self.options.get('uploads', {}).get('max_in_flight', UPLOADS_MAX_IN_FLIGHT))
+
+    def get_uploads_timeout(self):
+        timeout = self.options.get('uploads', {}).get('timeout', UPLOADS_TIMEOUT)
+
+        if timeout is not None:
+            timeout = float(timeout)
+
+        return timeout
+
+    def get_journal_enabled(self):
+        return _to_bool(self.options.get('journal', {}).get('enabled', JOURNAL_ENABLED))
+
+    def get_journal_folder(self):
+        return expanduser(self.options.get('journal', {}).get('folder', JOURNAL_FOLDER))
+
+    def get_prefetch_pages(self):
+        return int(self.options.get('prefetch', {}).get('pages', PREFETCH_PAGES))
+
+    def get_prefetch_content_pages(self):
+        return int(self.options.get('prefetch', {}).get('content_pages', PREFETCH_CONTENT_PAGES))
+
+    def get_executors_workers(self):
+        workers = dict(EXECUTORS_WORKERS)
+        workers.update({k: int(v) for k, v in self.options.get('executors', {}).items()})
+        return workers
+
 dhubrc = DHubRc()
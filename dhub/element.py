@@ -20,142 +20,201 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
 # MA  02110-1301, USA.
 
-from concurrent.futures import ThreadPoolExecutor
-from dhub.config import now, CACHE_TIME
+from dhub.dhubrc import dhubrc
+from dhub.executors import CONTENT_UPLOAD
+from dhub.file_content import FileContent
+from dhub.tags import TagStore
 
 from dhub.wrapper.api_wrapper import APIWrapper
+from dhub.wrapper.resumable_upload import ResumableUpload
 from dhub.wrapper.smart_updater import AsyncSmartUpdater
 
 __author__ = 'Iván de Paz Centeno'
 
 
-upload_pool = ThreadPoolExecutor(4)
+def _shared_state(name):
+    """
+    Attribute of the API state (token, backend URL, session...) that an element reads from its dataset,
+    unless it was given its own one.
+    """
+    def getter(element):
+        if element._own_state is not None and name in element._own_state:
+            return element._own_state[name]
+
+        return getattr(element.dataset_owner, name)
+
+    def setter(element, value):
+        if element._own_state is None:
+            element._own_state = {}
+
+        element._own_state[name] = value
+
+    return property(getter, setter)
 
 
 class Element(APIWrapper):
+    """
+    Element of a dataset. Elements are created in large amounts when datasets are iterated, so they are
+    slotted and they share the token, backend URL, session and executors of their dataset instead of
+    initializing their own ones.
+    """
+
+    __slots__ = ('title', 'description', 'tags', 'http_ref', 'has_content', 'dataset_owner', 'binary_interpreter', '_id', 'content_promise',
+                 'smart_updater', 'comments_count', '_own_state', '_dirty_fields')
+
+    token = _shared_state('token')
+    api_url = _shared_state('api_url')
+    token_info = _shared_state('token_info')
+    server_info = _shared_state('server_info')
+    executors = _shared_state('executors')
+    session = _shared_state('session')
 
     def __init__(self, title, description, tags, http_ref, id=None, dataset_owner=None, token=None,
                  binary_interpreter=None, token_info=None, server_info=None, smart_updater:AsyncSmartUpdater=None,
-                 api_url=None):
-        super().__init__(token, token_info=token_info, server_info=server_info, api_url=api_url)
-        self.data = {'title': title, 'description': description, 'tags': tags, 'http_ref': http_ref}
-        self.has_content = False
+                 api_url=None, executors=None):
+        self._own_state = None
         self.dataset_owner = dataset_owner
+
+        if dataset_owner is None or token not in [None, dataset_owner.token] or \
+                api_url not in [None, dataset_owner.api_url] or executors not in [None, dataset_owner.executors]:
+            super().__init__(token, token_info=token_info, server_info=server_info, api_url=api_url, executors=executors)
+
+        self.title = title
+        self.description = description
+        self.tags = TagStore(tags)
+        self.http_ref = http_ref
+        self.has_content = False
+        self.comments_count = 0
         self.binary_interpreter = binary_interpreter
-        self.token = token
         self._id = id
-        self.cached_content = None
-        self.cached_content_time = now()
         self.content_promise = None
         self.smart_updater = smart_updater
-
-    def _retrieve_content(self):
+        self._dirty_fields = None  # fields changed since the last update sent, or None.
+
+    @property
+    def data(self):
+        """
+        Metadata of the element as sent to the backend.
+        """
+        return {'title': self.title, 'description': self.description, 'tags': self.tags.to_list(), 'http_ref': self.http_ref}
+
+    @data.setter
+    def data(self, data):
+        self.title = data['title']
+        self.description = data['description']
+        self.tags = TagStore(data['tags'])
+        self.http_ref = data['http_ref']
+
+    def _retrieve_content(self, ranged=True):
+        # Taken before checking the queued uploads. See set_content().
+        memory_generation = self.dataset_owner.memory_cache.get_generation()
+        disk_generation = self.dataset_owner.disk_cache.get_generation()
 
         if self.smart_updater is not None and self.smart_updater.is_content_update_queued([self.get_id()]):
             self.smart_updater.wait_for_elements_content_update([self.get_id()])
 
-        content = self._get_binary("datasets/{}/elements/{}/content".format(self.dataset_owner.get_url_prefix(), self._id))
+        cache_key = self.dataset_owner._content_cache_key(self._id)
+        content = self.dataset_owner.disk_cache.get(cache_key)
+
+        if content is None:
+            url = "datasets/{}/elements/{}/content".format(self.dataset_owner.get_url_prefix(), self._id)
+            concurrency = dhubrc.get_ranged_downloads_concurrency()
+
+            if ranged and concurrency > 1:
+                content = self._get_binary_ranges(url, dhubrc.get_ranged_downloads_part_size(), concurrency)
+            else:
+                content = self._get_binary(url)
+
+            self.dataset_owner.disk_cache.put(cache_key, content, disk_generation)
+
+        self.dataset_owner.memory_cache.put(cache_key, content, len(content), memory_generation)
         return {self._id: content}
 
     def _upload_content(self, content):
-        return self._put_binary("datasets/{}/elements/{}/content".format(self.dataset_owner.get_url_prefix(), self._id), binary=content)
+        url = "datasets/{}/elements/{}/content".format(self.dataset_owner.get_url_prefix(), self._id)
+
+        if isinstance(content, FileContent):
+            return self._put_file(url, content.file_name)
+
+        return self._put_binary(url, binary=content)
 
     def get_title(self):
-        return self.data['title']
+        return self.title
 
     def get_description(self):
-        return self.data['description']
+        return self.description
 
     def get_tags(self):
-        return self.data['tags']
+        return self.tags.to_list()
 
     def get_ref(self):
-        return self.data['http_ref']
+        return self.http_ref
 
     def get_id(self):
         return self._id
 
     def set_title(self, new_title):
-        self.data['title'] = new_title
-        self.update()
+        self.title = new_title
+        self.update(['title'])
 
     def set_description(self, new_description):
-        self.data['description'] = new_description
-        self.update()
+        self.description = new_description
+        self.update(['description'])
 
     def set_tags(self, new_tags):
-        self.data['tags'] = new_tags
-        self.update()
+        self.tags = TagStore(new_tags)
+        self.dataset_owner.tag_index.update(self._id, new_tags)
+        self.update(['tags'])
 
     def get_tag(self, tag_name):
-        tags = self.get_tags()
-        result = ""
-
-        for tag in tags:
-            if type(tag) is dict:
-                if tag_name in tag:
-                    result = tag[tag_name]
-
-            elif type(tag) is str:
-
-                if ":" in tag:
-                    splits = tag.split(":")
-                    if splits[0].strip() == tag_name:
-                        result = splits[1].lstrip()
-                else:
-                    if tag in tag_name:
-                        result = tag
-
-            if result != "":
-                break
-
-        return result
+        return self.tags.get(tag_name)
 
     def set_tag(self, tag_name, tag_value):
-        tags = self.get_tags()
-        found = False
-
-        for index, tag in zip(range(len(tags)), tags):
-            if tag_name in tag:
-                if type(tag) is dict:
-                    tag[tag_name] = tag_value
-                    found = True
-
-                elif type(tag) is str:
-                    tags[index] = '{}: {}'.format(tag_name, tag_value)
-                    found = True
-
-                break
-
-        if not found:
-            if tag_name is None:
-                tags.append(tag_value)
-            else:
-                tags.append({tag_name: tag_value})
-
-        self.set_tags(tags)
+        """
+        Sets the value of a tag, keeping the format of the existing one.
+        :return: True if the tag already existed, False if it was added.
+        """
+        return self.update_tags({tag_name: tag_value})[tag_name]
+
+    def update_tags(self, new_tags):
+        """
+        Sets the values of several tags at once, sending a single update.
+        :param new_tags: dict of tag name -> value.
+        :return: dict of tag name -> True if the tag already existed, False if it was added.
+        """
+        found = {tag_name: self.tags.set(tag_name, tag_value) for tag_name, tag_value in new_tags.items()}
+
+        self.dataset_owner.tag_index.update(self._id, self.tags.to_list())
+        self.update(['tags'])
         return found
 
     def set_ref(self, new_http_ref):
-        self.data['http_ref'] = new_http_ref
-        self.update()
-
-    def get_content(self, interpret=True):
+        self.http_ref = new_http_ref
+        self.update(['http_ref'])
+
+    def get_content(self, interpret=True, ranged=True):
+        """
+        Retrieves the content of the element.
+        :param interpret: whether the binary interpreter must be applied to the content.
+        :param ranged: whether a content that is not cached may be downloaded with concurrent byte-range requests
+        (see the "ranged_downloads" section of .dhubrc). Contents smaller than a part are always fetched at once.
+        :return: content of the element, or None if it has no content.
+        """
         if not self.has_content:
             return None
 
+        content = None
+
         if self.content_promise is not None:
-            self.cached_content = self.content_promise.result()[self._id]
-            self.cached_content_time = now()
+            # Only contents that did not fit in the memory cache are handed through the promise.
+            content = self.content_promise.result().get(self._id)
             self.content_promise = None
 
-        if (now() - self.cached_content_time).total_seconds() > CACHE_TIME:
-            self.cached_content = None
+        if content is None:
+            content = self.dataset_owner.memory_cache.get(self.dataset_owner._content_cache_key(self._id))
 
-        if self.cached_content is None:
-            content = self._retrieve_content()[self._id]
-        else:
-            content = self.cached_content
+        if content is None:
+            content = self._retrieve_content(ranged)[self._id]
 
         if self.binary_interpreter is not None and interpret:
             content = self.binary_interpreter.cipher(content)
@@ -163,36 +222,79 @@ class Element(APIWrapper):
         return content
 
     def set_content(self, content, interpret=True):
-        if self.binary_interpreter is not None and interpret:
+        """
+        Sets the content of the element.
+        :param content: content to set. It is deciphered with the binary interpreter if interpret is True. Otherwise
+        it must be bytes, or a FileContent to stream the content from a local file without loading it in memory.
+        :param interpret: whether the binary interpreter must be applied to the content.
+        :return: True if the content is going to be uploaded, False if it was the same as the cached one.
+        """
+        if isinstance(content, FileContent):
+            pass
+        elif self.binary_interpreter is not None and interpret:
             content = self.binary_interpreter.decipher(content)
-        else:
-            if type(content) is not bytes:
-                raise Exception("Bytes are required as content.")
+        elif type(content) is not bytes:
+            raise Exception("Bytes are required as content.")
+
+        cache_key = self.dataset_owner._content_cache_key(self._id)
 
-        if content == self.cached_content:
+        if type(content) is bytes and content == self.dataset_owner.memory_cache.get(cache_key):
             return False
 
         if self.smart_updater is not None:
             self.smart_updater.queue_content_update("datasets/{}/elements/content".format(self.dataset_owner.get_url_prefix()), self.get_id(), content)
         else:
-            upload_pool.submit(self._upload_content, content)
+            # Blocks while the uploads in flight take all the room of the limiter.
+            size = len(content)
+            upload_limiter = self.dataset_owner.upload_limiter
+            upload_limiter.acquire(size)
+
+            if ResumableUpload.is_supported(self.server_info, size):
+                url = "datasets/{}/elements/{}/content".format(self.dataset_owner.get_url_prefix(), self._id)
+                future = ResumableUpload(self, url, content).start()
+            else:
+                future = self.executors.submit(CONTENT_UPLOAD, self._upload_content, content)
+
+            future.add_done_callback(lambda f: upload_limiter.release(size))
+            self.dataset_owner._track_upload(self._id, future)
+
+        # Invalidated once the upload is queued: any download that starts afterwards waits for the upload,
+        # and those already running are discarded by the caches.
+        self.dataset_owner.disk_cache.invalidate(cache_key)
+        self.dataset_owner.memory_cache.invalidate(cache_key)
 
-        self.cached_content = content
+        if type(content) is bytes:
+            self.dataset_owner.memory_cache.put(cache_key, content, len(content))
         self.has_content = True
-        self.cached_content_time = now()
 
         if self.content_promise:
             self.content_promise = None
 
         return True
 
-    def update(self):
+    def update(self, fields=None):
+        """
+        Sends the changed metadata fields of the element to the backend.
+        :param fields: names of the fields that changed. They are sent along with those changed before and not
+        sent yet. If no field is known to be changed (for example, tags modified in place), all of them are sent.
+        """
+        if fields is not None:
+            self._dirty_fields = set(fields) if self._dirty_fields is None else self._dirty_fields | set(fields)
+
+        data = self.data
+
+        if self._dirty_fields is not None:
+            data = {field: data[field] for field in self._dirty_fields}
+
         if self.smart_updater is not None:
-            self.smart_updater.queue_update("datasets/{}/elements/bundle".format(self.dataset_owner.get_url_prefix()), self.get_id(), self.data)
+            self.smart_updater.queue_update("datasets/{}/elements/bundle".format(self.dataset_owner.get_url_prefix()), self.get_id(), data)
+            self._dirty_fields = None
 
         else:
             self._patch_json("datasets/{}/elements/{}".format(self.dataset_owner.get_url_prefix(), self._id),
-                             json_data=self.data)
+                             json_data=data)
+            # Cleared once the backend accepted them: a failed update is sent again along with the next one.
+            self._dirty_fields = None
             self.refresh()
 
     def __str__(self):
@@ -203,15 +305,19 @@ class Element(APIWrapper):
 
     @classmethod
     def from_dict(cls, definition, dataset_owner, token, binary_interpreter=None, token_info=None, server_info=None,
-                  smart_updater=None, api_url=None):
+                  smart_updater=None, api_url=None, executors=None):
 
         element = cls(definition['title'], definition['description'], definition['tags'],
                       definition['http_ref'], id=definition['_id'], token=token,
                       binary_interpreter=binary_interpreter, dataset_owner=dataset_owner, token_info=token_info, server_info=server_info,
-                      smart_updater=smart_updater, api_url=api_url)
+                      smart_updater=smart_updater, api_url=api_url, executors=executors)
 
         element.comments_count = definition['comments_count']
         element.has_content = definition['has_content']
+
+        if dataset_owner is not None:
+            dataset_owner.tag_index.update(element._id, element.get_tags())
+
         return element
 
 
@@ -219,6 +325,12 @@ class Element(APIWrapper):
         definition = self._get_json("datasets/{}/elements/{}".format(self.dataset_owner.get_url_prefix(), self.get_id()))
 
         self.data = {k: definition[k] for k in ['title', 'description', 'tags', 'http_ref']}
+        self.dataset_owner.tag_index.update(self._id, self.get_tags())
         self.comments_count = definition['comments_count']
+
+        # The definition tells nothing else about the content: cached contents are kept through metadata changes.
+        if self.has_content != definition['has_content']:
+            self.dataset_owner.memory_cache.invalidate(self.dataset_owner._content_cache_key(self._id))
+            self.dataset_owner.disk_cache.invalidate(self.dataset_owner._content_cache_key(self._id))
+
         self.has_content = definition['has_content']
-        self.cached_content = None
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# dhub
+# Copyright (C) 2017 Iván de Paz Centeno <ipazc@unileon.es>.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; version 3
+# of the License or (at your option) any later version of
+# the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+from concurrent.futures import ThreadPoolExecutor
+import threading
+from dhub.dhubrc import dhubrc
+
+__author__ = 'Iván de Paz Centeno'
+
+METADATA = 'metadata'
+CONTENT_DOWNLOAD = 'content_download'
+CONTENT_UPLOAD = 'content_upload'
+FLUSH = 'flush'
+CONTENT_PARTS = 'content_parts'
+FILE_READ = 'file_read'
+
+
+class Executors(object):
+    """
+    Set of thread pools, one per kind of workload (metadata, content download, content upload,
+    smart updater flushes, byte ranges of large contents and local files read). Each pool is created the first time a task is submitted to it.
+
+    The amount of workers of each workload is read from the "executors" section of .dhubrc and
+    can be overridden per instance:
+
+        datasets = Datasets("default", executors=Executors({'content_download': 32}))
+    """
+
+    def __init__(self, workers=None):
+        self.workers = dhubrc.get_executors_workers()
+
+        if workers is not None:
+            self.workers.update(workers)
+
+        self.executors = {}
+        self.lock = threading.Lock()
+
+    def __getitem__(self, workload) -> ThreadPoolExecutor:
+        with self.lock:
+            if workload not in self.executors:
+                self.executors[workload] = ThreadPoolExecutor(self.workers[workload],
+                                                              thread_name_prefix="dhub-{}".format(workload))
+
+            return self.executors[workload]
+
+    def submit(self, workload, fn, *args, **kwargs):
+        return self[workload].submit(fn, *args, **kwargs)
+
+    def get_workers(self, workload):
+        return self.workers[workload]
+
+    def total_workers(self):
+        return sum(self.workers.values())
+
+    def shutdown(self, wait=True):
+        with self.lock:
+            executors = list(self.executors.values())
+            self.executors = {}
+
+        for executor in executors:
+            executor.shutdown(wait=wait)
+
+
+executors = Executors()
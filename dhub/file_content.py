@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# dhub
+# Copyright (C) 2017 Iván de Paz Centeno <ipazc@unileon.es>.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; version 3
+# of the License or (at your option) any later version of
+# the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+import hashlib
+import os
+from zipfile import ZipFile, ZIP_DEFLATED, ZIP_STORED, ZIP64_LIMIT
+from pyzip import PyZip
+from dhub.config import STREAM_CHUNK_SIZE
+
+__author__ = 'Iván de Paz Centeno'
+
+HASHES_FILE = "__SHA256__HASHES__.zip"  # written by PyZip along with the contents of a bundle.
+
+
+class FileContent(object):
+    """
+    Content of an element backed by a local file. Only the file name is kept in memory; the file is read
+    in chunks when the content is uploaded.
+    """
+
+    def __init__(self, file_name):
+        if not os.path.isfile(file_name):
+            raise Exception("content must be a binary data or a URI to a file.")
+
+        self.file_name = file_name
+
+    def __len__(self):
+        return os.path.getsize(self.file_name)
+
+    def __eq__(self, other):
+        return isinstance(other, FileContent) and other.file_name == self.file_name
+
+    def __hash__(self):
+        return hash(self.file_name)
+
+    def __repr__(self):
+        return "FileContent({})".format(self.file_name)
+
+    def open(self):
+        return open(self.file_name, "rb")
+
+    def read(self):
+        with self.open() as f:
+            return f.read()
+
+
+def write_bundle(contents, file, compress=True):
+    """
+    Writes the contents into the file with the same zip layout used by PyZip (including the SHA256 hashes),
+    so that the backend accepts it as a bundle. FileContent values are copied in chunks.
+    :param contents: dict of element id -> bytes or FileContent.
+    :param file: writable binary file object.
+    :param compress: whether the contents are deflated or stored.
+    """
+    hashes = {}
+
+    with ZipFile(file, mode="w", compression=ZIP_DEFLATED if compress else ZIP_STORED) as z:
+        for key, content in contents.items():
+            key = str(key)
+
+            if isinstance(content, FileContent):
+                digest = hashlib.sha256()
+                size = len(content)
+
+                with content.open() as source, z.open(key, mode="w", force_zip64=size >= ZIP64_LIMIT) as target:
+                    chunk = source.read(STREAM_CHUNK_SIZE)
+                    while len(chunk) > 0:
+                        digest.update(chunk)
+                        target.write(chunk)
+                        chunk = source.read(STREAM_CHUNK_SIZE)
+
+                hashes[key] = digest.hexdigest().encode()
+            else:
+                hashes[key] = hashlib.sha256(content).hexdigest().encode()
+                z.writestr(key, content)
+
+        z.writestr(HASHES_FILE, PyZip(hashes).to_bytes(store_hashes=False))
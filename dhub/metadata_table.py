@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# dhub
+# Copyright (C) 2017 Iván de Paz Centeno <ipazc@unileon.es>.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; version 3
+# of the License or (at your option) any later version of
+# the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from dhub.tags import parse_tag
+
+__author__ = 'Iván de Paz Centeno'
+
+ELEMENTS_COLUMNS = ['ids', 'titles', 'descriptions', 'http_refs', 'has_content', 'comments_count']
+COLUMNS = ELEMENTS_COLUMNS + ['tags', 'tags_offsets']
+STRING_COLUMNS = ['ids', 'titles', 'descriptions', 'http_refs', 'tags']
+
+
+def _tag_strings(tags):
+    # Tags are sent as "name: value" strings, bare strings or {name: value} dicts; all of them are kept as
+    # "name: value" (or "name") strings, as parsed by the tag store.
+    for tag in tags:
+        for name, value in parse_tag(tag):
+            yield name if value is None else "{}: {}".format(name, value)
+
+
+def _strings_array(values):
+    # Object arrays keep a reference per string, instead of making every row as wide as the longest value.
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+class MetadataTable(object):
+    """
+    Metadata of the elements of a dataset stored by columns in numpy arrays, to filter large amounts of
+    elements with vectorized operations:
+
+        table = dataset.metadata_table()
+        ids = table['ids'][table.has_tag("split: train") & table['has_content']]
+
+    The tags of all the elements are kept in a single flat array ("tags"); the tags of the element i are
+    tags[tags_offsets[i]:tags_offsets[i+1]].
+    """
+
+    def __init__(self, columns):
+        if np is None:
+            raise ImportError("Metadata tables require numpy. Install it with 'pip install dhub[numpy]'.")
+
+        self.columns = columns
+
+    @classmethod
+    def from_definitions(cls, definitions):
+        """
+        Builds the table from the definitions of the elements as sent by the backend.
+        :param definitions: list of dicts of elements.
+        """
+        if np is None:
+            raise ImportError("Metadata tables require numpy. Install it with 'pip install dhub[numpy]'.")
+
+        tags = []
+        tags_offsets = [0]
+
+        for definition in definitions:
+            tags.extend(_tag_strings(definition['tags']))
+            tags_offsets.append(len(tags))
+
+        return cls({
+            'ids': _strings_array([definition['_id'] for definition in definitions]),
+            'titles': _strings_array([definition['title'] for definition in definitions]),
+            'descriptions': _strings_array([definition['description'] for definition in definitions]),
+            'http_refs': _strings_array([definition['http_ref'] for definition in definitions]),
+            'has_content': np.array([definition['has_content'] for definition in definitions], dtype=bool),
+            'comments_count': np.array([definition['comments_count'] for definition in definitions], dtype=np.int64),
+            'tags': _strings_array(tags),
+            'tags_offsets': np.array(tags_offsets, dtype=np.int64),
+        })
+
+    def __len__(self):
+        return len(self.columns['ids'])
+
+    def __getitem__(self, column):
+        return self.columns[column]
+
+    def get_tags(self, index):
+        return self.columns['tags'][self.columns['tags_offsets'][index]:self.columns['tags_offsets'][index + 1]].tolist()
+
+    def has_tag(self, tag):
+        """
+        :param tag: tag as a "name: value" string, a bare tag or a {name: value} dict.
+        :return: boolean mask of the elements that have the tag.
+        """
+        [tag] = _tag_strings([tag])
+        owners = np.repeat(np.arange(len(self)), np.diff(self.columns['tags_offsets']))
+        mask = np.zeros(len(self), dtype=bool)
+        mask[owners[self.columns['tags'] == tag]] = True
+        return mask
+
+    def filter(self, mask):
+        """
+        :param mask: boolean mask or array of indexes of the elements to keep.
+        :return: MetadataTable with the selected elements.
+        """
+        indexes = np.arange(len(self))[mask]
+        offsets = self.columns['tags_offsets']
+        lengths = offsets[indexes + 1] - offsets[indexes]
+        tags_indexes = np.repeat(offsets[indexes] - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths) + \
+                       np.arange(lengths.sum())
+
+        columns = {name: self.columns[name][indexes] for name in ELEMENTS_COLUMNS}
+        columns['tags'] = self.columns['tags'][tags_indexes]
+        columns['tags_offsets'] = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        return MetadataTable(columns)
+
+    def save(self, file_name):
+        """
+        Saves the columns into a numpy .npz file. Strings are stored as a buffer of UTF-8 bytes and the offsets of
+        each string in it, so that the file is loaded without unpickling objects.
+        """
+        columns = {name: column for name, column in self.columns.items() if name not in STRING_COLUMNS}
+
+        for name in STRING_COLUMNS:
+            encoded = [value.encode() for value in self.columns[name]]
+            columns[name + "_strings_offsets"] = np.concatenate([[0], np.cumsum([len(value) for value in encoded],
+                                                                        dtype=np.int64)]).astype(np.int64)
+            columns[name + "_strings_data"] = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+        np.savez(file_name, **columns)
+
+    @classmethod
+    def load(cls, file_name):
+        if np is None:
+            raise ImportError("Metadata tables require numpy. Install it with 'pip install dhub[numpy]'.")
+
+        with np.load(file_name) as columns:
+            table = {name: columns[name] for name in COLUMNS if name not in STRING_COLUMNS}
+
+            for name in STRING_COLUMNS:
+                data = columns[name + "_strings_data"].tobytes()
+                offsets = columns[name + "_strings_offsets"].tolist()
+                table[name] = _strings_array([data[start:end].decode() for start, end in zip(offsets, offsets[1:])])
+
+        return cls(table)
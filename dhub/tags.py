@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# dhub
+# Copyright (C) 2017 Iván de Paz Centeno <ipazc@unileon.es>.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; version 3
+# of the License or (at your option) any later version of
+# the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+import threading
+
+__author__ = 'Iván de Paz Centeno'
+
+
+def parse_tag(tag):
+    """
+    Parses a tag as sent by the backend. Tags are either "name: value" strings, bare strings or
+    {name: value} dicts.
+    :return: list of (name, value) pairs. The value of a bare tag is None.
+    """
+    if type(tag) is dict:
+        return [(str(name), str(value)) for name, value in tag.items()]
+
+    tag = str(tag)
+
+    if ":" in tag:
+        name, value = tag.split(":", 1)
+        return [(name.strip(), value.strip())]
+
+    return [(tag.strip(), None)]
+
+
+class TagStore(object):
+    """
+    Tags of an element. The tags are kept as the list sent by the backend, so that they are sent back
+    in the same format, and they are parsed once into a mapping of tag name -> position in the list,
+    which makes reading and setting a tag O(1).
+    """
+
+    __slots__ = ('tags', 'positions')
+
+    def __init__(self, tags):
+        self.tags = tags
+        self.positions = None  # tag name -> position of the first tag with that name; built on first use.
+
+    def __index(self):
+        if self.positions is None:
+            self.positions = {}
+
+            for position, tag in enumerate(self.tags):
+                self.__index_tag(position, tag)
+
+        return self.positions
+
+    def __index_tag(self, position, tag):
+        for name, _ in parse_tag(tag):
+            self.positions.setdefault(name, position)
+
+    def __len__(self):
+        return len(self.tags)
+
+    def __iter__(self):
+        return iter(self.tags)
+
+    def __contains__(self, name):
+        return name in self.__index()
+
+    def to_list(self):
+        """
+        :return: the list of tags itself, so that it can be modified in place. The positions are parsed again on
+        the next use, as the list may have changed meanwhile.
+        """
+        self.positions = None
+        return self.tags
+
+    def get(self, name, default=""):
+        """
+        :return: value of the tag. Bare tags are their own value.
+        """
+        position = self.__index().get(name)
+
+        if position is None:
+            return default
+
+        tag = self.tags[position]
+
+        if type(tag) is dict:
+            return tag[name]
+
+        value = parse_tag(tag)[0][1]
+        return tag if value is None else value
+
+    def set(self, name, value):
+        """
+        Sets the value of the tag, keeping the format of the existing one. New tags are appended as
+        {name: value} dicts, or as a bare tag if the name is None.
+        :return: True if the tag already existed, False otherwise.
+        """
+        positions = self.__index()
+        position = positions.get(name)
+
+        if position is not None:
+            if type(self.tags[position]) is dict:
+                self.tags[position][name] = value
+            else:
+                self.tags[position] = '{}: {}'.format(name, value)
+            return True
+
+        self.tags.append(value if name is None else {name: value})
+        self.__index_tag(len(self.tags) - 1, self.tags[-1])
+        return False
+
+
+class TagQuery(object):
+    """
+    Query over a TagIndex. Queries are combined with & (AND), | (OR) and ~ (NOT):
+
+        (Tag("split") == "train") & ~Tag("label").startswith("cat")
+    """
+
+    def evaluate(self, index):
+        """
+        :param index: TagIndex to query.
+        :return: set of ids of the elements that match the query.
+        """
+        raise NotImplementedError()
+
+    def __and__(self, other):
+        return _Combination(self, other, set.intersection)
+
+    def __or__(self, other):
+        return _Combination(self, other, set.union)
+
+    def __invert__(self):
+        return _Negation(self)
+
+
+class _Combination(TagQuery):
+    def __init__(self, left, right, operation):
+        self.left = left
+        self.right = right
+        self.operation = operation
+
+    def evaluate(self, index):
+        return self.operation(self.left.evaluate(index), self.right.evaluate(index))
+
+
+class _Negation(TagQuery):
+    def __init__(self, query):
+        self.query = query
+
+    def evaluate(self, index):
+        return index.get_ids() - self.query.evaluate(index)
+
+
+class _Match(TagQuery):
+    def __init__(self, name, value_matches):
+        self.name = name
+        self.value_matches = value_matches
+
+    def evaluate(self, index):
+        return index.find(self.name, self.value_matches)
+
+
+class Tag(TagQuery):
+    """
+    Query of the elements that have the tag name, whatever its value. Comparisons narrow it down by value.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def evaluate(self, index):
+        return index.find(self.name)
+
+    def __eq__(self, value):
+        return _Match(self.name, lambda tag_value: tag_value == value)
+
+    def __ne__(self, value):
+        return _Match(self.name, lambda tag_value: tag_value != value)
+
+    def startswith(self, prefix):
+        return _Match(self.name, lambda tag_value: tag_value is not None and tag_value.startswith(prefix))
+
+    def isin(self, values):
+        values = set(values)
+        return _Match(self.name, lambda tag_value: tag_value in values)
+
+    __hash__ = TagQuery.__hash__
+
+
+class TagIndex(object):
+    """
+    Inverted index of tag name -> tag value -> ids of the elements.
+
+    A disabled index ignores the updates, so that it takes no memory until it is needed: datasets keep it
+    disabled until Dataset.build_tag_index() enables it and indexes all of their elements. From then on,
+    elements are indexed again as their definitions are retrieved from the backend and when their tags are set.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.index = {}  # tag name -> tag value -> set of ids.
+        self.elements = {}  # element id -> list of (name, value) pairs, in the order they were indexed.
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        with self.lock:
+            return len(self.elements)
+
+    def __contains__(self, element_id):
+        with self.lock:
+            return element_id in self.elements
+
+    def __unindex(self, element_id):
+        for name, value in self.elements.get(element_id, []):
+            values = self.index[name]
+            values[value].discard(element_id)
+
+            if len(values[value]) == 0:
+                del values[value]
+
+            if len(values) == 0:
+                del self.index[name]
+
+    def update(self, element_id, tags):
+        """
+        Indexes the element with the given tags, replacing its previous ones.
+        """
+        if not self.enabled:
+            return
+
+        pairs = [pair for tag in tags for pair in parse_tag(tag)]
+
+        with self.lock:
+            if self.elements.get(element_id) == pairs:
+                return
+
+            self.__unindex(element_id)
+            self.elements[element_id] = pairs
+
+            for name, value in pairs:
+                self.index.setdefault(name, {}).setdefault(value, set()).add(element_id)
+
+    def enable(self):
+        self.enabled = True
+
+    def remove(self, element_id):
+        with self.lock:
+            self.__unindex(element_id)
+            self.elements.pop(element_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.index.clear()
+            self.elements.clear()
+
+    def get_ids(self):
+        with self.lock:
+            return set(self.elements)
+
+    def find(self, name, value_matches=None):
+        """
+        :param name: tag name.
+        :param value_matches: function that tells whether a value of the tag matches. All values match if None.
+        :return: set of ids of the elements that have the tag with a matching value.
+        """
+        result = set()
+
+        with self.lock:
+            for value, ids in self.index.get(name, {}).items():
+                if value_matches is None or value_matches(value):
+                    result.update(ids)
+
+        return result
+
+    def query(self, query):
+        """
+        :param query: TagQuery.
+        :return: list of ids of the matching elements, in the order they were indexed. It can be used
+        directly to retrieve the elements from the dataset (dataset[ids]).
+        """
+        result = query.evaluate(self)
+
+        with self.lock:
+            return [element_id for element_id in self.elements if element_id in result]
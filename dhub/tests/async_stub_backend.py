@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# dhub
+# Copyright (C) 2017 Iván de Paz Centeno <ipazc@unileon.es>.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; version 3
+# of the License or (at your option) any later version of
+# the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+__author__ = 'Iván de Paz Centeno'
+
+
+import asyncio
+import json
+from pyzip import PyZip
+
+try:
+    from aiohttp import web
+    from aiohttp.test_utils import TestServer
+except ImportError:
+    web = None
+
+
+class AsyncStubBackend(object):
+    """
+    Local HTTP server answering the requests of the async client for a single dataset ("tok/stub") from memory.
+    """
+
+    def __init__(self, elements_count, page_size=20):
+        self.page_size = page_size
+        self.elements = {}  # element id -> definition
+        self.contents = {}  # element id -> bytes
+        self.requests = []  # [method, path] of every request received.
+        self.failing_requests = 0  # number of the next requests that fail.
+        self.page_delay = 0  # seconds taken to answer each page of elements after the first one.
+
+        for index in range(elements_count):
+            element_id = str(index)
+            self.elements[element_id] = {'_id': element_id, 'title': "title {}".format(index), 'description': "",
+                                         'tags': [], 'http_ref': "", 'comments_count': 0}
+            self.contents[element_id] = "content {}".format(index).encode()
+
+        app = web.Application()
+        prefix = "/datasets/tok/stub"
+        app.router.add_get("/server", self.recorded(self.get_server))
+        app.router.add_get("/tokens/{token}", self.recorded(self.get_token))
+        app.router.add_get("/datasets", self.recorded(self.get_datasets))
+        app.router.add_get(prefix, self.recorded(self.get_dataset))
+        app.router.add_get(prefix + "/elements", self.recorded(self.get_page))
+        app.router.add_get(prefix + "/elements/bundle", self.recorded(self.get_bundle))
+        app.router.add_get(prefix + "/elements/content", self.recorded(self.get_contents))
+        app.router.add_get(prefix + "/elements/{id}", self.recorded(self.get_element))
+        app.router.add_patch(prefix + "/elements/{id}", self.recorded(self.patch_element))
+        app.router.add_get(prefix + "/elements/{id}/content", self.recorded(self.get_content))
+        app.router.add_put(prefix + "/elements/{id}/content", self.recorded(self.put_content))
+        self.server = TestServer(app)
+
+    async def start(self):
+        await self.server.start_server()
+        return str(self.server.make_url("")).rstrip("/")
+
+    async def close(self):
+        await self.server.close()
+
+    def recorded(self, handler):
+        async def handle(request):
+            self.requests.append([request.method, request.path])
+
+            if self.failing_requests > 0:
+                self.failing_requests -= 1
+                return web.Response(status=500, text="Internal error")
+
+            return await handler(request)
+
+        return handle
+
+    def definition(self, element_id):
+        return dict(self.elements[element_id], has_content=element_id in self.contents)
+
+    def dataset(self):
+        return {'url_prefix': "tok/stub", 'title': "stub", 'description': "", 'reference': "", 'tags': [],
+                'fork_count': 0, 'fork_father': None, 'size': sum(len(content) for content in self.contents.values()),
+                'elements_count': len(self.elements), 'comments_count': 0}
+
+    async def get_server(self, request):
+        return web.json_response({'Page-Size': self.page_size})
+
+    async def get_token(self, request):
+        return web.json_response({})
+
+    async def get_datasets(self, request):
+        return web.json_response([self.dataset()])
+
+    async def get_dataset(self, request):
+        return web.json_response(self.dataset())
+
+    async def get_page(self, request):
+        page = int(request.query['page'])
+        await asyncio.sleep(self.page_delay * page)
+        ids = list(self.elements)[page * self.page_size:(page + 1) * self.page_size]
+        return web.json_response([self.definition(element_id) for element_id in ids])
+
+    async def get_bundle(self, request):
+        ids = json.loads(await request.text())['elements']
+        return web.json_response([self.definition(element_id) for element_id in ids])
+
+    async def get_contents(self, request):
+        ids = json.loads(await request.text())['elements']
+        return web.Response(body=PyZip({element_id: self.contents[element_id] for element_id in ids}).to_bytes())
+
+    async def get_element(self, request):
+        return web.json_response(self.definition(request.match_info['id']))
+
+    async def patch_element(self, request):
+        self.elements[request.match_info['id']].update(json.loads(await request.text()))
+        return web.json_response("done")
+
+    async def get_content(self, request):
+        return web.Response(body=self.contents[request.match_info['id']])
+
+    async def put_content(self, request):
+        self.contents[request.match_info['id']] = await request.read()
+        return web.json_response("done")
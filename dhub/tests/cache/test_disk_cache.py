@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# dhub
+# Copyright (C) 2017 Iván de Paz Centeno <ipazc@unileon.es>.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; version 3
+# of the License or (at your option) any later version of
+# the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+__author__ = 'Iván de Paz Centeno'
+
+
+import tempfile
+import unittest
+from dhub.cache.disk_cache import DiskCache
+
+
+class TestDiskCache(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_least_recently_used_contents_are_evicted(self):
+        """
+        DiskCache removes the least recently used contents when it grows above its max size.
+        :return:
+        """
+        cache = DiskCache(self.folder.name, 10)
+        cache.put("a", b"1234")
+        cache.put("b", b"1234")
+        self.assertEqual(cache.get("a"), b"1234")
+
+        cache.put("c", b"1234")
+
+        self.assertEqual(cache.get("a"), b"1234")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), b"1234")
+        self.assertEqual(cache.size(), 8)
+
+    def test_contents_persist_between_instances(self):
+        """
+        DiskCache finds the contents stored by a previous instance on the same folder.
+        :return:
+        """
+        DiskCache(self.folder.name, 100).put("a", b"foo")
+        cache = DiskCache(self.folder.name, 100)
+
+        self.assertIn("a", cache)
+        self.assertEqual(cache.get("a"), b"foo")
+
+    def test_outdated_contents_are_not_stored(self):
+        """
+        DiskCache discards contents retrieved before the key was invalidated.
+        :return:
+        """
+        cache = DiskCache(self.folder.name, 100)
+        cache.put("a", b"foo")
+
+        generation = cache.get_generation()
+        cache.invalidate("a")
+        cache.put("a", b"foo", generation)
+
+        self.assertIsNone(cache.get("a"))
+
+        cache.put("a", b"bar", cache.get_generation())
+        self.assertEqual(cache.get("a"), b"bar")
+
+    def test_disabled_cache_stores_nothing(self):
+        """
+        DiskCache with max size 0 does not store anything.
+        :return:
+        """
+        cache = DiskCache(self.folder.name, 0)
+        cache.put("a", b"foo")
+
+        self.assertIsNone(cache.get("a"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# dhub
+# Copyright (C) 2017 Iván de Paz Centeno <ipazc@unileon.es>.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; version 3
+# of the License or (at your option) any later version of
+# the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+__author__ = 'Iván de Paz Centeno'
+
+
+import os
+import tempfile
+import unittest
+import time
+from dhub.cache.id_index import IdIndex, evict_indexes
+
+
+class TestIdIndex(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.file_name = os.path.join(self.folder.name, "index")
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_pages_are_kept_between_instances(self):
+        """
+        IdIndex keeps the pages written in the file, and only reports ranges whose ids were all written.
+        :return:
+        """
+        index = IdIndex(self.file_name, 6)
+        index.put(0, ["a", "b", "c"])
+
+        self.assertEqual(index.get_range(0, 3), ["a", "b", "c"])
+        self.assertIsNone(index.get_range(0, 6))
+        self.assertIsNone(index.get(4))
+
+        index.put(3, ["d", "e", "f"], last=True)
+        index.close()
+
+        index = IdIndex(self.file_name, 6)
+        self.assertEqual(index.get_range(0, 10, 2), ["a", "c", "e"])
+        self.assertEqual(index.get(5), "f")
+        index.close()
+
+    def test_index_is_reset_when_outdated(self):
+        """
+        IdIndex discards its ids when the elements count is smaller or when a page disagrees with them.
+        :return:
+        """
+        index = IdIndex(self.file_name, 4)
+        index.put(0, ["a", "b"])
+        index.put(2, ["c", "d"])
+        index.close()
+
+        self.assertIsNone(IdIndex(self.file_name, 3).get(0))
+
+        index = IdIndex(self.file_name, 4)
+        index.put(0, ["a", "b"])
+        index.put(2, ["c", "d"])
+        index.put(0, ["x", "b"])
+
+        self.assertEqual(index.get(0), "x")
+        self.assertIsNone(index.get(2))
+        self.assertFalse(index.put(2, ["too long id"]))
+        self.assertIsNone(index.get(0))
+        index.close()
+
+    def test_filtered_index_length(self):
+        """
+        IdIndex is as long as the elements until the last page of a filter is written.
+        :return:
+        """
+        index = IdIndex(self.file_name, 10)
+        index.put(0, ["a", "b"], last=True)
+
+        self.assertEqual(index.get_range(0, 10), ["a", "b"])
+        self.assertIsNone(index.get(2))
+        index.close()
+
+    def test_index_is_extended_when_elements_are_appended(self):
+        """
+        IdIndex keeps its ids when the elements count grows, either when opened or resized.
+        :return:
+        """
+        index = IdIndex(self.file_name, 4)
+        index.put(0, ["a", "b"])
+        index.put(2, ["c"], last=True)
+        index.close()
+
+        index = IdIndex(self.file_name, 5)
+        self.assertEqual(index.get_range(0, 3), ["a", "b", "c"])
+        self.assertIsNone(index.get_range(0, 5))  # the filter may match the appended elements.
+
+        index.put(3, ["d", "e"])
+        index.resize(7)
+        self.assertEqual(index.get_range(0, 5), ["a", "b", "c", "d", "e"])
+
+        index.put(5, ["f", "g"])
+        index.resize(6)
+        self.assertIsNone(index.get(0))
+        index.close()
+
+    def test_least_recently_used_indexes_are_evicted(self):
+        """
+        evict_indexes() removes the oldest index files of the folder until they fit in the max size.
+        :return:
+        """
+        file_names = [os.path.join(self.folder.name, "index{}".format(number)) for number in range(4)]
+
+        for number, file_name in enumerate(file_names):
+            index = IdIndex(file_name, 100)
+            index.put(0, ["a"])
+            index.close()
+            os.utime(file_name, (time.time() - 100 + number, time.time() - 100 + number))
+
+        size = os.path.getsize(file_names[0])
+        evict_indexes(self.folder.name, size * 2, keep=file_names[0])
+
+        self.assertEqual(sorted(os.listdir(self.folder.name)), ["index0", "index3"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# dhub
+# Copyright (C) 2017 Iván de Paz Centeno <ipazc@unileon.es>.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; version 3
+# of the License or (at your option) any later version of
+# the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+__author__ = 'Iván de Paz Centeno'
+
+
+import unittest
+from dhub.cache.memory_cache import MemoryCache
+
+
+class TestMemoryCache(unittest.TestCase):
+
+    def test_least_recently_used_values_are_evicted_by_size(self):
+        """
+        MemoryCache evicts the least recently used values when their total size exceeds its max size.
+        :return:
+        """
+        cache = MemoryCache(10)
+        cache.put("a", b"1234", 4)
+        cache.put("b", b"1234", 4)
+        cache.get("a")
+        cache.put("c", b"1234", 4)
+
+        self.assertEqual(cache.get("a"), b"1234")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), b"1234")
+        self.assertEqual(cache.size(), 8)
+        self.assertFalse(cache.put("d", b"12345678901", 11))
+
+        stats = cache.stats()
+        self.assertEqual(stats['hits'], 3)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['evictions'], 1)
+
+    def test_values_expire(self):
+        """
+        MemoryCache does not return values older than its ttl.
+        :return:
+        """
+        cache = MemoryCache(10, ttl=-1)
+        cache.put("a", b"1234", 4)
+
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.size(), 0)
+
+    def test_outdated_values_are_not_stored(self):
+        """
+        MemoryCache discards values retrieved before the key was invalidated.
+        :return:
+        """
+        cache = MemoryCache(10)
+        generation = cache.get_generation()
+        cache.invalidate("a")
+
+        self.assertFalse(cache.put("a", b"1234", 4, generation))
+        self.assertTrue(cache.put("a", b"1234", 4, cache.get_generation()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# dhub
+# Copyright (C) 2017 Iván de Paz Centeno <ipazc@unileon.es>.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; version 3
+# of the License or (at your option) any later version of
+# the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+__author__ = 'Iván de Paz Centeno'
+
+
+import hashlib
+import tempfile
+import threading
+from zipfile import ZipFile
+from pyzip import PyZip
+from dhub.cache.disk_cache import DiskCache
+from dhub.cache.memory_cache import MemoryCache
+from dhub.dataset import Dataset
+from dhub.executors import Executors
+from dhub.file_content import HASHES_FILE
+
+
+class StubDataset(Dataset):
+    """
+    Dataset whose requests are answered by an in-memory backend.
+    """
+
+    def __init__(self):
+        self.elements = {}  # element id -> definition
+        self.contents = {}  # element id -> bytes
+        self.failing_element = None  # id of the element whose next content upload fails.
+        self.corrupted_element = None  # id of the element whose content is sent with a wrong hash.
+        self.patches = []  # [rel_url, json_data] of every update accepted.
+        self.failing_patches = 0  # number of the next updates that fail.
+        self.content_requests = 0  # downloads of contents.
+        self.page_requests = 0  # downloads of pages of elements.
+        self.contents_gate = threading.Event()  # downloads of contents wait for it.
+        self.contents_gate.set()
+        super().__init__("tok/stub", "stub", "", "", [], token_info={}, server_info={'Page-Size': 20},
+                         api_url="http://stub", executors=Executors())
+
+        # Caches of its own, so that contents are never taken from other tests.
+        self.cache_folder = tempfile.TemporaryDirectory()
+        self.memory_cache = MemoryCache(10 * 1024 * 1024)
+        self.disk_cache = DiskCache(self.cache_folder.name, 10 * 1024 * 1024)
+
+    def _get_json(self, rel_url, extra_data=None, json_data=None):
+        definitions = [dict(definition, has_content=element_id in self.contents)
+                       for element_id, definition in self.elements.items()]
+
+        if rel_url == "datasets/tok/stub":
+            return {'url_prefix': "tok/stub", 'title': "stub", 'description': "", 'reference': "", 'tags': [],
+                    'fork_count': 0, 'fork_father': None, 'size': 0, 'elements_count': len(self.elements),
+                    'comments_count': 0}
+
+        if rel_url == "datasets/tok/stub/size":
+            return sum(len(content) for content in self.contents.values())
+
+        if rel_url == "datasets/tok/stub/elements":
+            self.page_requests += 1
+            page = extra_data['page']
+            return definitions[page * 20:(page + 1) * 20]
+
+        if rel_url == "datasets/tok/stub/elements/bundle":
+            return [definition for definition in definitions if definition['_id'] in json_data['elements']]
+
+        raise Exception("Unexpected request: {}".format(rel_url))
+
+    def _get_binary(self, rel_url, extra_data=None, json_data=None):
+        self.content_requests += 1
+        self.contents_gate.wait()
+
+        if rel_url == "datasets/tok/stub/elements/content":
+            return PyZip({element_id: self.contents[element_id] for element_id in json_data['elements']}).to_bytes()
+
+        raise Exception("Unexpected request: {}".format(rel_url))
+
+    def _get_to_file(self, rel_url, file, extra_data=None, json_data=None):
+        self.content_requests += 1
+
+        with ZipFile(file, "w") as z:
+            hashes = {}
+
+            for element_id in json_data['elements']:
+                content = self.contents[element_id]
+                digest = hashlib.sha256(b"" if element_id == self.corrupted_element else content)
+                hashes[element_id] = digest.hexdigest().encode()
+                z.writestr(element_id, content)
+
+            z.writestr(HASHES_FILE, PyZip(hashes).to_bytes(store_hashes=False))
+
+        return file.tell()
+
+    def _post_json(self, rel_url, extra_data=None, json_data=None):
+        definitions = []
+
+        for definition in json_data['elements']:
+            element_id = str(len(self.elements))
+            self.elements[element_id] = dict(definition, _id=element_id, comments_count=0)
+            definitions.append(dict(self.elements[element_id], has_content=False))
+
+        return definitions
+
+    def _patch_json(self, rel_url, extra_data=None, json_data=None):
+        if self.failing_patches > 0:
+            self.failing_patches -= 1
+            raise Exception("Failed to communicate with backend")
+
+        self.patches.append([rel_url, json_data])
+
+        if rel_url == "datasets/tok/stub/elements/bundle":
+            for element_id, fields in json_data['elements'].items():
+                self.elements[element_id].update(fields)
+
+        return "done"
+
+    def _put_binary(self, rel_url, extra_data=None, binary=None, headers=None):
+        if hasattr(binary, "read"):
+            binary.seek(0)
+            binary = binary.read()
+
+        contents = PyZip().from_bytes(binary)
+
+        if self.failing_element in contents:
+            self.failing_element = None
+            raise Exception("Failed to communicate with backend")
+
+        self.contents.update(contents)
+        return "done"
+
+    def get_tag_of(self, element_id, name):
+        tags = [tag for tag in self.elements[element_id]['tags'] if type(tag) is dict and name in tag]
+        return tags[0][name] if len(tags) > 0 else None
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# dhub
+# Copyright (C) 2017 Iván de Paz Centeno <ipazc@unileon.es>.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; version 3
+# of the License or (at your option) any later version of
+# the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+__author__ = 'Iván de Paz Centeno'
+
+
+import asyncio
+import unittest
+from dhub.async_datasets import AsyncDatasets
+from dhub.tests.async_stub_backend import AsyncStubBackend, web
+
+
+@unittest.skipIf(web is None, "aiohttp is not installed")
+class TestAsyncDataset(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.backend = AsyncStubBackend(45)
+        self.api_url = self.loop.run_until_complete(self.backend.start())
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.backend.close())
+        self.loop.close()
+
+    def run_with_dataset(self, coroutine_function):
+        async def run():
+            async with AsyncDatasets("tok", api_url=self.api_url, max_concurrency=4) as datasets:
+                await coroutine_function(datasets["stub"])
+
+        self.loop.run_until_complete(run())
+
+    def test_elements_are_iterated(self):
+        """
+        AsyncDataset iterates over its elements in order, and retrieves the contents of each page at once.
+        :return:
+        """
+        async def iterate(dataset):
+            titles = []
+            contents = []
+
+            async for element in dataset.filter_iter(cache_content=True):
+                titles.append(element.get_title())
+                contents.append(await element.get_content())
+
+            self.assertEqual(titles, ["title {}".format(index) for index in range(45)])
+            self.assertEqual(contents, ["content {}".format(index).encode() for index in range(45)])
+            self.assertEqual(self.backend.requests.count(["GET", "/datasets/tok/stub/elements/content"]), 3)
+
+        self.run_with_dataset(iterate)
+
+    def test_elements_are_sliced(self):
+        """
+        AsyncDataset retrieves elements by index, slice and id.
+        :return:
+        """
+        async def slice_elements(dataset):
+            elements = await dataset[5:25:2]
+            self.assertEqual([element.get_id() for element in elements], [str(index) for index in range(5, 25, 2)])
+
+            element = await dataset[-1]
+            self.assertEqual(element.get_id(), "44")
+
+            element = await dataset["7"]
+            self.assertEqual(element.get_title(), "title 7")
+            self.assertEqual(await element.get_content(), b"content 7")
+
+            self.assertEqual(await dataset.keys(), [str(index) for index in range(45)])
+
+            with self.assertRaises(KeyError):
+                await dataset[45:50]
+
+        self.run_with_dataset(slice_elements)
+
+    def test_stopped_iteration_cancels_the_next_page(self):
+        """
+        AsyncDataset cancels the page requested ahead when the iteration is stopped early.
+        :return:
+        """
+        self.backend.page_delay = 0.3
+
+        async def stop_iteration(dataset):
+            iterator = dataset.filter_iter()
+            element = await iterator.__anext__()
+            await iterator.aclose()
+            await asyncio.sleep(0.1)
+
+            self.assertEqual(element.get_id(), "0")
+            self.assertEqual([task for task in asyncio.all_tasks() if "_get_elements" in repr(task.get_coro())], [])
+
+        self.run_with_dataset(stop_iteration)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# dhub
+# Copyright (C) 2017 Iván de Paz Centeno <ipazc@unileon.es>.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; version 3
+# of the License or (at your option) any later version of
+# the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+__author__ = 'Iván de Paz Centeno'
+
+
+import asyncio
+import unittest
+from dhub.async_datasets import AsyncDatasets
+from dhub.tests.async_stub_backend import AsyncStubBackend, web
+
+
+@unittest.skipIf(web is None, "aiohttp is not installed")
+class TestAsyncDatasets(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.backend = AsyncStubBackend(45)
+        self.api_url = self.loop.run_until_complete(self.backend.start())
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.backend.close())
+        self.loop.close()
+
+    def test_datasets_are_listed(self):
+        """
+        AsyncDatasets retrieves the server info and the datasets of the token when opened.
+        :return:
+        """
+        async def list_datasets():
+            async with AsyncDatasets("tok", api_url=self.api_url, max_concurrency=4) as datasets:
+                self.assertEqual(datasets.server_info, {'Page-Size': 20})
+                self.assertEqual(datasets.keys(), ["tok/stub"])
+                self.assertIn("stub", datasets)
+
+                dataset = datasets["stub"]
+                self.assertEqual(dataset.get_title(), "stub")
+                self.assertEqual(len(dataset), 45)
+                self.assertIs(dataset.connection, datasets.connection)
+
+            self.assertIsNone(datasets.connection.session)
+
+        self.loop.run_until_complete(list_datasets())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# dhub
+# Copyright (C) 2017 Iván de Paz Centeno <ipazc@unileon.es>.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; version 3
+# of the License or (at your option) any later version of
+# the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+__author__ = 'Iván de Paz Centeno'
+
+
+import asyncio
+import unittest
+from dhub.async_datasets import AsyncDatasets
+from dhub.tests.async_stub_backend import AsyncStubBackend, web
+
+
+@unittest.skipIf(web is None, "aiohttp is not installed")
+class TestAsyncElement(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.backend = AsyncStubBackend(5)
+        self.api_url = self.loop.run_until_complete(self.backend.start())
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.backend.close())
+        self.loop.close()
+
+    def test_content_is_retrieved_and_set(self):
+        """
+        AsyncElement retrieves its content from the backend, and uploads the new one only when it changes.
+        :return:
+        """
+        async def set_content():
+            async with AsyncDatasets("tok", api_url=self.api_url, max_concurrency=4) as datasets:
+                element = await datasets["stub"]["3"]
+
+                self.assertEqual(await element.get_content(), b"content 3")
+                self.assertTrue(await element.set_content(b"new content"))
+                self.assertFalse(await element.set_content(b"new content"))
+                self.assertEqual(await element.get_content(), b"new content")
+
+                await element.set_title("new title")
+                await element.refresh()
+                self.assertEqual(element.get_title(), "new title")
+
+        self.loop.run_until_complete(set_content())
+
+        self.assertEqual(self.backend.contents["3"], b"new content")
+        self.assertEqual(self.backend.requests.count(["PUT", "/datasets/tok/stub/elements/3/content"]), 1)
+        self.assertEqual(self.backend.requests.count(["GET", "/datasets/tok/stub/elements/3/content"]), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
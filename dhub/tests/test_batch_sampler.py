@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# dhub
+# Copyright (C) 2017 Iván de Paz Centeno <ipazc@unileon.es>.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; version 3
+# of the License or (at your option) any later version of
+# the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+__author__ = 'Iván de Paz Centeno'
+
+
+from concurrent.futures import Future
+import unittest
+from dhub.batch_sampler import BatchSampler
+
+
+class IdsDataset(object):
+    """
+    Stands for a dataset whose elements are their own ids.
+    """
+
+    def __init__(self, elements_count):
+        self.ids = ["id{}".format(index) for index in range(elements_count)]
+        self.requests = []
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _get_keys(self, start, stop, step=1, options=None):
+        return self.ids[start:stop:step]
+
+    def _request_elements(self, ids):
+        self.requests.append(ids)
+        future = Future()
+        future.set_result(list(ids))
+        return [future]
+
+
+class TestBatchSampler(unittest.TestCase):
+    def test_order_depends_on_seed_and_epoch(self):
+        """
+        BatchSampler yields every element once per epoch, in an order reproducible from the seed and epoch.
+        :return:
+        """
+        dataset = IdsDataset(50)
+        sampler = BatchSampler(dataset, 8, seed=7)
+        first_epoch = list(sampler)
+
+        self.assertEqual(len(first_epoch), 7)
+        self.assertEqual(sorted(element for batch in first_epoch for element in batch), sorted(dataset.ids))
+        self.assertEqual(list(BatchSampler(dataset, 8, seed=7)), first_epoch)
+
+        sampler.set_epoch(1)
+        self.assertNotEqual(list(sampler), first_epoch)
+
+    def test_batches_are_requested_ahead(self):
+        """
+        BatchSampler requests the next batches before the current one is consumed, and drops the last
+        incomplete batch if asked.
+        :return:
+        """
+        dataset = IdsDataset(20)
+        iterator = iter(BatchSampler(dataset, 5, shuffle=False, drop_last=True, prefetch_batches=2))
+
+        self.assertEqual(next(iterator), dataset.ids[0:5])
+        self.assertEqual(len(dataset.requests), 3)
+        self.assertEqual(len(list(BatchSampler(IdsDataset(22), 5, drop_last=True))), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# dhub
+# Copyright (C) 2017 Iván de Paz Centeno <ipazc@unileon.es>.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; version 3
+# of the License or (at your option) any later version of
+# the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+__author__ = 'Iván de Paz Centeno'
+
+
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+from io import BytesIO
+from pyzip import InvalidKeysHashes
+from dhub.dataset import _copy_content
+from dhub.dhubrc import dhubrc
+from dhub.tests.stub_dataset import StubDataset
+
+
+class TestDataset(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.dataset = StubDataset()
+        self.add_elements(25)
+
+    def add_elements(self, count):
+        for index in range(len(self.dataset.elements), len(self.dataset.elements) + count):
+            element_id = str(index)
+            self.dataset.elements[element_id] = {'_id': element_id, 'title': "title {}".format(index),
+                                                 'description': "", 'tags': [], 'http_ref': "",
+                                                 'comments_count': 0}
+            self.dataset.contents[element_id] = os.urandom(index * 100)
+
+        self.dataset.refresh()
+
+    def tearDown(self):
+        self.dataset.close()
+        self.dataset.executors.shutdown()
+        shutil.rmtree(self.folder)
+
+    def saved_contents(self):
+        content_folder = os.path.join(self.folder, "content")
+        contents = {}
+
+        for file_name in os.listdir(content_folder):
+            with open(os.path.join(content_folder, file_name), "rb") as f:
+                contents[file_name] = f.read()
+
+        return contents
+
+    def test_content_is_copied(self):
+        """
+        _copy_content() copies the content into a file or a buffer, and returns its hash.
+        :return:
+        """
+        content = os.urandom(100000)
+        digest = hashlib.sha256(content).hexdigest().encode()
+
+        with BytesIO(content) as source, BytesIO() as target:
+            self.assertEqual(_copy_content(source, target), digest)
+            self.assertEqual(target.getvalue(), content)
+
+        buffer = bytearray(len(content))
+
+        with BytesIO(content) as source:
+            self.assertEqual(_copy_content(source, buffer), digest)
+
+        self.assertEqual(buffer, content)
+
+    def test_contents_are_streamed(self):
+        """
+        Dataset.stream_contents() writes every content into its destination, and skips the elements without one.
+        :return:
+        """
+        buffers = {}
+
+        def destination(element_id, size):
+            if element_id == "3":
+                return None
+
+            buffers[element_id] = bytearray(size)
+            return buffers[element_id]
+
+        self.dataset.stream_contents(list(self.dataset.contents), destination)
+
+        self.assertEqual(len(buffers), 24)
+        for element_id, buffer in buffers.items():
+            self.assertEqual(buffer, self.dataset.contents[element_id])
+
+    def test_corrupted_contents_are_reported(self):
+        """
+        Dataset.stream_contents() fails when a content does not match its hash.
+        :return:
+        """
+        self.dataset.corrupted_element = "5"
+
+        with self.assertRaises(InvalidKeysHashes):
+            self.dataset.stream_contents(list(self.dataset.contents), lambda element_id, size: bytearray(size))
+
+    def test_dataset_is_saved_again_into_the_same_folder(self):
+        """
+        Dataset.save_to_folder() overwrites the contents saved before into the folder.
+        :return:
+        """
+        self.dataset.save_to_folder(self.folder)
+        self.dataset.contents["7"] = b"changed"
+        self.dataset.save_to_folder(self.folder)
+
+        self.assertEqual(self.saved_contents(), {element_id: content for element_id, content
+                                                 in self.dataset.contents.items()})
+
+    def test_failed_save_leaves_no_partial_contents(self):
+        """
+        Dataset.save_to_folder() does not leave on disk the contents of a segment that failed to be verified.
+        :return:
+        """
+        self.dataset.corrupted_element = "22"
+
+        with self.assertRaises(InvalidKeysHashes):
+            self.dataset.save_to_folder(self.folder)
+
+        self.assertEqual(sorted(self.saved_contents(), key=int), [str(index) for index in range(20)])
+
+    def test_contents_are_prefetched(self):
+        """
+        Dataset.filter_iter() keeps the contents of prefetch_content_pages pages requested ahead of the page
+        being yielded.
+        :return:
+        """
+        self.add_elements(75)
+        iterator = self.dataset.filter_iter(cache_content=True, prefetch_pages=5, prefetch_content_pages=2)
+
+        for index in range(20):
+            element = next(iterator)
+            self.assertEqual(element.get_content(), self.dataset.contents[str(index)])
+
+        time.sleep(0.2)  # the pages of metadata ahead are retrieved.
+        element = next(iterator)
+        time.sleep(0.2)  # the contents requested are retrieved.
+
+        self.assertEqual(element.get_content(), self.dataset.contents["20"])
+        self.assertEqual(self.dataset.content_requests, 4)  # the page being yielded and two pages ahead.
+        self.assertEqual([element.get_id() for element in iterator], [str(index) for index in range(21, 100)])
+
+    def test_closed_iteration_cancels_prefetched_contents(self):
+        """
+        Dataset.filter_iter() cancels the contents requested ahead when the iteration is closed.
+        :return:
+        """
+        self.add_elements(75)
+        self.dataset.executors.workers['content_download'] = 1
+        self.dataset.contents_gate.clear()  # contents are requested, but not retrieved.
+        iterator = self.dataset.filter_iter(cache_content=True, prefetch_pages=5, prefetch_content_pages=2)
+
+        for index in range(20):
+            next(iterator)
+
+        time.sleep(0.2)  # the pages of metadata ahead are retrieved.
+        next(iterator)
+        iterator.close()
+
+        self.dataset.contents_gate.set()
+        self.dataset.executors.shutdown()
+        self.assertEqual(self.dataset.content_requests, 2)  # the pages yielded, but not those ahead.
+
+    def test_ids_of_a_range_are_retrieved(self):
+        """
+        Dataset._get_keys() retrieves the ids of the range from the pages that it touches, once each.
+        :return:
+        """
+        with mock.patch.dict(dhubrc.options, {'id_index': {'enabled': False}}):
+            self.assertEqual(self.dataset._get_keys(3, 25), [str(index) for index in range(3, 25)])
+            self.assertEqual(self.dataset.page_requests, 2)
+
+            self.assertEqual(self.dataset._get_keys(24, 2, -3), [str(index) for index in range(24, 2, -3)])
+            self.assertEqual(self.dataset._get_keys(0, 25, 21), ["0", "21"])
+            self.assertEqual(self.dataset.page_requests, 2)  # the pages are cached.
+
+    def test_ids_out_of_range_are_not_retrieved(self):
+        """
+        Dataset._get_keys() raises IndexError for a range beyond the last element, instead of truncating it.
+        :return:
+        """
+        with mock.patch.dict(dhubrc.options, {'id_index': {'enabled': False}}):
+            for start, stop, step in [(10, 30, 1), (20, 26, 1), (26, 0, -1), (0, 50, 25)]:
+                with self.assertRaises(IndexError):
+                    self.dataset._get_keys(start, stop, step)
+
+    def test_id_index_is_kept_when_elements_are_added(self):
+        """
+        Dataset keeps its index of ids when elements are appended, and resets it when they are removed.
+        :return:
+        """
+        with mock.patch.dict(dhubrc.options, {'id_index': {'folder': os.path.join(self.folder, "ids")}}):
+            self.assertEqual(self.dataset._get_keys(0, 25), [str(index) for index in range(25)])
+            self.assertEqual(self.dataset.page_requests, 2)
+
+            self.dataset.add_elements([{'title': "new"}] * 5)
+
+            self.assertEqual(self.dataset._get_keys(0, 20), [str(index) for index in range(20)])
+            self.assertEqual(self.dataset.page_requests, 2)  # answered by the index.
+            self.assertEqual(self.dataset._get_keys(0, 30), [str(index) for index in range(30)])
+            self.assertEqual(self.dataset.page_requests, 4)
+
+            del self.dataset.elements["0"]
+            self.dataset.refresh()
+
+            self.assertEqual(self.dataset._get_keys(0, 20), [str(index) for index in range(1, 21)])
+
+    def test_only_changed_fields_are_updated(self):
+        """
+        Dataset.update() sends the fields changed with the setters, and every field when none is known to be changed.
+        :return:
+        """
+        self.dataset.set_title("new title")
+        self.dataset.set_tags(["new"])
+        self.dataset.update()
+        self.dataset.update()
+
+        self.assertEqual(self.dataset.patches[0], ["/datasets/tok/stub", {'title': "new title", 'tags': ["new"]}])
+        self.assertEqual(sorted(self.dataset.patches[1][1]), ['description', 'fork_count', 'fork_father', 'reference',
+                                                              'size', 'tags', 'title'])
+
+    def test_failed_fields_are_updated_again(self):
+        """
+        Dataset.update() keeps the fields of a failed update, and sends them along with those changed afterwards.
+        :return:
+        """
+        self.dataset.failing_patches = 1
+        self.dataset.set_title("new title")
+
+        with self.assertRaises(Exception):
+            self.dataset.update()
+
+        self.dataset.set_description("new description")
+        self.dataset.update()
+
+        self.assertEqual(self.dataset.patches, [["/datasets/tok/stub", {'title': "new title",
+                                                                        'description': "new description"}]])
+
+    def test_filters_are_not_indexed(self):
+        """
+        Dataset only keeps an index of ids for the whole dataset, since the elements that match a filter change
+        with their metadata.
+        :return:
+        """
+        folder = os.path.join(self.folder, "ids")
+
+        with mock.patch.dict(dhubrc.options, {'id_index': {'folder': folder}}):
+            self.dataset._get_keys(0, 25, options={'tags': ["split: train"]})
+            self.assertFalse(os.path.exists(folder))
+
+            self.dataset._get_keys(0, 25)
+            self.assertEqual(len(os.listdir(folder)), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# dhub
+# Copyright (C) 2017 Iván de Paz Centeno <ipazc@unileon.es>.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; version 3
+# of the License or (at your option) any later version of
+# the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+__author__ = 'Iván de Paz Centeno'
+
+
+import unittest
+from unittest import mock
+from dhub.element import Element
+from dhub.tests.stub_dataset import StubDataset
+
+
+class TestElement(unittest.TestCase):
+    def setUp(self):
+        self.dataset = StubDataset()
+        self.dataset.elements["0"] = {'_id': "0", 'title': "title", 'description': "description",
+                                      'tags': ["split: train"], 'http_ref': "ref", 'comments_count': 0}
+        self.dataset.refresh()
+
+    def tearDown(self):
+        self.dataset.close()
+        self.dataset.executors.shutdown()
+
+    def element(self, smart_updater=None):
+        return Element.from_dict(dict(self.dataset.elements["0"], has_content=False), self.dataset, self.dataset.token,
+                                 smart_updater=smart_updater)
+
+    def test_only_changed_fields_are_sent(self):
+        """
+        Element sends only the fields changed with the setters, merged in a single update.
+        :return:
+        """
+        element = self.element(self.dataset.smart_updater)
+        element.set_title("new title")
+        element.set_tag("split", "test")
+        self.dataset.smart_updater.flush()
+        self.dataset.smart_updater.wait_for_elements_update(["0"])
+
+        self.assertEqual(self.dataset.patches, [["datasets/tok/stub/elements/bundle",
+                                                 {'elements': {"0": {'title': "new title",
+                                                                     'tags': ["split: test"]}}}]])
+
+    def test_failed_fields_are_sent_again(self):
+        """
+        Element keeps the fields of a failed update, and sends them along with those changed afterwards.
+        :return:
+        """
+        element = self.element()
+        patches = []
+
+        def patch_json(rel_url, extra_data=None, json_data=None):
+            patches.append(json_data)
+
+            if len(patches) == 1:
+                raise Exception("Failed to communicate with backend")
+
+        with mock.patch.object(Element, "_patch_json", side_effect=patch_json), \
+                mock.patch.object(Element, "refresh"):
+            with self.assertRaises(Exception):
+                element.set_title("new title")
+
+            element.set_description("new description")
+            element.set_ref("new ref")
+
+        self.assertEqual(patches, [{'title': "new title"}, {'title': "new title", 'description': "new description"},
+                                   {'http_ref': "new ref"}])
+
+    def test_all_fields_are_sent_when_none_is_known_to_be_changed(self):
+        """
+        Element sends every field when updated without a known change, as after modifying the tags in place.
+        :return:
+        """
+        element = self.element()
+
+        with mock.patch.object(Element, "_patch_json") as patch_json, mock.patch.object(Element, "refresh"):
+            element.update()
+
+        patch_json.assert_called_once_with("datasets/tok/stub/elements/0", json_data=element.data)
+
+    def test_refresh_keeps_the_cached_content_unless_it_changed(self):
+        """
+        Element keeps its cached content when refreshed after a metadata change, and drops it once it is removed.
+        :return:
+        """
+        element = self.element()
+        element.has_content = True
+        cache_key = self.dataset._content_cache_key("0")
+        self.dataset.memory_cache.put(cache_key, b"content", len(b"content"))
+        self.dataset.disk_cache.put(cache_key, b"content")
+        definition = dict(self.dataset.elements["0"], title="new title", has_content=True)
+
+        with mock.patch.object(Element, "_get_json", return_value=definition):
+            element.refresh()
+
+        self.assertEqual(element.get_title(), "new title")
+        self.assertEqual(self.dataset.memory_cache.get(cache_key), b"content")
+        self.assertEqual(self.dataset.disk_cache.get(cache_key), b"content")
+
+        with mock.patch.object(Element, "_get_json", return_value=dict(definition, has_content=False)):
+            element.refresh()
+
+        self.assertIsNone(self.dataset.memory_cache.get(cache_key))
+        self.assertIsNone(self.dataset.disk_cache.get(cache_key))
+
+
+if __name__ == '__main__':
+    unittest.main()
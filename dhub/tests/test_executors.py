@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# dhub
+# Copyright (C) 2017 Iván de Paz Centeno <ipazc@unileon.es>.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; version 3
+# of the License or (at your option) any later version of
+# the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+__author__ = 'Iván de Paz Centeno'
+
+
+import threading
+import unittest
+from dhub.executors import Executors, METADATA, CONTENT_DOWNLOAD
+
+
+class TestExecutors(unittest.TestCase):
+    def test_executors_are_created_lazily(self):
+        """
+        Executors does not spawn any thread until a task is submitted to a workload.
+        :return:
+        """
+        threads_count = threading.active_count()
+        executors = Executors()
+
+        self.assertEqual(threading.active_count(), threads_count)
+        self.assertEqual(executors.submit(METADATA, lambda: 42).result(), 42)
+        self.assertEqual(list(executors.executors.keys()), [METADATA])
+
+        executors.shutdown()
+
+    def test_workers_can_be_overridden(self):
+        """
+        Executors accepts per-instance amount of workers for each workload.
+        :return:
+        """
+        executors = Executors({CONTENT_DOWNLOAD: 32})
+        default_executors = Executors()
+
+        self.assertEqual(executors.get_workers(CONTENT_DOWNLOAD), 32)
+        self.assertEqual(executors.get_workers(METADATA), default_executors.get_workers(METADATA))
+        self.assertEqual(executors[CONTENT_DOWNLOAD]._max_workers, 32)
+        self.assertEqual(executors.total_workers(),
+                         default_executors.total_workers() - default_executors.get_workers(CONTENT_DOWNLOAD) + 32)
+
+        executors.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# dhub
+# Copyright (C) 2017 Iván de Paz Centeno <ipazc@unileon.es>.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; version 3
+# of the License or (at your option) any later version of
+# the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+__author__ = 'Iván de Paz Centeno'
+
+
+from io import BytesIO
+import os
+import tempfile
+import unittest
+from pyzip import PyZip
+from dhub.file_content import FileContent, write_bundle
+
+
+class TestFileContent(unittest.TestCase):
+
+    def test_bundle_is_readable_by_pyzip(self):
+        """
+        write_bundle produces bundles that PyZip reads back, including the hashes of the contents.
+        :return:
+        """
+        with tempfile.TemporaryDirectory() as folder:
+            file_name = os.path.join(folder, "content.bin")
+            with open(file_name, "wb") as f:
+                f.write(b"file content")
+
+            with BytesIO() as bundle:
+                write_bundle({'a': b"bytes content", 'b': FileContent(file_name)}, bundle)
+                result = dict(PyZip().from_bytes(bundle.getvalue()))
+
+        self.assertEqual(result, {'a': b"bytes content", 'b': b"file content"})
+
+    def test_missing_file_is_rejected(self):
+        """
+        FileContent can't be built from a file that does not exist.
+        :return:
+        """
+        with self.assertRaises(Exception):
+            FileContent("/this/file/does/not/exist")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# dhub
+# Copyright (C) 2017 Iván de Paz Centeno <ipazc@unileon.es>.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; version 3
+# of the License or (at your option) any later version of
+# the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+__author__ = 'Iván de Paz Centeno'
+
+
+import os
+import tempfile
+import unittest
+from dhub.metadata_table import MetadataTable, np
+
+
+def definition(element_id, tags, has_content=True):
+    return {'_id': element_id, 'title': "title {}".format(element_id), 'description': "", 'http_ref': "",
+            'has_content': has_content, 'comments_count': 0, 'tags': tags}
+
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class TestMetadataTable(unittest.TestCase):
+    def test_tags_are_flattened(self):
+        """
+        MetadataTable keeps the tags of every element in a flat array, for both string and dict tags.
+        :return:
+        """
+        table = MetadataTable.from_definitions([definition("a", ["bare", {"split": "train"}]),
+                                                definition("b", [], has_content=False),
+                                                definition("c", ["split: train"])])
+
+        self.assertEqual(table.get_tags(0), ["bare", "split: train"])
+        self.assertEqual(table.get_tags(1), [])
+        self.assertEqual(table.has_tag("split: train").tolist(), [True, False, True])
+
+        filtered = table.filter(table.has_tag("split: train") & table['has_content'])
+
+        self.assertEqual(filtered['ids'].tolist(), ["a", "c"])
+        self.assertEqual(filtered.get_tags(1), ["split: train"])
+
+    def test_table_is_saved(self):
+        """
+        MetadataTable can be saved into a .npz file and loaded back.
+        :return:
+        """
+        table = MetadataTable.from_definitions([definition("a", ["x"]), definition("b", ["y", "z"])])
+
+        with tempfile.TemporaryDirectory() as folder:
+            file_name = os.path.join(folder, "metadata.npz")
+            table.save(file_name)
+            loaded = MetadataTable.load(file_name)
+
+        self.assertEqual(loaded['titles'].tolist(), table['titles'].tolist())
+        self.assertEqual(loaded.get_tags(1), ["y", "z"])
+
+    def test_string_and_dict_tags_are_the_same(self):
+        """
+        MetadataTable parses the tags like the tag store, whatever their format.
+        :return:
+        """
+        table = MetadataTable.from_definitions([definition("a", ["split:train"]), definition("b", [{"split": "train"}]),
+                                                definition("c", ["split: test"])])
+
+        self.assertEqual(table.has_tag("split: train").tolist(), [True, True, False])
+        self.assertEqual(table.has_tag({"split": "train"}).tolist(), [True, True, False])
+
+    def test_rows_do_not_take_the_width_of_the_longest_value(self):
+        """
+        MetadataTable keeps a long value without widening the rest of the rows of its column.
+        :return:
+        """
+        definitions = [definition(str(index), []) for index in range(1000)]
+        definitions[0]['description'] = "x" * 10000
+        table = MetadataTable.from_definitions(definitions)
+
+        self.assertEqual(table['descriptions'].nbytes, 1000 * table['descriptions'].itemsize)
+        self.assertLess(table['descriptions'].itemsize, 16)
+        self.assertEqual(table['descriptions'][0], "x" * 10000)
+
+
+if __name__ == '__main__':
+    unittest.main()
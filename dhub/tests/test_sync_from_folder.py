@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# dhub
+# Copyright (C) 2017 Iván de Paz Centeno <ipazc@unileon.es>.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; version 3
+# of the License or (at your option) any later version of
+# the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+__author__ = 'Iván de Paz Centeno'
+
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from dhub.tests.stub_dataset import StubDataset
+
+
+class TestSyncFromFolder(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.folder, "content"))
+        self.metadata = {}
+
+        for index in range(25):
+            self.write_element("file{}".format(index), b"content")
+
+        self.dataset = StubDataset()
+        self.dataset.smart_updater.max_latency = 600  # batches are sent when full or flushed.
+
+    def tearDown(self):
+        self.dataset.close()
+        self.dataset.executors.shutdown()
+        shutil.rmtree(self.folder)
+
+    def write_element(self, key, content):
+        with open(os.path.join(self.folder, "content", key), "wb") as f:
+            f.write(content)
+
+        self.metadata[key] = {'title': key, 'description': "", 'tags': ["split: train"], 'http_ref': ""}
+
+        with open(os.path.join(self.folder, "metadata.json"), "w") as f:
+            json.dump(self.metadata, f)
+
+    def test_only_new_and_changed_elements_are_uploaded(self):
+        """
+        Dataset.sync_from_folder() adds the new elements, updates the changed ones and skips the rest.
+        :return:
+        """
+        self.assertEqual(self.dataset.sync_from_folder(self.folder), {'added': 25, 'updated': 0, 'skipped': 0})
+        self.assertEqual(len(self.dataset.contents), 25)
+
+        self.write_element("file3", b"changed")
+        self.write_element("new", b"new")
+
+        self.assertEqual(self.dataset.sync_from_folder(self.folder, use_hash=True),
+                         {'added': 1, 'updated': 25, 'skipped': 0})  # signatures by hash differ from those by stat.
+        self.assertEqual(self.dataset.sync_from_folder(self.folder, use_hash=True),
+                         {'added': 0, 'updated': 0, 'skipped': 26})
+
+        self.write_element("file4", b"changed again")
+
+        self.assertEqual(self.dataset.sync_from_folder(self.folder, use_hash=True),
+                         {'added': 0, 'updated': 1, 'skipped': 25})
+        self.assertEqual(len(self.dataset.elements), 26)
+        self.assertEqual(self.dataset.content_requests, 0)  # the old contents of the changed elements are not retrieved.
+
+        contents = {self.dataset.get_tag_of(element_id, "dhub_source"): content
+                    for element_id, content in self.dataset.contents.items()}
+        self.assertEqual(contents["file3"], b"changed")
+        self.assertEqual(contents["file4"], b"changed again")
+        self.assertEqual(contents["new"], b"new")
+
+    def test_elements_whose_upload_failed_are_uploaded_again(self):
+        """
+        Dataset.sync_from_folder() only signs the elements whose content was uploaded, so that an interrupted sync
+        is resumed by the next one.
+        :return:
+        """
+        self.dataset.failing_element = "0"
+
+        with self.assertRaises(Exception):
+            self.dataset.sync_from_folder(self.folder)
+
+        unsigned = [element_id for element_id in self.dataset.elements
+                    if self.dataset.get_tag_of(element_id, "dhub_signature") is None]
+        self.assertEqual(len(unsigned), 20)  # the first page of contents failed.
+
+        self.assertEqual(self.dataset.sync_from_folder(self.folder), {'added': 0, 'updated': 20, 'skipped': 5})
+        self.assertEqual(len(self.dataset.contents), 25)
+        self.assertEqual(self.dataset.sync_from_folder(self.folder), {'added': 0, 'updated': 0, 'skipped': 25})
+
+    def test_elements_not_synced_are_kept(self):
+        """
+        Dataset.sync_from_folder() leaves alone the elements of the dataset that were not added by a sync.
+        :return:
+        """
+        for element_id in ["a", "b"]:
+            self.dataset.elements[element_id] = {'_id': element_id, 'title': element_id, 'description': "",
+                                                 'tags': [], 'http_ref': "", 'comments_count': 0}
+        self.dataset.refresh()
+
+        self.assertEqual(self.dataset.sync_from_folder(self.folder), {'added': 25, 'updated': 0, 'skipped': 0})
+        self.assertEqual(self.dataset.elements["a"]['tags'], [])
+        self.assertEqual(self.dataset.elements["b"]['title'], "b")
+
+
+if __name__ == '__main__':
+    unittest.main()
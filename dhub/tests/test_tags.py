@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# dhub
+# Copyright (C) 2017 Iván de Paz Centeno <ipazc@unileon.es>.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; version 3
+# of the License or (at your option) any later version of
+# the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+__author__ = 'Iván de Paz Centeno'
+
+
+import unittest
+from dhub.tags import parse_tag, Tag, TagIndex, TagStore
+
+
+class TestTags(unittest.TestCase):
+    def test_tags_are_parsed(self):
+        """
+        parse_tag understands "name: value" strings, bare strings and dicts.
+        :return:
+        """
+        self.assertEqual(parse_tag("split: train"), [("split", "train")])
+        self.assertEqual(parse_tag("url: http://host"), [("url", "http://host")])
+        self.assertEqual(parse_tag("bare"), [("bare", None)])
+        self.assertEqual(parse_tag({"label": "cat"}), [("label", "cat")])
+
+    def test_queries(self):
+        """
+        TagIndex answers AND, OR, NOT, equality and prefix queries, and follows the updates of the tags.
+        :return:
+        """
+        index = TagIndex()
+        index.update("a", ["split: train", {"label": "cat"}])
+        index.update("b", ["split: test", {"label": "caterpillar"}, "bare"])
+        index.update("c", ["split: train", {"label": "dog"}])
+
+        self.assertEqual(index.query(Tag("split") == "train"), ["a", "c"])
+        self.assertEqual(index.query((Tag("split") == "train") & ~(Tag("label") == "cat")), ["c"])
+        self.assertEqual(index.query(Tag("label").startswith("cat") | Tag("bare")), ["a", "b"])
+
+        index.update("c", ["split: test"])
+        index.remove("b")
+
+        self.assertEqual(index.query(Tag("split") == "test"), ["c"])
+        self.assertEqual(index.query(Tag("label")), ["a"])
+        self.assertEqual(index.query(Tag("bare")), [])
+
+    def test_tag_store_keeps_wire_format(self):
+        """
+        TagStore reads and sets tags by name, keeping the format of each tag in the list.
+        :return:
+        """
+        tags = ["split: train", {"label": "cat"}, "bare"]
+        store = TagStore(tags)
+
+        self.assertEqual(store.get("split"), "train")
+        self.assertEqual(store.get("label"), "cat")
+        self.assertEqual(store.get("bare"), "bare")
+        self.assertEqual(store.get("missing"), "")
+
+        self.assertTrue(store.set("split", "test"))
+        self.assertTrue(store.set("label", "dog"))
+        self.assertFalse(store.set("new", "value"))
+        self.assertFalse(store.set(None, "other"))
+
+        self.assertEqual(store.to_list(), ["split: test", {"label": "dog"}, "bare", {"new": "value"}, "other"])
+        self.assertEqual(store.get("new"), "value")
+        self.assertEqual(store.get("other"), "other")
+
+    def test_tag_store_follows_changes_in_place(self):
+        """
+        TagStore reads the tags changed in place in the list it hands out.
+        :return:
+        """
+        store = TagStore(["split: train", "bare"])
+        self.assertEqual(store.get("split"), "train")
+
+        tags = store.to_list()
+        tags.insert(0, {"label": "cat"})
+        tags[1] = "split: test"
+
+        self.assertEqual(store.get("label"), "cat")
+        self.assertEqual(store.get("split"), "test")
+        self.assertTrue(store.set("label", "dog"))
+        self.assertEqual(tags, [{"label": "dog"}, "split: test", "bare"])
+
+    def test_disabled_index_takes_no_elements(self):
+        """
+        TagIndex ignores the updates until it is enabled.
+        :return:
+        """
+        index = TagIndex(enabled=False)
+        index.update("a", ["split: train"])
+        self.assertEqual(len(index), 0)
+
+        index.enable()
+        index.update("a", ["split: train"])
+        self.assertEqual(index.query(Tag("split") == "train"), ["a"])
+
+
+if __name__ == '__main__':
+    unittest.main()
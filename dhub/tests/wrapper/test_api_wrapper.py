@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# dhub
+# Copyright (C) 2017 Iván de Paz Centeno <ipazc@unileon.es>.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; version 3
+# of the License or (at your option) any later version of
+# the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+__author__ = 'Iván de Paz Centeno'
+
+
+import unittest
+from unittest import mock
+from dhub.dhubrc import dhubrc
+from dhub.executors import Executors
+from dhub.wrapper.api_wrapper import APIWrapper, get_session, sessions
+
+
+class FakeResponse(object):
+    def __init__(self, status_code, content, headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    def close(self):
+        pass
+
+
+class FakeSession(object):
+    """
+    Answers the requests with the given body, honouring the Range header.
+    """
+
+    def __init__(self, body, known_size=True):
+        self.body = body
+        self.known_size = known_size
+        self.requests = []
+
+    def request(self, method, url, data=None, json=None, params=None, timeout=None, stream=False, headers=None):
+        self.requests.append(headers)
+
+        if headers is None or 'Range' not in headers:
+            return FakeResponse(200, self.body)
+
+        start, end = [int(value) for value in headers['Range'][len("bytes="):].split("-")]
+        end = min(end, len(self.body) - 1)
+        size = len(self.body) if self.known_size else "*"
+
+        return FakeResponse(206, self.body[start:end + 1], {'Content-Range': "bytes {}-{}/{}".format(start, end, size)})
+
+
+class Wrapper(APIWrapper):
+    pass
+
+
+class TestAPIWrapper(unittest.TestCase):
+    def setUp(self):
+        self.executors = Executors()
+        self.wrapper = Wrapper("token", api_url="http://backend", token_info={}, server_info={},
+                               executors=self.executors)
+
+    def tearDown(self):
+        self.executors.shutdown()
+
+    def test_body_is_assembled_from_ranges(self):
+        """
+        APIWrapper downloads a body with concurrent ranges and reassembles it in order.
+        :return:
+        """
+        body = bytes(range(100))
+        self.wrapper.session = FakeSession(body)
+
+        content = self.wrapper._get_binary_ranges("content", 16, 3)
+        self.assertEqual(content, body)
+        self.assertIs(type(content), bytes)
+        self.assertEqual(len(self.wrapper.session.requests), 7)
+
+        self.wrapper.session = FakeSession(body[:10])
+        self.assertEqual(self.wrapper._get_binary_ranges("content", 16, 3), body[:10])
+
+    def test_body_of_unknown_size_is_requested_at_once(self):
+        """
+        APIWrapper falls back to a single request when the backend does not tell the size of the body.
+        :return:
+        """
+        body = bytes(range(100))
+        self.wrapper.session = FakeSession(body, known_size=False)
+
+        self.assertEqual(self.wrapper._get_binary_ranges("content", 16, 3), body)
+        self.assertEqual(self.wrapper.session.requests[-1], None)
+
+
+class TestGetSession(unittest.TestCase):
+    def tearDown(self):
+        for api_url in ["http://backend-a", "http://backend-b", "http://backend-c"]:
+            sessions.pop(api_url, None)
+
+    def test_session_is_shared_by_backend(self):
+        """
+        get_session() shares a session per backend, whose pool is enlarged when a larger one is requested.
+        :return:
+        """
+        with mock.patch.dict(dhubrc.options, clear=True):
+            session = get_session("http://backend-a", 4)
+
+            self.assertIs(get_session("http://backend-a", 2), session)
+            self.assertIsNot(get_session("http://backend-b", 4), session)
+            old_adapter = session.get_adapter("http://backend-a")
+
+            with mock.patch.object(old_adapter, "close") as close:
+                self.assertIs(get_session("http://backend-a", 8), session)
+
+            close.assert_called_once_with()
+            self.assertEqual(session.get_adapter("http://backend-a")._pool_maxsize, 8)
+            self.assertNotEqual(session.headers['Connection'], "close")
+
+    def test_keep_alive_is_disabled_by_dhubrc(self):
+        """
+        get_session() closes the connections after each request when disabled in .dhubrc, even as a string.
+        :return:
+        """
+        for value, keep_alive in [(False, False), ("false", False), ("0", False), ("true", True), (1, True)]:
+            with mock.patch.dict(dhubrc.options, {'http_keep_alive': value}):
+                session = get_session("http://backend-c", 4)
+                sessions.pop("http://backend-c")
+
+            self.assertEqual(session.headers['Connection'] != "close", keep_alive, value)
+
+
+if __name__ == '__main__':
+    unittest.main()
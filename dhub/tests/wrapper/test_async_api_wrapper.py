@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# dhub
+# Copyright (C) 2017 Iván de Paz Centeno <ipazc@unileon.es>.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; version 3
+# of the License or (at your option) any later version of
+# the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+__author__ = 'Iván de Paz Centeno'
+
+
+import asyncio
+import unittest
+from dhub.async_dataset import AsyncDataset
+from dhub.tests.async_stub_backend import AsyncStubBackend, web
+
+
+@unittest.skipIf(web is None, "aiohttp is not installed")
+class TestAsyncAPIWrapper(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.backend = AsyncStubBackend(5)
+        self.api_url = self.loop.run_until_complete(self.backend.start())
+        self.dataset = AsyncDataset("tok/stub", "stub", "", "", [], token="tok", token_info={},
+                                    server_info={'Page-Size': 20}, api_url=self.api_url)
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.dataset.connection.close())
+        self.loop.run_until_complete(self.backend.close())
+        self.loop.close()
+
+    def test_connection_is_opened_on_first_request(self):
+        """
+        AsyncAPIWrapper opens its connection on the first request, without an explicit open().
+        :return:
+        """
+        self.assertIsNone(self.dataset.connection.session)
+        self.loop.run_until_complete(self.dataset.refresh())
+
+        self.assertEqual(len(self.dataset), 5)
+        self.assertIsNotNone(self.dataset.connection.session)
+
+    def test_failed_requests_are_retried(self):
+        """
+        AsyncAPIWrapper retries a failed request up to three times.
+        :return:
+        """
+        self.backend.failing_requests = 2
+        self.loop.run_until_complete(self.dataset.refresh())
+        self.assertEqual(len(self.dataset), 5)
+
+        self.backend.failing_requests = 3
+
+        with self.assertRaises(Exception):
+            self.loop.run_until_complete(self.dataset.refresh())
+
+        self.assertEqual(len(self.backend.requests), 6)
+
+    def test_failed_updates_are_not_sent_again(self):
+        """
+        AsyncAPIWrapper does not retry the requests that are not idempotent.
+        :return:
+        """
+        self.backend.failing_requests = 1
+
+        with self.assertRaises(Exception):
+            self.loop.run_until_complete(self.dataset._patch_json("datasets/tok/stub/elements/0",
+                                                                  json_data={'title': "new title"}))
+
+        self.assertEqual(self.backend.requests, [["PATCH", "/datasets/tok/stub/elements/0"]])
+        self.assertEqual(self.backend.elements["0"]['title'], "title 0")
+
+
+if __name__ == '__main__':
+    unittest.main()
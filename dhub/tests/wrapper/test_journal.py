@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# dhub
+# Copyright (C) 2017 Iván de Paz Centeno <ipazc@unileon.es>.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; version 3
+# of the License or (at your option) any later version of
+# the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+__author__ = 'Iván de Paz Centeno'
+
+
+import os
+import shutil
+import tempfile
+import unittest
+from dhub.file_content import FileContent
+from dhub.executors import Executors
+from dhub.wrapper.journal import Journal
+from dhub.wrapper.smart_updater import AsyncSmartUpdater
+
+
+class FailingReceiver(object):
+    """
+    Stands for the dataset that owns the smart updater. The first metadata update sent fails.
+    """
+
+    def __init__(self):
+        self.server_info = {'Page-Size': 20}
+        self.executors = Executors()
+        self.patches = []
+
+    def _patch_json(self, rel_url, extra_data=None, json_data=None):
+        self.patches.append(json_data['elements'])
+
+        if len(self.patches) == 1:
+            raise Exception("Failed to communicate with backend")
+
+        return "done"
+
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.file_name = os.path.join(self.folder, "journal")
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_replay_returns_the_updates_not_acknowledged(self):
+        """
+        Journal replays the updates logged after the last acknowledgement of each element.
+        :return:
+        """
+        journal = Journal(self.file_name)
+        journal.replay()
+
+        first = journal.log('element_update', "elements/bundle", "a", {'title': "first"})
+        journal.log('element_update', "elements/bundle", "b", {'title': "other"})
+        journal.log_done('element_update', {'a': [first]})
+        journal.log('element_update', "elements/bundle", "a", {'title': "second"})
+        blob = journal.store_content(b"content")
+        journal.log('content_update', "elements/content", "a", blob)
+
+        records = Journal(self.file_name).replay()
+
+        self.assertEqual([[record['kind'], record['id']] for record in records],
+                         [['element_update', "b"], ['element_update', "a"], ['content_update', "a"]])
+        self.assertEqual(records[1]['payload'], {'title': "second"})
+        self.assertEqual(FileContent(records[2]['file']).read(), b"content")
+        self.assertFalse(journal.clear_if_done())
+
+    def test_journal_is_removed_once_everything_is_acknowledged(self):
+        """
+        Journal removes its file and its blobs once every update logged is acknowledged.
+        :return:
+        """
+        journal = Journal(self.file_name)
+        journal.replay()
+
+        seq = journal.log('content_update', "elements/content", "a", journal.store_content(b"content"))
+        journal.log_done('content_update', {'a': [seq]})
+
+        self.assertTrue(journal.clear_if_done())
+        self.assertEqual(os.listdir(self.folder), [])
+
+    def test_failed_update_is_replayed_after_a_later_one_is_sent(self):
+        """
+        Journal keeps the update of a failed batch pending even if a later update of the element is sent, and
+        replays only the fields that the later updates did not overwrite.
+        :return:
+        """
+        journal = Journal(self.file_name)
+        journal.replay()
+        receiver = FailingReceiver()
+        updater = AsyncSmartUpdater(receiver.server_info, receiver, journal=journal)
+
+        updater.queue_update("elements/bundle", "a", {'title': "title", 'description': "description"})
+        updater.flush()
+        self.assertTrue(updater.wait_until_done(10))
+
+        updater.queue_update("elements/bundle", "a", {'tags': ["tag"], 'description': "newer"})
+        updater.flush()
+        self.assertTrue(updater.wait_until_done(10))
+        updater.stop()
+        receiver.executors.shutdown()
+
+        self.assertEqual(len(updater.pop_failed_updates()), 1)
+        self.assertFalse(journal.clear_if_done())
+
+        records = Journal(self.file_name).replay()
+
+        self.assertEqual([record['payload'] for record in records], [{'title': "title"}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# dhub
+# Copyright (C) 2017 Iván de Paz Centeno <ipazc@unileon.es>.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; version 3
+# of the License or (at your option) any later version of
+# the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+__author__ = 'Iván de Paz Centeno'
+
+
+import os
+import tempfile
+import threading
+import unittest
+from dhub.executors import Executors
+from dhub.wrapper.resumable_upload import ResumableUpload
+
+
+class PartsReceiver(object):
+    """
+    Stands for the API wrapper of an element, recording the parts received and failing the requested ones.
+    """
+
+    def __init__(self, failing_parts=None):
+        self.api_url = "http://localhost"
+        self.executors = Executors()
+        self.failing_parts = set() if failing_parts is None else failing_parts
+        self.parts = {}
+        self.lock = threading.Lock()
+
+    def _put_binary(self, rel_url, extra_data=None, binary=None, headers=None):
+        start, end = headers['Content-Range'].split(" ")[1].split("/")[0].split("-")
+
+        if int(start) in self.failing_parts:
+            raise Exception("Failed to communicate with backend")
+
+        with self.lock:
+            self.parts[int(start)] = binary
+
+        return "done"
+
+
+class TestResumableUpload(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_content_is_uploaded_in_parts(self):
+        """
+        ResumableUpload sends every part of the content with its range, and removes its state afterwards.
+        :return:
+        """
+        content = os.urandom(1000)
+        receiver = PartsReceiver()
+
+        self.assertTrue(ResumableUpload(receiver, "elements/a/content", content, 300, self.folder.name).start().result())
+        self.assertEqual(b"".join(receiver.parts[start] for start in sorted(receiver.parts)), content)
+        self.assertEqual(os.listdir(self.folder.name), [])
+
+        receiver.executors.shutdown()
+
+    def test_failed_upload_is_resumed(self):
+        """
+        ResumableUpload reports failed parts, and a new upload of the same content only sends the missing ones.
+        :return:
+        """
+        content = os.urandom(1000)
+        receiver = PartsReceiver(failing_parts={300, 900})
+
+        with self.assertRaises(Exception):
+            ResumableUpload(receiver, "elements/a/content", content, 300, self.folder.name).start().result()
+
+        self.assertEqual(sorted(receiver.parts), [0, 600])
+
+        receiver.failing_parts.clear()
+        receiver.parts.clear()
+        upload = ResumableUpload(receiver, "elements/a/content", content, 300, self.folder.name)
+
+        self.assertEqual(upload.missing_parts(), [1, 3])
+        self.assertTrue(upload.start().result())
+        self.assertEqual(sorted(receiver.parts), [300, 900])
+
+        receiver.executors.shutdown()
+
+    def test_upload_is_settled_when_state_can_not_be_saved(self):
+        """
+        ResumableUpload fails with the error raised while saving its state, instead of never settling its future.
+        :return:
+        """
+        content = os.urandom(1000)
+        receiver = PartsReceiver()
+        state_folder = os.path.join(self.folder.name, "state")
+
+        with open(state_folder, "w"):
+            pass  # a file where the folder should be: the state can not be saved.
+
+        with self.assertRaises(OSError):
+            ResumableUpload(receiver, "elements/a/content", content, 300, state_folder).start().result(timeout=10)
+
+        self.assertEqual(sorted(receiver.parts), [0, 300, 600, 900])
+
+        receiver.executors.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# dhub
+# Copyright (C) 2017 Iván de Paz Centeno <ipazc@unileon.es>.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; version 3
+# of the License or (at your option) any later version of
+# the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+__author__ = 'Iván de Paz Centeno'
+
+
+import os
+import tempfile
+import threading
+from time import sleep
+import unittest
+from pyzip import PyZip
+from dhub.executors import Executors
+from dhub.file_content import FileContent
+from dhub.wrapper.smart_updater import AsyncSmartUpdater
+from dhub.wrapper.upload_limiter import UploadLimiter
+
+
+class UpdatesReceiver(object):
+    """
+    Stands for the dataset that owns the smart updater, recording the requests sent.
+    """
+
+    def __init__(self):
+        self.server_info = {'Page-Size': 20}
+        self.executors = Executors()
+        self.patches = []
+        self.puts = []
+        self.requests = []  # kinds of the requests, in the order they were sent.
+
+    def _patch_json(self, rel_url, extra_data=None, json_data=None):
+        self.patches.append(json_data['elements'])
+        self.requests.append("json")
+        return "done"
+
+    def _put_binary(self, rel_url, extra_data=None, binary=None):
+        self.puts.append([rel_url, binary])
+        self.requests.append("binary")
+        return "done"
+
+
+class SlowUpdatesReceiver(UpdatesReceiver):
+    """
+    Receiver whose first request of each kind takes a while, so that later batches could overtake it.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.started = {'json': threading.Event(), 'binary': threading.Event()}
+
+    def __slow_down(self, kind):
+        if not self.started[kind].is_set():
+            self.started[kind].set()
+            sleep(0.3)
+
+    def _patch_json(self, rel_url, extra_data=None, json_data=None):
+        self.__slow_down('json')
+        return super()._patch_json(rel_url, extra_data, json_data)
+
+    def _put_binary(self, rel_url, extra_data=None, binary=None):
+        self.__slow_down('binary')
+        return super()._put_binary(rel_url, extra_data, binary)
+
+
+class TestAsyncSmartUpdater(unittest.TestCase):
+    def test_updates_of_an_element_are_coalesced(self):
+        """
+        AsyncSmartUpdater keeps a single pending update per element, merging the fields of the new ones.
+        :return:
+        """
+        receiver = UpdatesReceiver()
+        updater = AsyncSmartUpdater(receiver.server_info, receiver)
+
+        updater.queue_update("elements/bundle", "a", {'title': "first"})
+        updater.queue_update("elements/bundle", "a", {'title': "second", 'tags': []})
+        updater.queue_update("elements/bundle", "b", {'title': "other"})
+
+        self.assertEqual(updater.tasks_pending, 2)
+        self.assertTrue(updater.is_element_update_queued(["a"]))
+
+        updater.wait_for_elements_update(["a", "b"])
+
+        self.assertFalse(updater.is_element_update_queued(["a", "b"]))
+        self.assertEqual(receiver.patches, [{'a': {'title': "second", 'tags': []}, 'b': {'title': "other"}}])
+
+        updater.stop()
+        receiver.executors.shutdown()
+
+    def test_full_batches_and_flushes_are_sent_without_waiting(self):
+        """
+        AsyncSmartUpdater sends a batch as soon as it is full or a flush is requested, not when the latency expires.
+        :return:
+        """
+        receiver = UpdatesReceiver()
+        updater = AsyncSmartUpdater(receiver.server_info, receiver)
+        updater.max_latency = 600
+
+        for index in range(20):
+            updater.queue_update("elements/bundle", str(index), {'title': "title"})
+
+        self.assertTrue(updater.wait_until_done(10))
+        self.assertEqual(len(receiver.patches), 1)
+
+        updater.queue_update("elements/bundle", "a", {'title': "title"})
+        self.assertFalse(updater.wait_until_done(0.2))
+
+        updater.flush()
+        self.assertTrue(updater.wait_until_done(10))
+        self.assertEqual(receiver.patches[1], {'a': {'title': "title"}})
+
+        updater.stop()
+        receiver.executors.shutdown()
+
+    def test_content_batches_are_bounded_by_bytes(self):
+        """
+        AsyncSmartUpdater splits content batches that exceed the bytes bound, and uploads oversize contents alone.
+        :return:
+        """
+        receiver = UpdatesReceiver()
+        updater = AsyncSmartUpdater(receiver.server_info, receiver)
+        updater.max_latency = 600
+        updater.batch_bytes = 10
+
+        updater.queue_content_update("datasets/a/b/elements/content", "a", b"x" * 6)
+        updater.queue_content_update("datasets/a/b/elements/content", "b", b"x" * 6)
+        updater.queue_content_update("datasets/a/b/elements/content", "c", b"x" * 30)
+        updater.flush()
+        self.assertTrue(updater.wait_until_done(10))
+
+        urls = sorted(url for url, _ in receiver.puts)
+        self.assertEqual(urls, ["datasets/a/b/elements/c/content", "datasets/a/b/elements/content",
+                                "datasets/a/b/elements/content"])
+
+        stats = updater.stats()['binary']
+        self.assertEqual(stats['batches'], 2)
+        self.assertEqual(stats['single_uploads'], 1)
+        self.assertEqual(stats['elements'], 3)
+        self.assertEqual(stats['max_batch_elements'], 1)
+
+        updater.stop()
+        receiver.executors.shutdown()
+
+    def test_contents_are_not_stalled_by_metadata(self):
+        """
+        AsyncSmartUpdater interleaves batches of contents with the batches of metadata instead of waiting for the
+        metadata queue to be empty.
+        :return:
+        """
+        receiver = UpdatesReceiver()
+        updater = AsyncSmartUpdater(receiver.server_info, receiver)
+        updater.max_latency = 600
+        updater.max_batches_in_flight = 1
+
+        updater.queue_content_update("datasets/a/b/elements/content", "content", b"content")
+
+        for index in range(60):
+            updater.queue_update("elements/bundle", str(index), {'title': "title"})
+
+        updater.flush()
+        self.assertTrue(updater.wait_until_done(10))
+        self.assertEqual(receiver.requests, ["json", "binary", "json", "json"])
+
+        updater.stop()
+        receiver.executors.shutdown()
+
+    def test_updates_of_an_element_are_sent_in_order(self):
+        """
+        AsyncSmartUpdater does not send an update of an element while its previous one is in flight.
+        :return:
+        """
+        receiver = SlowUpdatesReceiver()
+        updater = AsyncSmartUpdater(receiver.server_info, receiver)
+
+        updater.queue_update("elements/bundle", "a", {'title': "old"})
+        updater.queue_content_update("datasets/a/b/elements/content", "a", b"old")
+        updater.flush()
+        self.assertTrue(receiver.started['json'].wait(10))
+        self.assertTrue(receiver.started['binary'].wait(10))
+
+        updater.queue_update("elements/bundle", "a", {'title': "new"})
+        updater.queue_update("elements/bundle", "b", {'title': "other"})
+        updater.queue_content_update("datasets/a/b/elements/content", "a", b"new")
+        updater.flush()
+        self.assertTrue(updater.wait_until_done(10))
+
+        self.assertEqual([patch['a'] for patch in receiver.patches if 'a' in patch], [{'title': "old"}, {'title': "new"}])
+        self.assertEqual([PyZip().from_bytes(binary)['a'] for _, binary in receiver.puts], [b"old", b"new"])
+
+        updater.stop()
+        receiver.executors.shutdown()
+
+    def test_latency_counts_from_the_oldest_update_not_sent(self):
+        """
+        AsyncSmartUpdater holds the updates left out of a batch until their own maximum latency expires.
+        :return:
+        """
+        receiver = UpdatesReceiver()
+        updater = AsyncSmartUpdater(receiver.server_info, receiver)
+        updater.max_latency = 1
+
+        updater.queue_update("elements/bundle", "first", {'title': "title"})
+        sleep(0.6)
+
+        for index in range(20):
+            updater.queue_update("elements/bundle", str(index), {'title': "title"})
+
+        sleep(0.6)
+        self.assertEqual(len(receiver.patches), 1)
+
+        self.assertTrue(updater.wait_until_done(10))
+        self.assertEqual(receiver.patches[1], {'19': {'title': "title"}})
+
+        updater.stop()
+        receiver.executors.shutdown()
+
+    def test_room_of_a_file_changed_while_queued_is_given_back(self):
+        """
+        AsyncSmartUpdater releases the room a file content took when it was queued, even if the file grew meanwhile.
+        :return:
+        """
+        receiver = UpdatesReceiver()
+        upload_limiter = UploadLimiter(1000)
+        updater = AsyncSmartUpdater(receiver.server_info, receiver, upload_limiter=upload_limiter)
+        updater.max_latency = 600
+
+        with tempfile.TemporaryDirectory() as folder:
+            file_name = os.path.join(folder, "content")
+
+            with open(file_name, "wb") as f:
+                f.write(b"x" * 6)
+
+            updater.queue_content_update("datasets/a/b/elements/content", "a", FileContent(file_name))
+            self.assertEqual(upload_limiter.get_in_flight(), 6)
+
+            with open(file_name, "ab") as f:
+                f.write(b"x" * 20)
+
+            updater.flush()
+            self.assertTrue(updater.wait_until_done(10))
+
+        self.assertEqual(upload_limiter.get_in_flight(), 0)
+        self.assertEqual(updater.pending_bytes, 0)
+
+        updater.stop()
+        receiver.executors.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# dhub
+# Copyright (C) 2017 Iván de Paz Centeno <ipazc@unileon.es>.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; version 3
+# of the License or (at your option) any later version of
+# the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+__author__ = 'Iván de Paz Centeno'
+
+
+import threading
+import unittest
+from dhub.wrapper.upload_limiter import UploadLimiter
+
+
+class TestUploadLimiter(unittest.TestCase):
+    def test_acquire_waits_for_room(self):
+        """
+        UploadLimiter blocks acquirers until enough bytes are released, and fails once the timeout expires.
+        :return:
+        """
+        limiter = UploadLimiter(10, timeout=0)
+        limiter.acquire(8)
+
+        self.assertFalse(limiter.try_acquire(5))
+        with self.assertRaises(Exception):
+            limiter.acquire(5)
+
+        releaser = threading.Timer(0.1, limiter.release, [8])
+        releaser.start()
+        limiter.acquire(5, timeout=10)
+        releaser.join()
+
+        self.assertEqual(limiter.get_in_flight(), 5)
+
+    def test_oversize_content_is_accepted_alone(self):
+        """
+        UploadLimiter lets a content larger than the limit in when nothing else is in flight.
+        :return:
+        """
+        limiter = UploadLimiter(10, timeout=0)
+
+        self.assertTrue(limiter.try_acquire(50))
+        self.assertFalse(limiter.try_acquire(1))
+        limiter.release(50)
+        self.assertTrue(limiter.try_acquire(1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -20,15 +20,63 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
 # MA  02110-1301, USA.
 
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait, FIRST_COMPLETED
+import threading
 from time import sleep
 import requests
+from requests.adapters import HTTPAdapter
+from dhub.config import STREAM_CHUNK_SIZE
 from dhub.dhubrc import dhubrc
+from dhub.executors import executors as default_executors, METADATA, CONTENT_PARTS
 
 __author__ = 'Iván de Paz Centeno'
 
 TIMEOUT=30
-request_pool = ThreadPoolExecutor(2)
+
+sessions = {}
+sessions_lock = threading.Lock()
+
+
+def get_session(api_url, pool_size, keep_alive=None):
+    """
+    Retrieves the HTTP session shared by every wrapper that talks to the given backend.
+    Sessions keep a pool of keep-alive connections, so consecutive requests reuse the same TCP/TLS
+    connections instead of opening a new one each time. requests' connection pools are thread-safe.
+    :param api_url: backend URL the session is bound to.
+    :param pool_size: max number of connections kept alive to the backend. The value of .dhubrc takes
+    precedence. If the session already exists with a smaller pool, the pool is enlarged.
+    :param keep_alive: whether connections should be kept open between requests. Defaults to the .dhubrc value.
+    :return: requests.Session instance.
+    """
+    pool_size = dhubrc.get_http_pool_size(pool_size)
+
+    with sessions_lock:
+        if api_url in sessions:
+            session, current_pool_size = sessions[api_url]
+
+            if pool_size <= current_pool_size:
+                return session
+        else:
+            session = requests.Session()
+
+            if keep_alive is None:
+                keep_alive = dhubrc.get_http_keep_alive()
+
+            if not keep_alive:
+                session.headers['Connection'] = 'close'
+
+        old_adapters = {session.get_adapter(prefix) for prefix in ["http://", "https://"]}
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+
+        # Connections in use when the pool is enlarged are closed once they are given back.
+        for old_adapter in old_adapters:
+            old_adapter.close()
+
+        sessions[api_url] = (session, pool_size)
+
+    return session
 
 
 def retry(func_wrap):
@@ -46,7 +94,7 @@ def retry(func_wrap):
 
             tries += 1
 
-        if tries >= 2:
+        if result is None and last_exception is not None:
             raise last_exception
 
         return result
@@ -54,14 +102,24 @@ def retry(func_wrap):
 
 
 class APIWrapper(object):
+    # Subclasses decide where the state is kept: most of them have a __dict__, while Element shares it
+    # with its dataset.
+    __slots__ = ()
+
 
-    def __init__(self, token, api_url=None, token_info=None, server_info=None):
+    def __init__(self, token, api_url=None, token_info=None, server_info=None, executors=None):
         if api_url is None:
              api_url = dhubrc.get_backend()
 
+        if executors is None:
+            executors = default_executors
+
         if api_url.endswith("/"): api_url = api_url[:-1]
         self.api_url = api_url
         self.token = token
+        self.executors = executors
+        """:type : dhub.executors.Executors"""
+        self.session = get_session(api_url, executors.total_workers())
 
         if token_info is None:
             self._update_token_info() # server_info is also updated here
@@ -71,8 +129,8 @@ class APIWrapper(object):
 
     def _update_token_info(self):
         try:
-            sv_info = request_pool.submit(requests.get, "{}/server".format(self.api_url), params={'_tok': self.token})
-            token_info = request_pool.submit(requests.get, "{}/tokens/{}".format(self.api_url, self.token), params={'_tok': self.token})
+            sv_info = self.executors.submit(METADATA, self.session.get, "{}/server".format(self.api_url), params={'_tok': self.token})
+            token_info = self.executors.submit(METADATA, self.session.get, "{}/tokens/{}".format(self.api_url, self.token), params={'_tok': self.token})
         except Exception as ex:
             print(ex)
             raise Exception("Backend could not be contacted!")
@@ -81,7 +139,11 @@ class APIWrapper(object):
         self.server_info = sv_info.result().json()
 
     @retry
-    def __do_json_request(self, method, rel_url, extra_data=None, json_data=None, binary_data=None):
+    def __do_json_request(self, *args, **kwargs):
+        return self.__request(*args, **kwargs)
+
+    def __request(self, method, rel_url, extra_data=None, json_data=None, binary_data=None, stream=False,
+                  headers=None, accepted_status=(200, 201)):
         if extra_data is None:
             extra_data = {}
 
@@ -94,37 +156,140 @@ class APIWrapper(object):
         data = dict(extra_data)
         data['_tok'] = self.token
 
+        url = "{}/{}".format(self.api_url, rel_url)
+
+        if hasattr(binary_data, "seek"):
+            binary_data.seek(0)  # file objects may have been consumed by a previous try.
+
         if binary_data is not None:
-            response = method("{}/{}".format(self.api_url, rel_url), data=binary_data, params=data, timeout=TIMEOUT)
+            response = self.session.request(method, url, data=binary_data, params=data, timeout=TIMEOUT,
+                                            stream=stream, headers=headers)
         else:
-            response = method("{}/{}".format(self.api_url, rel_url), json=json_data, params=data, timeout=TIMEOUT)
+            response = self.session.request(method, url, json=json_data, params=data, timeout=TIMEOUT,
+                                            stream=stream, headers=headers)
 
         while response.status_code == 429:
+            response.close()
             sleep(2)
+            if hasattr(binary_data, "seek"):
+                binary_data.seek(0)
+
             if binary_data is not None:
-                response = method("{}/{}".format(self.api_url, rel_url), data=binary_data, params=data, timeout=TIMEOUT)
+                response = self.session.request(method, url, data=binary_data, params=data, timeout=TIMEOUT,
+                                                stream=stream, headers=headers)
             else:
-                response = method("{}/{}".format(self.api_url, rel_url), json=json_data, params=data, timeout=TIMEOUT)
+                response = self.session.request(method, url, json=json_data, params=data, timeout=TIMEOUT,
+                                                stream=stream, headers=headers)
 
-        if response.status_code not in [200, 201]:
+        if response.status_code not in accepted_status:
             raise Exception("Failed to communicate with backend: {}".format(response.content.decode()))
 
         return response
 
     def _get_json(self, rel_url, extra_data=None, json_data=None):
-        return self.__do_json_request(requests.get, rel_url, extra_data, json_data).json()
+        return self.__do_json_request("GET", rel_url, extra_data, json_data).json()
 
     def _get_binary(self, rel_url, extra_data=None, json_data=None):
-        return self.__do_json_request(requests.get, rel_url, extra_data, json_data).content
+        return self.__do_json_request("GET", rel_url, extra_data, json_data).content
+
+    @retry
+    def _get_to_file(self, rel_url, file, extra_data=None, json_data=None):
+        """
+        Downloads the response body into the given file object in chunks of STREAM_CHUNK_SIZE bytes,
+        without holding the whole body in memory. The file is rewound on every retry, which covers both the
+        request and the transfer of the body.
+        :return: number of bytes written.
+        """
+        file.seek(0)
+        file.truncate()
+        written = 0
+
+        with self.__request("GET", rel_url, extra_data, json_data, stream=True) as response:
+            for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+                file.write(chunk)
+                written += len(chunk)
+
+        file.flush()
+        return written
+
+    def __get_range(self, rel_url, buffer, start, end, extra_data=None):
+        headers = {'Range': 'bytes={}-{}'.format(start, end - 1)}
+        content = self.__do_json_request("GET", rel_url, extra_data, headers=headers, accepted_status=(206,)).content
+
+        if len(content) != end - start:
+            raise Exception("Failed to communicate with backend: incomplete range {}-{}".format(start, end - 1))
+
+        buffer[start:end] = content
+        return True
+
+    def _get_binary_ranges(self, rel_url, part_size, concurrency, extra_data=None):
+        """
+        Downloads the response body with concurrent byte-range requests of part_size bytes, which are
+        reassembled into a preallocated buffer. The first range tells the size of the body; backends
+        that ignore the Range header send the whole body in it, and bodies of unknown size are requested again
+        at once.
+        :param concurrency: maximum number of ranges requested at the same time.
+        :return: body, as bytes. It is immutable, as it may be shared through the memory cache.
+        """
+        response = self.__do_json_request("GET", rel_url, extra_data, headers={'Range': 'bytes=0-{}'.format(part_size - 1)},
+                                          accepted_status=(200, 206, 416))
+
+        if response.status_code == 416:
+            return b""  # empty body: no range is satisfiable.
+
+        if response.status_code == 200:
+            return response.content
+
+        size = response.headers['Content-Range'].rsplit("/", 1)[1]
+
+        if size == "*":
+            response.close()
+            return self._get_binary(rel_url, extra_data)
+
+        size = int(size)
+        first_part = response.content
+
+        if len(first_part) == size:
+            return first_part
+
+        buffer = bytearray(size)
+        buffer[:len(first_part)] = first_part
+        view = memoryview(buffer)
+        pending = set()
+
+        try:
+            for start in range(len(first_part), size, part_size):
+                if len(pending) >= concurrency:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+
+                pending.add(self.executors.submit(CONTENT_PARTS, self.__get_range, rel_url, view, start,
+                                                  min(start + part_size, size), extra_data))
+
+            for future in pending:
+                future.result()
+        finally:
+            wait(pending)  # no part may write into the buffer once it is released.
+            view.release()
+
+        return bytes(buffer)
+
+    def _put_binary(self, rel_url, extra_data=None, binary=None, headers=None):
+        return self.__do_json_request("PUT", rel_url, extra_data, binary_data=binary, headers=headers).json()
 
-    def _put_binary(self, rel_url, extra_data=None, binary=None):
-        return self.__do_json_request(requests.put, rel_url, extra_data, binary_data=binary).json()
+    def _put_file(self, rel_url, file_name, extra_data=None):
+        """
+        Uploads the file as the request body. requests reads it in blocks, so it is never loaded in memory.
+        """
+        with open(file_name, "rb") as f:
+            return self._put_binary(rel_url, extra_data, binary=f)
 
     def _post_json(self, rel_url, extra_data=None, json_data=None):
-        return self.__do_json_request(requests.post, rel_url, extra_data, json_data).json()
+        return self.__do_json_request("POST", rel_url, extra_data, json_data).json()
 
     def _patch_json(self, rel_url, extra_data=None, json_data=None):
-        return self.__do_json_request(requests.patch, rel_url, extra_data, json_data).json()
+        return self.__do_json_request("PATCH", rel_url, extra_data, json_data).json()
 
     def _delete_json(self, rel_url, extra_data=None, json_data=None):
-        return self.__do_json_request(requests.delete, rel_url, extra_data, json_data).json()
+        return self.__do_json_request("DELETE", rel_url, extra_data, json_data).json()
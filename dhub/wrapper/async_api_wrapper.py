@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# dhub
+# Copyright (C) 2017 Iván de Paz Centeno <ipazc@unileon.es>.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; version 3
+# of the License or (at your option) any later version of
+# the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+import asyncio
+import json
+from dhub.dhubrc import dhubrc
+from dhub.wrapper.api_wrapper import TIMEOUT
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+__author__ = 'Iván de Paz Centeno'
+
+MAX_CONCURRENCY = 64  # Requests in flight at once for a single AsyncDatasets.
+IDEMPOTENT_METHODS = ["GET", "PUT"]  # requests that can be sent again when they fail.
+
+
+def async_retry(func_wrap):
+    async def fun(obj, method, *args, **kwargs):
+        tries = 3 if method in IDEMPOTENT_METHODS else 1
+
+        for try_number in range(tries):
+            try:
+                return await func_wrap(obj, method, *args, **kwargs)
+            except Exception:
+                if try_number == tries - 1:
+                    raise
+    return fun
+
+
+class AsyncConnection(object):
+    """
+    HTTP session shared by every async wrapper derived from the same AsyncDatasets.
+    It bounds the number of requests in flight with a semaphore instead of a fixed pool of threads.
+    The session is opened on the first request, in the running event loop, and kept until close().
+    """
+
+    def __init__(self, max_concurrency=MAX_CONCURRENCY):
+        if aiohttp is None:
+            raise ImportError("The async client requires aiohttp. Install it with 'pip install dhub[async]'.")
+
+        self.max_concurrency = max_concurrency
+        self.session = None
+        self.semaphore = None
+
+    async def open(self):
+        if self.session is None:
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+            self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.max_concurrency),
+                                                 timeout=aiohttp.ClientTimeout(total=None, sock_connect=TIMEOUT,
+                                                                               sock_read=TIMEOUT))
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+
+class AsyncAPIWrapper(object):
+
+    def __init__(self, token, api_url=None, token_info=None, server_info=None, connection=None):
+        if api_url is None:
+            api_url = dhubrc.get_backend()
+
+        if connection is None:
+            connection = AsyncConnection()
+
+        if api_url.endswith("/"): api_url = api_url[:-1]
+        self.api_url = api_url
+        self.token = token
+        self.token_info = token_info
+        self.server_info = server_info
+        self.connection = connection
+        """:type : AsyncConnection"""
+
+    async def _update_token_info(self):
+        try:
+            sv_info, token_info = await asyncio.gather(self._get_json("server"),
+                                                       self._get_json("tokens/{}".format(self.token)))
+        except Exception as ex:
+            print(ex)
+            raise Exception("Backend could not be contacted!")
+
+        self.token_info = token_info
+        self.server_info = sv_info
+
+    @async_retry
+    async def __do_request(self, method, rel_url, extra_data=None, json_data=None, binary_data=None, binary_result=False):
+        if extra_data is None:
+            extra_data = {}
+
+        if json_data is None:
+            json_data = {}
+
+        if rel_url.startswith("/"):
+            rel_url = rel_url[1:]
+
+        data = dict(extra_data)
+        data['_tok'] = self.token
+        url = "{}/{}".format(self.api_url, rel_url)
+
+        if binary_data is not None:
+            kwargs = {'data': binary_data}
+        else:
+            kwargs = {'json': json_data}
+
+        await self.connection.open()
+
+        async with self.connection.semaphore:
+            while True:
+                async with self.connection.session.request(method, url, params=data, **kwargs) as response:
+                    if response.status == 429:
+                        await asyncio.sleep(2)
+                        continue
+
+                    body = await response.read()
+
+                    if response.status not in [200, 201]:
+                        raise Exception("Failed to communicate with backend: {}".format(body.decode()))
+
+                    if binary_result:
+                        return body
+
+                    return json.loads(body.decode())
+
+    async def _get_json(self, rel_url, extra_data=None, json_data=None):
+        return await self.__do_request("GET", rel_url, extra_data, json_data)
+
+    async def _get_binary(self, rel_url, extra_data=None, json_data=None):
+        return await self.__do_request("GET", rel_url, extra_data, json_data, binary_result=True)
+
+    async def _put_binary(self, rel_url, extra_data=None, binary=None):
+        return await self.__do_request("PUT", rel_url, extra_data, binary_data=binary)
+
+    async def _post_json(self, rel_url, extra_data=None, json_data=None):
+        return await self.__do_request("POST", rel_url, extra_data, json_data)
+
+    async def _patch_json(self, rel_url, extra_data=None, json_data=None):
+        return await self.__do_request("PATCH", rel_url, extra_data, json_data)
+
+    async def _delete_json(self, rel_url, extra_data=None, json_data=None):
+        return await self.__do_request("DELETE", rel_url, extra_data, json_data)
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# dhub
+# Copyright (C) 2017 Iván de Paz Centeno <ipazc@unileon.es>.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; version 3
+# of the License or (at your option) any later version of
+# the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from dhub.file_content import FileContent
+
+__author__ = 'Iván de Paz Centeno'
+
+journals = {}
+journals_lock = threading.Lock()
+
+
+def get_journal(file_name):
+    """
+    Retrieves the journal stored in the given file, shared by every smart updater of the process that works on it.
+    :return: Journal instance.
+    """
+    with journals_lock:
+        if file_name not in journals:
+            journals[file_name] = Journal(file_name)
+
+        return journals[file_name]
+
+
+class Journal(object):
+    """
+    Append-only log of the updates queued in a smart updater, kept on disk so that the updates that were not sent
+    when the process stopped can be sent again the next time the dataset is opened.
+
+    Each line is a JSON record, either an update:
+        {"seq": 7, "kind": "element_update", "url": ..., "id": ..., "payload": {fields}}
+        {"seq": 8, "kind": "content_update", "url": ..., "id": ..., "file": file name}
+    or the acknowledgement of the updates sent for some elements:
+        {"done": "element_update", "seqs": {element id: [seq, ...]}}
+
+    Element updates carry only the fields that changed, so each one is acknowledged by its own sequence number: an
+    update whose batch failed is replayed even if a later update of the element was sent, except for the fields that
+    the later update overwrote. A content update carries the whole content, so sending it acknowledges the previous
+    content updates of the element as well.
+
+    Contents given as bytes are written to a blob file named after their hash, so that only file names are logged.
+    Records are flushed to the OS as they are written: they survive the process, but not the system.
+    """
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.blobs_folder = file_name + ".blobs"
+        self.file = None
+        self.seq = 0
+        self.outstanding = {}  # (kind, element id) -> set of seqs of the updates not acknowledged.
+        self.replayed = False
+        self.lock = threading.Lock()
+
+    def __append(self, record):
+        if self.file is None:
+            os.makedirs(os.path.dirname(self.file_name), exist_ok=True)
+            self.file = open(self.file_name, "a")
+
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+
+    def __read(self):
+        records = []
+
+        try:
+            with open(self.file_name) as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        break  # last line cut by a crash.
+        except FileNotFoundError:
+            pass
+
+        return records
+
+    def store_content(self, content):
+        """
+        Gets the file name to log for the content. Bytes are written to a blob file, unless it already exists.
+        :param content: bytes or FileContent.
+        :return: file name.
+        """
+        if isinstance(content, FileContent):
+            return os.path.abspath(content.file_name)
+
+        file_name = os.path.join(self.blobs_folder, hashlib.sha256(content).hexdigest())
+
+        if not os.path.exists(file_name):
+            os.makedirs(self.blobs_folder, exist_ok=True)
+
+            with tempfile.NamedTemporaryFile("wb", dir=self.blobs_folder, suffix=".tmp", delete=False) as f:
+                f.write(content)
+
+            os.replace(f.name, file_name)
+
+        return file_name
+
+    def log(self, kind, url, element_id, payload):
+        """
+        Logs an update queued in the smart updater.
+        :param kind: 'element_update', with the payload being a dict of fields, or 'content_update', with the
+        payload being the file name given by store_content().
+        :return: sequence number of the record.
+        """
+        with self.lock:
+            self.seq += 1
+            record = {'seq': self.seq, 'kind': kind, 'url': url, 'id': element_id}
+            record['payload' if kind == 'element_update' else 'file'] = payload
+            self.__append(record)
+            self.outstanding.setdefault((kind, element_id), set()).add(self.seq)
+
+            return self.seq
+
+    def log_done(self, kind, seqs):
+        """
+        Acknowledges the updates sent.
+        :param seqs: dict of element id -> sequence numbers of the updates sent.
+        """
+        with self.lock:
+            self.__append({'done': kind, 'seqs': seqs})
+
+            for element_id, element_seqs in seqs.items():
+                key = (kind, element_id)
+                outstanding = self.outstanding.get(key, set())
+
+                if kind == 'content_update':
+                    outstanding.difference_update({seq for seq in outstanding if seq <= max(element_seqs)})
+                else:
+                    outstanding.difference_update(element_seqs)
+
+                if len(outstanding) == 0:
+                    self.outstanding.pop(key, None)
+
+    @staticmethod
+    def __pending(updates, done):
+        """
+        Filters the updates not superseded by the acknowledged ones.
+        :param updates: list of records of updates of an element, in the order they were logged.
+        :param done: set of the seqs of the updates of the element acknowledged.
+        """
+        if len(done) == 0:
+            return updates
+
+        if updates[0]['kind'] == 'content_update':
+            return [record for record in updates if record['seq'] > max(done)]
+
+        pending = []
+        sent_fields = set()  # fields set by an acknowledged update logged after the record.
+
+        for record in reversed(updates):
+            if record['seq'] in done:
+                sent_fields.update(record['payload'])
+                continue
+
+            payload = {field: value for field, value in record['payload'].items() if field not in sent_fields}
+
+            if len(payload) > 0:
+                pending.append(dict(record, payload=payload))
+
+        return pending[::-1]
+
+    def replay(self):
+        """
+        Reads the updates that were logged and not acknowledged. They are only returned the first time.
+        :return: list of records of updates, in the order they were logged.
+        """
+        with self.lock:
+            if self.replayed:
+                return []
+
+            self.replayed = True
+            updates = {}  # (kind, element id) -> records of updates
+            done = {}  # (kind, element id) -> set of seqs acknowledged
+
+            for record in self.__read():
+                if 'done' in record:
+                    for element_id, seqs in record['seqs'].items():
+                        done.setdefault((record['done'], element_id), set()).update(seqs)
+                else:
+                    updates.setdefault((record['kind'], record['id']), []).append(record)
+                    self.seq = max(self.seq, record['seq'])
+
+            pending = []
+
+            for key, records in updates.items():
+                pending.extend(self.__pending(records, done.get(key, set())))
+
+            pending.sort(key=lambda record: record['seq'])
+
+            for record in pending:
+                self.outstanding.setdefault((record['kind'], record['id']), set()).add(record['seq'])
+
+            return pending
+
+    def clear_if_done(self):
+        """
+        Removes the journal and its blobs if every update logged was acknowledged.
+        :return: True if removed.
+        """
+        with self.lock:
+            if not self.replayed or len(self.outstanding) > 0:
+                return False
+
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+            try:
+                os.remove(self.file_name)
+            except FileNotFoundError:
+                pass
+
+            shutil.rmtree(self.blobs_folder, ignore_errors=True)
+            return True
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# dhub
+# Copyright (C) 2017 Iván de Paz Centeno <ipazc@unileon.es>.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; version 3
+# of the License or (at your option) any later version of
+# the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+from concurrent.futures import Future
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from dhub.dhubrc import dhubrc
+from dhub.executors import CONTENT_UPLOAD
+from dhub.file_content import FileContent
+
+__author__ = 'Iván de Paz Centeno'
+
+
+class ResumableUpload(object):
+    """
+    Upload of a large content split in parts, which are sent in parallel as PUT requests with a
+    "Content-Range: bytes start-end/total" header.
+
+    The parts acknowledged by the backend are recorded in a state file, named after the URL and the
+    content. Starting again an upload of the same content to the same URL (after a failure, or in a new
+    process) only sends the parts that are missing. The state file is removed once every part is sent.
+
+    The backend announces support for ranged uploads with the "Resumable-Uploads" key of its server info.
+    """
+
+    def __init__(self, api_wrapper, rel_url, content, part_size=None, state_folder=None):
+        if part_size is None:
+            part_size = dhubrc.get_resumable_uploads_part_size()
+
+        if state_folder is None:
+            state_folder = dhubrc.get_resumable_uploads_folder()
+
+        self.api_wrapper = api_wrapper
+        self.rel_url = rel_url
+        self.content = content
+        self.size = len(content)
+        self.part_size = part_size
+        self.parts_count = self.size // part_size + int(self.size % part_size > 0)
+        self.state_file = os.path.join(state_folder, "{}.json".format(self.__signature()))
+        self.acknowledged_parts = self.__load_state()
+        self.pending_parts = 0
+        self.future = None
+        self.exception = None
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def is_supported(server_info, size):
+        """
+        Checks whether a content of the given size should be uploaded with a resumable upload.
+        """
+        return server_info.get('Resumable-Uploads', False) and size > dhubrc.get_resumable_uploads_threshold()
+
+    def __signature(self):
+        digest = hashlib.sha256("{}|{}|{}".format(self.api_wrapper.api_url, self.rel_url, self.part_size).encode())
+
+        if isinstance(self.content, FileContent):
+            stat = os.stat(self.content.file_name)
+            digest.update("{}|{}|{}".format(os.path.abspath(self.content.file_name), stat.st_size,
+                                            stat.st_mtime_ns).encode())
+        else:
+            digest.update(self.content)
+
+        return digest.hexdigest()
+
+    def __load_state(self):
+        try:
+            with open(self.state_file) as f:
+                return set(json.load(f)['parts'])
+        except (OSError, ValueError, KeyError):
+            return set()
+
+    def __save_state(self):
+        folder = os.path.dirname(self.state_file)
+        os.makedirs(folder, exist_ok=True)
+
+        with tempfile.NamedTemporaryFile("w", dir=folder, suffix=".tmp", delete=False) as f:
+            json.dump({'url': self.rel_url, 'size': self.size, 'part_size': self.part_size,
+                       'parts': sorted(self.acknowledged_parts)}, f)
+
+        os.replace(f.name, self.state_file)
+
+    def missing_parts(self):
+        with self.lock:
+            return [index for index in range(self.parts_count) if index not in self.acknowledged_parts]
+
+    def __read_part(self, index):
+        start = index * self.part_size
+        end = min(start + self.part_size, self.size)
+
+        if isinstance(self.content, FileContent):
+            with self.content.open() as f:
+                f.seek(start)
+                data = f.read(end - start)
+        else:
+            data = self.content[start:end]
+
+        return start, end, data
+
+    def __upload_part(self, index):
+        start, end, data = self.__read_part(index)
+        headers = {'Content-Range': 'bytes {}-{}/{}'.format(start, end - 1, self.size)}
+        self.api_wrapper._put_binary(self.rel_url, binary=data, headers=headers)
+
+    def __part_done(self, index, part_future):
+        exception = part_future.exception()
+
+        with self.lock:
+            self.pending_parts -= 1
+
+            if exception is None:
+                self.acknowledged_parts.add(index)
+
+                try:
+                    self.__save_state()
+                except Exception as ex:
+                    # The state could not be recorded (full disk, unwritable folder...): the upload fails, but
+                    # the future must still be settled once the rest of the parts are done.
+                    exception = ex
+
+            if exception is not None and self.exception is None:
+                self.exception = exception
+
+            finished = self.pending_parts == 0
+
+        # Settled once every part is done, so that a resumed upload never resends parts still in flight.
+        if not finished:
+            return
+
+        if self.exception is not None:
+            self.future.set_exception(self.exception)
+            return
+
+        try:
+            os.remove(self.state_file)
+        except OSError:
+            pass
+
+        self.future.set_result(True)
+
+    def start(self):
+        """
+        Submits the missing parts to the content upload executor.
+        :return: Future that is resolved once every part is acknowledged, or fails with the first error.
+        """
+        missing_parts = self.missing_parts()
+        self.future = Future()
+
+        if len(missing_parts) == 0:
+            try:
+                os.remove(self.state_file)
+            except FileNotFoundError:
+                pass
+            self.future.set_result(True)
+            return self.future
+
+        with self.lock:
+            self.pending_parts = len(missing_parts)
+
+        for index in missing_parts:
+            part_future = self.api_wrapper.executors.submit(CONTENT_UPLOAD, self.__upload_part, index)
+            part_future.add_done_callback(lambda f, index=index: self.__part_done(index, f))
+
+        return self.future
@@ -20,34 +20,69 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
 # MA  02110-1301, USA.
 
-import concurrent
-from concurrent.futures import ThreadPoolExecutor
-import os
-from queue import Queue, Empty
+import json
+from queue import Queue
+import tempfile
 import threading
-from time import sleep
+from time import monotonic
 from pyzip import PyZip
+from dhub.dhubrc import dhubrc
+from dhub.executors import FLUSH
+from dhub.file_content import FileContent, write_bundle
+from dhub.wrapper.resumable_upload import ResumableUpload
+from dhub.wrapper.upload_limiter import upload_limiter as default_upload_limiter
 
 __author__ = 'Iván de Paz Centeno'
 
-pool = ThreadPoolExecutor(4)
-UPDATE_INTERVAL = 1  # seconds
 
 
 class AsyncSmartUpdater(object):
 
     __tasks_pending = 0
 
-    def __init__(self, server_info, api_wrapper_owner):
+    def __init__(self, server_info, api_wrapper_owner, upload_limiter=None, journal=None):
+        if upload_limiter is None:
+            upload_limiter = default_upload_limiter
+
         self.server_info = server_info
         self.api_wrapper_owner = api_wrapper_owner
+        self.upload_limiter = upload_limiter
+        """:type : dhub.wrapper.upload_limiter.UploadLimiter"""
+        self.journal = journal  # optional log on disk of the updates queued, to send them again after a crash.
+        """:type : dhub.wrapper.journal.Journal"""
         self.content_put_queue = Queue()
         self.element_update_queue = Queue()
         self.queues_priorities = [self.element_update_queue, self.content_put_queue]
+        # Batches of metadata sent for each batch of contents while both queues wait.
+        self.queues_weights = {self.element_update_queue: dhubrc.get_smart_updater_metadata_weight(),
+                               self.content_put_queue: 1}
+        self.queues_passes = {queue: 0 for queue in self.queues_priorities}
+        self.queues_kinds = {self.element_update_queue: 'json', self.content_put_queue: 'binary'}
+        # element id -> {'entry': pending [url, element id, payload, journal seqs merged, size of the content] or None,
+        #                'since': time when the pending entry was queued, 'in_flight': updates being sent,
+        #                'event': set once no update of the element is pending nor in flight}
         self.queues_cache = {'element_update': {}, 'content_update': {}}
+        self.queues_names = {self.element_update_queue: 'element_update', self.content_put_queue: 'content_update'}
+        self.queues_by_name = {name: queue for queue, name in self.queues_names.items()}
+        # Elements of each queue that can be taken: those whose previous update is not in flight anymore. An update
+        # is never sent while the previous one of its element is in flight, so that they reach the backend in order.
+        self.queues_ready = {queue: 0 for queue in self.queues_priorities}
+        self.failed_updates = []  # [request kind, elements ids, exception] of the batches that could not be sent.
+        # Sizes of the requests sent, per request kind. Available through stats().
+        self.sent = {kind: {'batches': 0, 'elements': 0, 'bytes': 0, 'max_batch_elements': 0, 'max_batch_bytes': 0,
+                            'single_uploads': 0} for kind in ['json', 'binary']}
+        self.max_latency = dhubrc.get_smart_updater_max_latency()
+        self.batch_bytes = dhubrc.get_smart_updater_batch_bytes()
+        self.pending_bytes = 0  # bytes of the contents queued and not taken yet.
+        self.pending_since = None  # time when the oldest update not taken yet was queued.
+        self.flush_requested = False
+        self.max_batches_in_flight = dhubrc.get_smart_updater_batches_in_flight()
+        self.batches_in_flight = 0
         self.__exit = False
         self.__cancel_pending_jobs = False
-        self.lock = threading.Lock()
+        self.lock = threading.RLock()
+        # Notified when updates are queued, when batches are sent and when the updater is asked to flush or stop.
+        self.condition = threading.Condition(self.lock)
         self.thread = threading.Thread(target=self._thread_func, daemon=True)
         self.thread.start()
 
@@ -72,8 +107,9 @@ class AsyncSmartUpdater(object):
             self.__tasks_pending += by
 
     def _decrease_tasks_pending_counter(self, by=1):
-        with self.lock:
+        with self.condition:
             self.__tasks_pending -= by
+            self.condition.notify_all()
 
     @property
     def _cancel_pending_jobs(self):
@@ -86,147 +122,282 @@ class AsyncSmartUpdater(object):
         with self.lock:
             self.__cancel_pending_jobs = do__cancel_pending_jobs
 
-    def __queue_with_higher_priority_waiting(self, queue):
-        """
-        Checks if is there any queue with higher priority waiting than the specified queue.
-        :param queue: queue to check from
-        :return: boolean True if there is at least one queue with higher priority waiting. False otherwise.
-        """
-        index = 0
-        current_queue_index = self.queues_priorities.index(queue)
-
-        while index < current_queue_index and self.queues_priorities[index].qsize() == 0:
-            index += 1
-
-        return index != len(self.queues_priorities) and index < current_queue_index
-
     def __any_queue_with_elements(self):
         return any([queue.qsize() > 0 for queue in self.queues_priorities])
 
     def is_element_update_queued(self, elements_ids):
-        return any(element in self.queues_cache['element_update'] for element in elements_ids)
+        with self.lock:
+            return any(element in self.queues_cache['element_update'] for element in elements_ids)
 
     def is_content_update_queued(self, elements_ids):
-        return any(element in self.queues_cache['content_update'] for element in elements_ids)
+        with self.lock:
+            return any(element in self.queues_cache['content_update'] for element in elements_ids)
 
-    def wait_for_elements_update(self, elements_ids):
+    def __wait_for(self, cache_name, elements_ids, timeout):
         events_list = []
 
         with self.lock:
             for element_id in elements_ids:
-                if element_id not in self.queues_cache['element_update']:
+                state = self.queues_cache[cache_name].get(element_id)
+
+                if state is None:
                     continue
-                if self.queues_cache['element_update'][element_id] is None:
-                    event = threading.Event()
-                    self.queues_cache['element_update'][element_id] = event
-                else:
-                    event = self.queues_cache['element_update'][element_id]
 
-                events_list.append(event)
+                if state['event'] is None:
+                    state['event'] = threading.Event()
 
-        launch_exception = None
+                events_list.append(state['event'])
 
-        try:
-            # Now we wait for the events
-            for event in events_list:
-                event = event
-                """
-                :type : threading.Event
-                """
-                if not event.wait(100):
-                    raise Exception("Time out while waiting for the elements.")
-        except Exception as ex:
-            launch_exception = ex
-        finally:
-            # do some cleanup
-            with self.lock:
-                for element_id in elements_ids:
-                    if element_id in self.queues_cache['element_update']:
-                        del self.queues_cache['element_update'][element_id]
+        for event in events_list:
+            if not event.wait(timeout):
+                raise Exception("Time out while waiting for the elements.")
 
-        if launch_exception is not None:
-            raise launch_exception
+    def wait_for_elements_update(self, elements_ids, timeout=100):
+        """
+        Waits until the queued updates of the given elements are sent.
+        :param timeout: maximum seconds to wait for each element, or None to wait with no limit.
+        """
+        self.__wait_for('element_update', elements_ids, timeout)
 
-    def wait_for_elements_content_update(self, elements_ids):
-        events_list = []
+    def wait_for_elements_content_update(self, elements_ids, timeout=100):
+        """
+        Waits until the queued contents of the given elements are uploaded.
+        :param timeout: maximum seconds to wait for each element, or None to wait with no limit.
+        """
+        self.__wait_for('content_update', elements_ids, timeout)
 
+    def __take(self, queue, position):
+        """
+        Takes the pending update of the next element of the queue, which is then in flight.
+        :param position: position of the element in the queue.
+        :return: [url, element id, payload, journal seqs, size of the content]
+        """
         with self.lock:
-            for element_id in elements_ids:
-                if element_id not in self.queues_cache['content_update']:
-                    continue
-                if self.queues_cache['content_update'][element_id] is None:
-                    event = threading.Event()
-                    self.queues_cache['content_update'][element_id] = event
-                else:
-                    event = self.queues_cache['content_update'][element_id]
+            with queue.mutex:
+                element_id = queue.queue[position]
+                del queue.queue[position]
 
-                events_list.append(event)
+            self.queues_ready[queue] -= 1
+            state = self.queues_cache[self.queues_names[queue]][element_id]
+            entry = state['entry']
+            state['entry'] = None
+            state['in_flight'] += 1
 
-        launch_exception = None
+            if queue is self.content_put_queue:
+                self.pending_bytes -= entry[4]
 
-        try:
-            # Now we wait for the events
-            for event in events_list:
-                event = event
-                """
-                :type : threading.Event
-                """
-                if not event.wait(100):
-                    raise Exception("Time out while waiting for the elements.")
-        except Exception as ex:
-            launch_exception = ex
-        finally:
-            # do some cleanup
-            with self.lock:
-                for element_id in elements_ids:
-                    if element_id in self.queues_cache['content_update']:
-                        del self.queues_cache['content_update'][element_id]
+            # Elements are queued in the order their entries were created, so the oldest entry not taken yet is
+            # at the head of one of the queues.
+            self.pending_since = min((self.queues_cache[self.queues_names[q]][q.queue[0]]['since']
+                                      for q in self.queues_priorities if q.qsize() > 0), default=None)
 
-        if launch_exception is not None:
-            raise launch_exception
+        return entry
 
-    def _thread_func(self):
+    def __flush_delay(self):
+        """
+        Tells how long the updater thread must wait before sending the pending updates.
+        :return: 0 to send them now, the seconds until the oldest one reaches the maximum latency, or None
+        to wait until something is queued.
+        """
+        pending = sum(queue.qsize() for queue in self.queues_priorities)
+
+        if self.__exit:
+            return 0
+
+        if pending == 0:
+            return None
+
+        if self.flush_requested or self.pending_bytes >= self.batch_bytes or \
+                any(queue.qsize() >= self.server_info['Page-Size'] for queue in self.queues_priorities):
+            return 0
+
+        return max(0, self.pending_since + self.max_latency - monotonic())
+
+    def __pick_queue(self):
+        """
+        Picks the queue of the next batch by stride scheduling: each batch advances the pass of its queue by the
+        inverse of the queue weight, and the waiting queue with the lowest pass goes next. Metadata is weighted
+        over contents, but contents are never stalled by a steady flow of metadata updates.
+        """
+        waiting_queues = [queue for queue in self.queues_priorities if self.queues_ready[queue] > 0]
+        queue = min(waiting_queues, key=lambda q: (self.queues_passes[q], self.queues_priorities.index(q)))
+        current_pass = self.queues_passes[queue]
+
+        for other_queue in self.queues_priorities:
+            if self.queues_ready[other_queue] == 0:
+                # Idle queues do not bank turns for later.
+                self.queues_passes[other_queue] = max(self.queues_passes[other_queue], current_pass)
+
+        self.queues_passes[queue] = current_pass + 1 / self.queues_weights[queue]
+        return queue
+
+    def __gather(self, queue):
+        """
+        Takes the updates of the next batch of the queue: up to Page-Size elements, and up to batch_bytes bytes of
+        contents. A content larger than batch_bytes makes a batch on its own. Elements whose previous update is still
+        in flight are left in the queue.
+        """
         ps = self.server_info['Page-Size']
-        queue_types = {self.content_put_queue: 'binary', self.element_update_queue: 'json'}
+        cache = self.queues_cache[self.queues_names[queue]]
+        elements = []
+        size = 0
+        position = 0
 
-        while not self._exit or (not self._cancel_pending_jobs and self.__any_queue_with_elements()):
-            # Let's gather all the updates from the queue to serialize them
-            sleep(UPDATE_INTERVAL)
-            for queue in self.queues_priorities:
+        # Elements are only put into the queues under the lock, and only this thread takes them.
+        while len(elements) < ps and position < queue.qsize():
+            element_id = queue.queue[position]
+            state = cache[element_id]
 
-                if self.__queue_with_higher_priority_waiting(queue):
-                    break  # This forces the loop to start running through the most priority queues again.
+            if state['in_flight'] > 0:
+                position += 1
+                continue
 
-                gathered_elements = []
-                futures = {}
-                queue_empty = False
+            entry_size = state['entry'][4]
 
-                while not queue_empty:
+            if len(elements) > 0 and size + entry_size > self.batch_bytes:
+                break
 
-                    # Check that queues with highest priority are not waiting
-                    if self.__queue_with_higher_priority_waiting(queue):
-                        break  # This forces the loop to start running through the most priority queues again.
+            elements.append(self.__take(queue, position))
+            size += entry_size
 
-                    try:
-                        element = queue.get(block=False)
-                        gathered_elements.append(element)
-                    except Empty as ex:
-                        queue_empty = True
+            if size > self.batch_bytes:
+                break  # Too big to share a bundle: it is uploaded on its own.
 
-                    # This is the smart action: we combine several requests into one
-                    if len(gathered_elements) > ps-1:
-                        futures[pool.submit(self.__do_update, queue_types[queue], gathered_elements)] = len(gathered_elements)
-                        gathered_elements = []
+        return elements
 
-                if len(gathered_elements) > 0:
-                    futures[pool.submit(self.__do_update, queue_types[queue], gathered_elements)] = len(gathered_elements)
+    def __next_batch(self):
+        """
+        Waits until a batch must be sent and there is room for it among the batches in flight.
+        :return: request kind and updates of the batch, or None once the updater is stopped.
+        """
+        with self.condition:
+            while True:
+                if self.__exit and (self.__cancel_pending_jobs or not self.__any_queue_with_elements()):
+                    return None
 
-                for future in concurrent.futures.as_completed(futures):
-                    self._decrease_tasks_pending_counter(futures[future])
+                delay = self.__flush_delay()
+
+                if delay == 0 and self.batches_in_flight < self.max_batches_in_flight and \
+                        any(ready > 0 for ready in self.queues_ready.values()):
+                    break
+
+                self.condition.wait(delay if delay != 0 else None)
+
+            queue = self.__pick_queue()
+            elements = self.__gather(queue)
+            self.batches_in_flight += 1
+
+            if not self.__any_queue_with_elements():
+                self.flush_requested = False
+
+        return self.queues_kinds[queue], elements
+
+    def __batch_done(self, elements_count):
+        with self.condition:
+            self.batches_in_flight -= 1
+            self.__tasks_pending -= elements_count
+            self.condition.notify_all()
+
+    def _thread_func(self):
+        batch = self.__next_batch()
+
+        while batch is not None:
+            request_kind, elements = batch
+            future = self.api_wrapper_owner.executors.submit(FLUSH, self.__do_update, request_kind, elements)
+            future.add_done_callback(lambda f, count=len(elements): self.__batch_done(count))
+            batch = self.__next_batch()
+
+        with self.condition:
+            self.condition.wait_for(lambda: self.batches_in_flight == 0)
+
+            # Contents discarded by a cancelling stop() give their room back.
+            discarded_bytes = sum(state['entry'][4] for state in self.queues_cache['content_update'].values()
+                                  if state['entry'] is not None)
+
+        self.upload_limiter.release(discarded_bytes)
 
     def queues_busy(self):
         return self.tasks_pending > 0
 
+    def __release_waiters(self, cache_name, elements):
+        with self.lock:
+            for element in elements:
+                element_id = element[1]
+                state = self.queues_cache[cache_name][element_id]
+                state['in_flight'] -= 1
+
+                if state['entry'] is not None and state['in_flight'] == 0:
+                    self.queues_ready[self.queues_by_name[cache_name]] += 1
+
+                if state['entry'] is None and state['in_flight'] == 0:
+                    del self.queues_cache[cache_name][element_id]
+
+                    if state['event'] is not None:
+                        state['event'].set()
+
+    def __put_contents(self, url, contents, sizes):
+        """
+        :param sizes: dict of element id -> size of its content when it was queued. Files are not measured again,
+        so that a file changed meanwhile does not change the upload path chosen.
+        """
+        server_info = self.api_wrapper_owner.server_info
+
+        elements_url = url.rsplit("/", 1)[0]
+        resumable_uploads = []
+        bundled_contents = {}
+
+        for element_id, content in contents.items():
+            element_url = "{}/{}/content".format(elements_url, element_id)
+
+            if ResumableUpload.is_supported(server_info, sizes[element_id]):
+                # Large contents are sent on their own in parts, so that a failure only resends the missing parts.
+                resumable_uploads.append(ResumableUpload(self.api_wrapper_owner, element_url, content).start())
+            elif sizes[element_id] > self.batch_bytes:
+                if isinstance(content, FileContent):
+                    self.api_wrapper_owner._put_file(element_url, content.file_name)
+                else:
+                    self.api_wrapper_owner._put_binary(element_url, binary=content)
+            else:
+                bundled_contents[element_id] = content
+                continue
+
+            self.__count_sent('binary', 1, sizes[element_id], single_upload=True)
+
+        contents = bundled_contents
+
+        if any(isinstance(content, FileContent) for content in contents.values()):
+            # Bundles with file contents are built on disk and streamed, so files are never loaded in memory.
+            with tempfile.TemporaryFile() as bundle:
+                write_bundle(contents, bundle)
+                self.api_wrapper_owner._put_binary(url, extra_data=None, binary=bundle)
+                self.__count_sent('binary', len(contents), bundle.tell())
+        elif len(contents) > 0:
+            content = PyZip(contents).to_bytes()
+            self.api_wrapper_owner._put_binary(url, extra_data=None, binary=content)
+            self.__count_sent('binary', len(contents), len(content))
+
+        for future in resumable_uploads:
+            future.result()
+
+    def __count_sent(self, request_kind, elements_count, size, single_upload=False):
+        with self.lock:
+            sent = self.sent[request_kind]
+            sent['batches'] += int(not single_upload)
+            sent['single_uploads'] += int(single_upload)
+            sent['elements'] += elements_count
+            sent['bytes'] += size
+            sent['max_batch_elements'] = max(sent['max_batch_elements'], elements_count)
+            sent['max_batch_bytes'] = max(sent['max_batch_bytes'], size)
+
+    def stats(self):
+        """
+        Retrieves the sizes of the requests sent so far.
+        :return: dict of request kind ('json' or 'binary') -> dict with the number of batches and of single
+        uploads sent, the elements and bytes they carried, and the largest request in elements and in bytes.
+        """
+        with self.lock:
+            return {kind: dict(sent) for kind, sent in self.sent.items()}
+
     def __do_update(self, request_kind, elements):
         if len(elements) > 0:
             url = elements[0][0]
@@ -235,55 +406,157 @@ class AsyncSmartUpdater(object):
 
         kwargs_list = {}
         for element in elements:
-            kwargs_list[element[1]] = element[2]
+            if request_kind == "json":
+                # Updates of the same element may carry different fields.
+                kwargs_list.setdefault(element[1], {}).update(element[2])
+            else:
+                kwargs_list[element[1]] = element[2]
 
         if len(kwargs_list) == 0:
             return None
 
-        if request_kind == "json":
-            self.api_wrapper_owner._patch_json(url, extra_data=None, json_data={'elements': kwargs_list})
-            for [_, element_id, _] in elements:
-                event = self.queues_cache['element_update'][element_id]
-                """
-                :type : threading.Event
-                """
+        cache_name = 'element_update' if request_kind == "json" else 'content_update'
 
-                if event is not None:
-                    event.set()
-                else:
-                    with self.lock:
-                        del self.queues_cache['element_update'][element_id]
+        try:
+            if request_kind == "json":
+                json_data = {'elements': kwargs_list}
+                self.api_wrapper_owner._patch_json(url, extra_data=None, json_data=json_data)
+                self.__count_sent('json', len(kwargs_list), len(json.dumps(json_data)))
+            else: # request_kind == "binary":
+                self.__put_contents(url, kwargs_list, {element[1]: element[4] for element in elements})
+
+            if self.journal is not None:
+                seqs = {}
+                for element in elements:
+                    seqs.setdefault(element[1], []).extend(element[3])
+
+                self.journal.log_done(cache_name, seqs)
+        except Exception as ex:
+            # Kept to be reported by pop_failed_updates() instead of being lost in the future.
+            with self.lock:
+                self.failed_updates.append([request_kind, list(kwargs_list), ex])
+            raise
+        finally:
+            self.__release_waiters(cache_name, elements)
 
-        else: # request_kind == "binary":
-            content = PyZip(kwargs_list).to_bytes()
-            self.api_wrapper_owner._put_binary(url, extra_data=None, binary=content)
-            for [_, element_id, _] in elements:
-                event = self.queues_cache['content_update'][element_id]
-                """
-                :type : threading.Event
-                """
-
-                if event is not None:
-                    event.set()
-                else:
-                    with self.lock:
-                        del self.queues_cache['content_update'][element_id]
+            if request_kind == "binary":
+                self.upload_limiter.release(sum(element[4] for element in elements))
 
         return True
 
-    def queue_update(self, url, element_id, kwargs):
-        self._increase_tasks_pending_counter()
+    def get_failed_elements(self, request_kind):
+        """
+        Retrieves the ids of the elements whose updates of the given kind ('json' or 'binary') could not be sent
+        since the last call to pop_failed_updates().
+        :return: set of elements ids.
+        """
         with self.lock:
-            self.queues_cache["element_update"][element_id] = None
-        self.element_update_queue.put([url, element_id, kwargs])
+            return {element_id for kind, elements_ids, _ in self.failed_updates if kind == request_kind
+                    for element_id in elements_ids}
+
+    def pop_failed_updates(self):
+        """
+        Retrieves the updates that could not be sent to the backend since the last call.
+        :return: list of [request kind, elements ids, exception].
+        """
+        with self.lock:
+            failed_updates = self.failed_updates
+            self.failed_updates = []
+
+        return failed_updates
+
+    def __queue(self, cache_name, url, element_id, payload, journal_payload=None, size=0):
+        """
+        Queues the update of the element. Each element has at most one pending update per kind: a new update
+        of an element that is still pending is merged into it instead of being queued again.
+        :param journal_payload: payload logged in the journal, if any.
+        :param size: size of the content, as acquired from the upload limiter. It is released with the same value.
+        """
+        queue = self.element_update_queue if cache_name == 'element_update' else self.content_put_queue
 
-    def queue_content_update(self, url, element_id, content):
-        self._increase_tasks_pending_counter()
         with self.lock:
-            self.queues_cache["content_update"][element_id] = None
-        self.content_put_queue.put([url, element_id, content])
+            seqs = []
+
+            if self.journal is not None:
+                # Logged under the lock, so that the order of the journal is the order of the merges.
+                seqs.append(self.journal.log(cache_name, url, element_id, journal_payload))
+
+            state = self.queues_cache[cache_name].setdefault(element_id, {'entry': None, 'since': None,
+                                                                          'in_flight': 0, 'event': None})
+
+            if state['entry'] is not None:
+                state['entry'][3].extend(seqs)
+
+                if cache_name == 'element_update':
+                    state['entry'][2].update(payload)
+                else:
+                    self.pending_bytes += size - state['entry'][4]
+                    self.upload_limiter.release(state['entry'][4])
+                    state['entry'][2] = payload
+                    state['entry'][4] = size
+                    self.condition.notify_all()
+                return
+
+            state['entry'] = [url, element_id, dict(payload) if cache_name == 'element_update' else payload, seqs, size]
+            state['since'] = monotonic()
+            self.__tasks_pending += 1
+
+            if state['in_flight'] == 0:
+                self.queues_ready[queue] += 1
+
+            if cache_name == 'content_update':
+                self.pending_bytes += size
+
+            if self.pending_since is None:
+                self.pending_since = state['since']
+
+            # Put under the lock, so that the updater thread sees the queue and the counters in sync.
+            queue.put(element_id)
+            self.condition.notify_all()
+
+    def queue_update(self, url, element_id, kwargs):
+        self.__queue('element_update', url, element_id, kwargs, kwargs)
+
+    def queue_content_update(self, url, element_id, content):
+        """
+        Queues the upload of the content of the element. Blocks while the uploads in flight take all the room of
+        the upload limiter.
+        """
+        # Measured once: the size of a file may change while it is queued.
+        size = len(content)
+
+        if not self.upload_limiter.try_acquire(size):
+            self.flush()  # the room is made by sending what is already queued.
+            self.upload_limiter.acquire(size)
+
+        journal_payload = None
+
+        if self.journal is not None:
+            journal_payload = self.journal.store_content(content)
+
+        self.__queue('content_update', url, element_id, content, journal_payload, size)
+
+    def flush(self):
+        """
+        Asks the updater to send the pending updates now, without waiting for the batches to be full.
+        """
+        with self.condition:
+            self.flush_requested = True
+            self.condition.notify_all()
+
+    def wait_until_done(self, timeout=None):
+        """
+        Waits until every queued update is sent.
+        :param timeout: maximum seconds to wait.
+        :return: True if every update was sent, False if the timeout expired.
+        """
+        with self.condition:
+            return self.condition.wait_for(lambda: self.__tasks_pending == 0, timeout)
 
     def stop(self, cancel_pending_jobs=False):
-        self.__exit = True
-        self.__cancel_pending_jobs = cancel_pending_jobs
+        with self.condition:
+            self.__exit = True
+            self.__cancel_pending_jobs = cancel_pending_jobs
+            self.condition.notify_all()
+
         self.thread.join(10)
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# dhub
+# Copyright (C) 2017 Iván de Paz Centeno <ipazc@unileon.es>.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; version 3
+# of the License or (at your option) any later version of
+# the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+# MA  02110-1301, USA.
+
+import threading
+from dhub.dhubrc import dhubrc
+
+__author__ = 'Iván de Paz Centeno'
+
+
+class UploadLimiter(object):
+    """
+    Bounds the bytes of the contents being uploaded at the same time. Contents take their size from the
+    limit when they are queued for upload and give it back once they are sent (or fail), so producers that
+    set contents faster than they can be uploaded are blocked instead of piling them up in memory.
+
+    A content larger than the limit is accepted when nothing else is in flight.
+    """
+
+    def __init__(self, max_bytes, timeout=None):
+        """
+        :param max_bytes: maximum bytes in flight. 0 disables the limit.
+        :param timeout: seconds to wait for room before failing. None waits forever, 0 fails straight away.
+        """
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.in_flight = 0
+        self.condition = threading.Condition()
+
+    def __has_room(self, size):
+        return self.max_bytes == 0 or self.in_flight == 0 or self.in_flight + size <= self.max_bytes
+
+    def try_acquire(self, size):
+        """
+        Takes the size from the limit if there is room for it right now.
+        :return: True if it was taken, False otherwise.
+        """
+        with self.condition:
+            if not self.__has_room(size):
+                return False
+
+            self.in_flight += size
+
+        return True
+
+    def acquire(self, size, timeout=-1):
+        """
+        Takes the size from the limit, waiting for other uploads to finish if there is no room for it.
+        :param timeout: seconds to wait. Defaults to the timeout of the limiter.
+        """
+        if timeout == -1:
+            timeout = self.timeout
+
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.__has_room(size), timeout):
+                raise Exception("Timed out waiting for the uploads in flight ({} bytes) to leave room for "
+                                "{} bytes.".format(self.in_flight, size))
+
+            self.in_flight += size
+
+    def release(self, size):
+        with self.condition:
+            self.in_flight -= size
+            self.condition.notify_all()
+
+    def get_in_flight(self):
+        with self.condition:
+            return self.in_flight
+
+
+upload_limiter = UploadLimiter(dhubrc.get_uploads_max_in_flight(), dhubrc.get_uploads_timeout())
@@ -32,8 +32,8 @@ def readme():
     with open('README.rst') as f:
         return f.read()
 
-if sys.version_info < (3, 4, 1):
-    sys.exit('Python < 3.4.1 is not supported!')
+if sys.version_info < (3, 6):
+    sys.exit('Python < 3.6 is not supported!')
 
 setup(name='dhub',
       version=__version__,
@@ -44,12 +44,17 @@ setup(name='dhub',
       author_email='ipazc@unileon.es',
       license='GNU GPLv3 or later',
       packages=setuptools.find_packages(),
+      python_requires='>=3.6',
       install_requires=[
           "pyzip",
           "pyfolder",
           "requests",
           "pillow"
       ],
+      extras_require={
+          "async": ["aiohttp"],
+          "numpy": ["numpy"]
+      },
       classifiers=[
           'Development Status :: 1 - Planning',
           'Environment :: Console',
@@ -58,8 +63,6 @@ setup(name='dhub',
           'Intended Audience :: Science/Research',
           'Natural Language :: English',
           'Operating System :: POSIX :: Linux',
-          'Programming Language :: Python :: 3.4',
-          'Programming Language :: Python :: 3.5',
           'Programming Language :: Python :: 3.6',
           'Programming Language :: Python :: 3.7',
           'Framework :: Flask',